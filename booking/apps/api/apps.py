@@ -0,0 +1,12 @@
+"""
+API app configuration.
+"""
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class ApiConfig(AppConfig):
+    """API app configuration."""
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'booking.apps.api'
+    verbose_name = _('API')
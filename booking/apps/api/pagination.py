@@ -0,0 +1,83 @@
+"""
+Cursor pagination for the API.
+
+Pages are selected with the project's KeysetPaginator, so deep pages cost
+the same index range scan as the first one, and nothing is counted: a
+client walks the ``next`` links until there are none.
+"""
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from booking.apps.core.pagination import CURSOR_PARAM, InvalidCursor, KeysetPaginator
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Paginate by cursor over the view's ``keyset_ordering``.
+
+    The rows may be model instances or ``values()`` dicts holding the
+    ordering fields. Clients may ask for up to ``max_page_size`` rows with
+    ``?page_size=``.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = CURSOR_PARAM
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the rows of the page selected by the request's cursor."""
+        paginator = self.get_paginator(queryset, request, view)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Return the rows of the page selected by the request's cursor, read with the async ORM."""
+        paginator = self.get_paginator(queryset, request, view)
+        try:
+            self.page = await paginator.apage(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    def get_paginator(self, queryset, request, view=None):
+        """Return the keyset paginator of the request's page size."""
+        self.request = request
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        return KeysetPaginator(queryset, self.get_page_size(request), ordering, count_mode=None)
+
+    def get_page_size(self, request):
+        """Return the requested page size, within bounds."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_link(self, cursor):
+        """Return the URL of the page a cursor selects, or None."""
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        """Wrap a page of serialized rows with the links to its neighbours."""
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        """Describe the paginated response for schema generators."""
+        link = {'type': 'string', 'nullable': True, 'format': 'uri'}
+        return {
+            'type': 'object',
+            'properties': {'next': link, 'previous': link, 'results': schema},
+        }
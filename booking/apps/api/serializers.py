@@ -0,0 +1,110 @@
+"""
+Serializers for the API.
+
+Read paths serialize ``values()`` rows directly (see ``views``); the
+serializers here only validate writes. They run the model's own
+validation, so the API accepts exactly what the booking forms accept.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from booking.apps.bookings.batch import ACTIONS
+from booking.apps.bookings.models import Booking
+from booking.apps.facilities.models import Facility
+
+
+def as_drf_error(error):
+    """Convert a Django ValidationError into a DRF one, keeping its field errors."""
+    if hasattr(error, 'error_dict'):
+        detail = {
+            'non_field_errors' if field == '__all__' else field: messages
+            for field, messages in error.message_dict.items()
+        }
+        return serializers.ValidationError(detail)
+    return serializers.ValidationError({'non_field_errors': error.messages})
+
+
+class BookingSerializer(serializers.ModelSerializer):
+    """Validate a new booking for the requesting user."""
+    facility = serializers.PrimaryKeyRelatedField(queryset=Facility.objects.filter(is_active=True))
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'facility', 'title', 'description', 'start_time', 'end_time', 'number_of_people', 'status']
+        read_only_fields = ['id', 'status']
+
+    def validate(self, attrs):
+        """Run the model validation: time range, capacity and availability."""
+        booking = Booking(user=self.context['request'].user, **attrs)
+        try:
+            booking.full_clean(exclude=['user', 'series'])
+        except DjangoValidationError as e:
+            raise as_drf_error(e)
+        return attrs
+
+    def create(self, validated_data):
+        """Save the booking; conflicts detected by the database are validation errors."""
+        try:
+            return Booking.objects.create(user=self.context['request'].user, **validated_data)
+        except DjangoValidationError as e:
+            raise as_drf_error(e)
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    Validate the envelope of a batch of booking operations.
+
+    The operations themselves are validated one by one, so that a malformed
+    operation is reported in its own result instead of failing the batch.
+    """
+    atomic = serializers.BooleanField(default=False)
+    operations = serializers.ListField(child=serializers.DictField(), min_length=1)
+
+    def validate_operations(self, operations):
+        """Limit the batch to the view's ``max_operations``."""
+        limit = self.context['view'].max_operations
+        if len(operations) > limit:
+            raise serializers.ValidationError(
+                _('A batch holds at most %(max)d operations.') % {'max': limit}
+            )
+        return operations
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """Validate one operation of a batch: an action and its booking or data."""
+    action = serializers.ChoiceField(choices=ACTIONS)
+    id = serializers.IntegerField(min_value=1, required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        """Require a booking to cancel or confirm, and the data of a booking to create."""
+        if attrs['action'] == 'create':
+            if 'data' not in attrs:
+                raise serializers.ValidationError({'data': [_('This field is required.')]})
+        elif 'id' not in attrs:
+            raise serializers.ValidationError({'id': [_('This field is required.')]})
+        return attrs
+
+
+class BatchBookingSerializer(serializers.ModelSerializer):
+    """
+    Validate the fields of a booking created by a batch.
+
+    Only what needs no query is checked here; the facility, its capacity
+    and its availability are checked for the whole batch at once.
+    """
+    facility = serializers.IntegerField(source='facility_id', min_value=1)
+
+    class Meta:
+        model = Booking
+        fields = ['facility', 'title', 'description', 'start_time', 'end_time', 'number_of_people']
+
+    def validate(self, attrs):
+        """Check the time range, as ``Booking.clean()`` does."""
+        if attrs['end_time'] <= attrs['start_time']:
+            raise serializers.ValidationError(_('End time must be after start time.'))
+        if attrs['start_time'] < timezone.now():
+            raise serializers.ValidationError(_('Start time must be in the future.'))
+        return attrs
@@ -0,0 +1,406 @@
+"""
+Tests for the API app.
+"""
+import datetime
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.throttling import AnonRateThrottle
+
+from booking.apps.bookings.models import Booking
+from booking.apps.bookings.tests import create_booking
+from booking.apps.facilities.models import Facility
+
+User = get_user_model()
+
+
+class FacilityApiTest(TestCase):
+    """Test the facility endpoints."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.facilities = [
+            Facility.objects.create(name=f"Hall {index}", location="North", capacity=10 * (index + 1))
+            for index in range(5)
+        ]
+        Facility.objects.create(name="Closed Hall", location="North", capacity=10, is_active=False)
+        self.url = reverse('api:facility_list')
+
+    def test_cursor_pagination_walks_every_facility(self):
+        """Test that following the next links visits every active facility once, in name order."""
+        names = []
+        response = self.client.get(self.url, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            names += [row['name'] for row in response.json()['results']]
+            next_url = response.json()['next']
+            if not next_url:
+                break
+            response = self.client.get(next_url)
+        self.assertEqual(names, [facility.name for facility in self.facilities])
+        self.assertIsNotNone(response.json()['previous'])
+
+    def test_list_is_a_single_query(self):
+        """Test that a page of facilities costs one query and no count."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_sparse_fieldsets(self):
+        """Test that ``fields`` restricts the returned fields."""
+        response = self.client.get(self.url, {'fields': 'name,capacity', 'page_size': 1})
+        self.assertEqual(response.json()['results'], [{'name': 'Hall 0', 'capacity': 10}])
+        response = self.client.get(self.url, {'fields': 'name,owner'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+    def test_filters(self):
+        """Test the capacity and availability filters of the facility list."""
+        response = self.client.get(self.url, {'min_capacity': 40, 'fields': 'id'})
+        self.assertEqual([row['id'] for row in response.json()['results']],
+                         [self.facilities[3].pk, self.facilities[4].pk])
+
+        start = (timezone.now() + timezone.timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        Booking.objects.create(
+            user=self.user, facility=self.facilities[0], title="Busy",
+            start_time=start, end_time=start + timezone.timedelta(hours=2), status='confirmed',
+        )
+        response = self.client.get(self.url, {
+            'available_from': start.strftime('%Y-%m-%dT%H:%M'),
+            'available_to': (start + timezone.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'fields': 'id',
+        })
+        ids = [row['id'] for row in response.json()['results']]
+        self.assertNotIn(self.facilities[0].pk, ids)
+        self.assertEqual(len(ids), 4)
+        response = self.client.get(self.url, {'available_from': start.strftime('%Y-%m-%dT%H:%M')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is a 404."""
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 404)
+
+    def test_detail_is_served_from_the_cache(self):
+        """Test that a facility is read from the shared facility cache."""
+        url = reverse('api:facility_detail', args=[self.facilities[1].pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'fields': 'id,name'})
+        self.assertEqual(response.json(), {'id': self.facilities[1].pk, 'name': 'Hall 1'})
+        self.assertEqual(self.client.get(reverse('api:facility_detail', args=[0])).status_code, 404)
+
+    def test_free_intervals(self):
+        """Test that the free intervals leave out confirmed bookings."""
+        facility = self.facilities[0]
+        day = timezone.localdate() + timezone.timedelta(days=2)
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(10)))
+        Booking.objects.create(
+            user=self.user, facility=facility, title="Busy",
+            start_time=start, end_time=start + timezone.timedelta(hours=2), status='confirmed',
+        )
+        url = reverse('api:facility_availability', args=[facility.pk])
+        free = self.client.get(url, {'date': day.isoformat()}).json()['free']
+        self.assertIn({'start': f'{day}T00:00:00Z', 'end': f'{day}T10:00:00Z'}, free)
+        self.assertIn({'start': f'{day}T12:00:00Z', 'end': f'{day + timezone.timedelta(days=1)}T00:00:00Z'}, free)
+        self.assertEqual(self.client.get(url, {'date': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {
+            'date': day.isoformat(), 'end_date': (day + timezone.timedelta(days=40)).isoformat(),
+        }).status_code, 400)
+
+
+class BookingApiTest(TestCase):
+    """Test the booking endpoints."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.other_user = User.objects.create_user(username='otheruser', password='password')
+        self.staff_user = User.objects.create_user(username='staffuser', password='password', is_staff=True)
+        self.facility = Facility.objects.create(name="Main Hall", location="North", capacity=10)
+        self.start = (timezone.now() + timezone.timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.bookings = [
+            Booking.objects.create(
+                user=self.user, facility=self.facility, title=f"Booking {hour}",
+                start_time=self.start + timezone.timedelta(hours=hour),
+                end_time=self.start + timezone.timedelta(hours=hour + 1),
+            )
+            for hour in range(5)
+        ]
+        self.foreign = Booking.objects.create(
+            user=self.other_user, facility=self.facility, title="Not yours",
+            start_time=self.start, end_time=self.start + timezone.timedelta(hours=1),
+        )
+        self.url = reverse('api:booking_list')
+
+    def test_authentication_required(self):
+        """Test that anonymous clients are refused."""
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_users_see_their_own_bookings(self):
+        """Test that users list their bookings, newest first, and staff list all."""
+        self.client.login(username='testuser', password='password')
+        response = self.client.get(self.url, {'fields': 'id'})
+        self.assertEqual([row['id'] for row in response.json()['results']],
+                         [booking.pk for booking in reversed(self.bookings)])
+        detail = reverse('api:booking_detail', args=[self.foreign.pk])
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(detail, {'fields': 'title,username,facility_name'})
+        self.assertEqual(response.json(), {'title': "Not yours", 'username': 'otheruser', 'facility_name': 'Main Hall'})
+
+    def test_list_query_count_does_not_grow(self):
+        """Test that a page costs the user lookup plus one query, whatever its size."""
+        self.client.login(username='testuser', password='password')
+        # Warms the cached facility choices of the filter form
+        self.client.get(self.url, {'status': 'pending'})
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'page_size': 2, 'status': 'pending'})
+        self.assertEqual(len(response.json()['results']), 2)
+        with self.assertNumQueries(2):
+            response = self.client.get(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 2)
+
+    async def test_served_asynchronously(self):
+        """Test the booking list and detail through the async request path."""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url, {'fields': 'id,title', 'page_size': 2})
+        self.assertEqual(response.json()['results'], [
+            {'id': booking.pk, 'title': booking.title} for booking in self.bookings[:2:-1]
+        ])
+        response = await self.async_client.get(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 2)
+        detail = reverse('api:booking_detail', args=[self.bookings[0].pk])
+        self.assertEqual((await self.async_client.get(detail)).json()['title'], "Booking 0")
+
+    async def test_async_views_keep_drf_checks(self):
+        """Test that the async views negotiate, throttle and check CSRF like any DRF view."""
+        client = AsyncClient(enforce_csrf_checks=True)
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.post(self.url, {'title': "No token"})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['detail'])
+        response = await client.get(self.url, headers={'Accept': 'text/csv'})
+        self.assertEqual(response.status_code, 406)
+
+        class OncePerMinute(AnonRateThrottle):
+            rate = '1/min'
+
+        url = reverse('api:facility_detail', args=[self.facility.pk])
+        with mock.patch('booking.apps.api.views.FacilityDetailView.throttle_classes', [OncePerMinute]):
+            self.assertEqual((await self.async_client.get(url)).status_code, 200)
+            response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_create_booking(self):
+        """Test that a booking is created for the requesting user."""
+        self.client.login(username='testuser', password='password')
+        start = self.start + timezone.timedelta(days=1)
+        response = self.client.post(self.url, {
+            'facility': self.facility.pk,
+            'title': "From the app",
+            'start_time': start.isoformat(),
+            'end_time': (start + timezone.timedelta(hours=1)).isoformat(),
+            'number_of_people': 3,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'pending')
+        booking = Booking.objects.get(pk=response.json()['id'])
+        self.assertEqual(booking.user, self.user)
+
+    def test_create_booking_is_validated(self):
+        """Test that the model validation applies to API writes."""
+        self.client.login(username='testuser', password='password')
+        start = self.start + timezone.timedelta(days=1)
+        data = {
+            'facility': self.facility.pk,
+            'title': "Too many",
+            'start_time': start.isoformat(),
+            'end_time': (start + timezone.timedelta(hours=1)).isoformat(),
+            'number_of_people': 50,
+        }
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('capacity', response.json()['non_field_errors'][0])
+        data.update(number_of_people=1, end_time=start.isoformat())
+        self.assertEqual(self.client.post(self.url, data).status_code, 400)
+        self.assertFalse(Booking.objects.filter(title="Too many").exists())
+
+
+class BookingBatchApiTest(TestCase):
+    """Test the batch endpoint."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.other_user = User.objects.create_user(username='otheruser', password='password')
+        self.staff_user = User.objects.create_user(username='staffuser', password='password', is_staff=True)
+        self.facility = Facility.objects.create(name="Main Hall", location="North", capacity=10)
+        self.start = (timezone.now() + timezone.timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.confirmed = self.create_booking(0, status='confirmed')
+        self.pending = self.create_booking(2)
+        self.overlapping = self.create_booking(2)
+        self.url = reverse('api:booking_batch')
+
+    def create_booking(self, hour, user=None, status='pending'):
+        """Create a one-hour booking starting ``hour`` hours after the test start."""
+        return create_booking(
+            user or self.user, self.facility, self.at(hour), self.at(hour + 1), status, title=f"Booking {hour}",
+        )
+
+    def at(self, hour):
+        """Return the time ``hour`` hours after the test start."""
+        return self.start + timezone.timedelta(hours=hour)
+
+    def create(self, hour, **data):
+        """Return a create operation for a one-hour booking."""
+        return {'action': 'create', 'data': {
+            'facility': self.facility.pk, 'title': f"New {hour}",
+            'start_time': self.at(hour).isoformat(), 'end_time': self.at(hour + 1).isoformat(), **data,
+        }}
+
+    def post(self, operations, **kwargs):
+        """Post a batch and return the response."""
+        return self.client.post(self.url, {'operations': operations, **kwargs}, content_type='application/json')
+
+    def test_mixed_batch(self):
+        """Test that one batch creates, cancels and confirms, with one grouped dispatch."""
+        self.client.login(username='staffuser', password='password')
+        with mock.patch('booking.apps.bookings.transitions.group') as group:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post([
+                    {'action': 'cancel', 'id': self.confirmed.pk},
+                    # Takes the time the cancellation frees
+                    self.create(0),
+                    {'action': 'confirm', 'id': self.pending.pk},
+                    {'action': 'confirm', 'id': self.overlapping.pk},
+                ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body['applied'])
+        self.assertEqual(body['failed'], 1)
+        self.assertEqual(
+            [result['status'] for result in body['results']],
+            ['cancelled', 'created', 'confirmed', 'error'],
+        )
+        self.assertIn('is confirmed instead', body['results'][3]['errors']['non_field_errors'][0])
+        self.assertEqual(Booking.objects.get(pk=self.pending.pk).status, 'confirmed')
+        created = Booking.objects.get(pk=body['results'][1]['id'])
+        self.assertEqual((created.user, created.status), (self.staff_user, 'pending'))
+
+        group.assert_called_once()
+        signatures = group.call_args[0][0]
+        self.assertEqual([signature.args for signature in signatures], [
+            ('cancellation', [self.confirmed.pk]),
+            ('confirmation', [self.pending.pk, created.pk]),
+        ])
+        group.return_value.apply_async.assert_called_once_with()
+
+    def test_cancellation_frees_time(self):
+        """Test that a cancelled confirmed booking's time can be booked in the same batch."""
+        self.client.login(username='staffuser', password='password')
+        response = self.post([self.create(0), {'action': 'cancel', 'id': self.confirmed.pk}])
+        self.assertEqual([result['status'] for result in response.json()['results']], ['created', 'cancelled'])
+        response = self.post([self.create(0)])
+        self.assertEqual(response.json()['results'][0]['status'], 'created')
+
+    def test_partial_failure(self):
+        """Test that failed operations are reported while the others apply."""
+        self.client.login(username='testuser', password='password')
+        response = self.post([
+            self.create(0),
+            self.create(5, number_of_people=50),
+            self.create(6, facility=0),
+            self.create(7, end_time=self.at(7).isoformat()),
+            {'action': 'confirm', 'id': self.pending.pk},
+            {'action': 'cancel', 'id': self.create_booking(8, user=self.other_user).pk},
+            {'action': 'cancel', 'id': self.overlapping.pk},
+            {'action': 'shred', 'id': self.pending.pk},
+            self.create(9),
+            {'action': 'cancel', 'id': self.confirmed.pk},
+            {'action': 'cancel', 'id': self.confirmed.pk},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['error', 'error', 'error', 'error', 'error', 'error', 'cancelled', 'error', 'created', 'error', 'error'],
+        )
+        self.assertIn('not available', results[0]['errors']['non_field_errors'][0])
+        self.assertIn('capacity', results[1]['errors']['non_field_errors'][0])
+        self.assertIn('facility', results[2]['errors'])
+        self.assertIn('End time', results[3]['errors']['non_field_errors'][0])
+        self.assertIn('staff', results[4]['errors']['non_field_errors'][0])
+        self.assertIn('No booking', results[5]['errors']['non_field_errors'][0])
+        self.assertIn('action', results[7]['errors'])
+        self.assertIn('more than one', results[9]['errors']['non_field_errors'][0])
+        self.assertEqual(Booking.objects.get(pk=self.overlapping.pk).status, 'cancelled')
+        self.assertTrue(Booking.objects.filter(pk=results[8]['id'], user=self.user).exists())
+
+    def test_atomic_batch_is_all_or_nothing(self):
+        """Test that an atomic batch with a failure changes nothing and notifies nobody."""
+        self.client.login(username='staffuser', password='password')
+        with mock.patch('booking.apps.bookings.transitions.group') as group:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post([
+                    {'action': 'cancel', 'id': self.confirmed.pk},
+                    self.create(5),
+                    self.create(6, number_of_people=50),
+                ], atomic=True)
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertFalse(body['applied'])
+        self.assertEqual(
+            [result['status'] for result in body['results']],
+            ['not_applied', 'not_applied', 'error'],
+        )
+        self.assertEqual(Booking.objects.get(pk=self.confirmed.pk).status, 'confirmed')
+        self.assertEqual(Booking.objects.count(), 3)
+        group.assert_not_called()
+
+        response = self.post([{'action': 'cancel', 'id': self.confirmed.pk}, self.create(5)], atomic=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Booking.objects.get(pk=self.confirmed.pk).status, 'cancelled')
+
+    def test_query_count_does_not_grow(self):
+        """Test that the number of queries does not depend on the batch size."""
+        self.client.login(username='staffuser', password='password')
+
+        def batch(first_hour, size):
+            bookings = [self.create_booking(hour) for hour in range(first_hour, first_hour + size)]
+            return [{'action': 'confirm', 'id': booking.pk} for booking in bookings] + [
+                self.create(hour) for hour in range(first_hour + 100, first_hour + 100 + size)
+            ] + [{'action': 'cancel', 'id': self.create_booking(first_hour + 200 + hour).pk} for hour in range(size)]
+
+        small, large = batch(10, 2), batch(20, 8)
+        self.post([self.create(1000)])
+        # User, savepoint, lock, cancel, conflict check, confirm, facilities, overlaps, insert,
+        # occupancy (insert, lock, bookings, update), release
+        with self.assertNumQueries(14):
+            self.post(small)
+        with self.assertNumQueries(14):
+            response = self.post(large)
+        self.assertEqual(response.json()['failed'], 0)
+
+    def test_envelope_is_validated(self):
+        """Test that a batch needs between one and ``max_operations`` operations."""
+        self.client.login(username='testuser', password='password')
+        self.assertEqual(self.post([]).status_code, 400)
+        with mock.patch('booking.apps.api.views.BookingBatchView.max_operations', 2):
+            response = self.post([self.create(5), self.create(6), self.create(7)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('operations', response.json())
+        self.client.logout()
+        self.assertEqual(self.post([self.create(5)]).status_code, 403)
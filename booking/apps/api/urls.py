@@ -0,0 +1,17 @@
+"""
+URL configuration for version 1 of the API.
+"""
+from django.urls import path
+
+from booking.apps.api import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('facilities/', views.FacilityListView.as_view(), name='facility_list'),
+    path('facilities/<int:pk>/', views.FacilityDetailView.as_view(), name='facility_detail'),
+    path('facilities/<int:pk>/availability/', views.FacilityAvailabilityView.as_view(), name='facility_availability'),
+    path('bookings/', views.BookingListView.as_view(), name='booking_list'),
+    path('bookings/batch/', views.BookingBatchView.as_view(), name='booking_batch'),
+    path('bookings/<int:pk>/', views.BookingDetailView.as_view(), name='booking_detail'),
+]
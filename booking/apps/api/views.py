@@ -0,0 +1,344 @@
+"""
+Views for version 1 of the API.
+
+Read paths skip model instances and serializers: they read the requested
+fields with ``values()``, joined columns included, and hand the dicts to
+the renderer. A list is one query for its page, plus the session lookups
+of an authenticated client.
+
+The read views are async, so under an ASGI server a worker holds many
+requests waiting on the database at once. They are DRF views built on
+AsyncAPIView, which runs DRF's dispatch with an awaited handler: content
+negotiation, versioning, authentication with its CSRF check, permissions
+and throttles run in one ``sync_to_async`` call before the handler, and
+errors are answered the way DRF answers them. Writes stay synchronous.
+"""
+import datetime
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import Http404
+from django.utils.translation import gettext_lazy as _
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from booking.apps.api.pagination import KeysetCursorPagination
+from booking.apps.api.serializers import (
+    BatchBookingSerializer, BatchOperationSerializer, BatchSerializer, BookingSerializer,
+)
+from booking.apps.bookings.batch import Operation, apply_batch
+from booking.apps.bookings.forms import BookingFilterForm
+from booking.apps.bookings.models import Booking
+from booking.apps.bookings.tasks import send_booking_confirmation
+from booking.apps.facilities import cache as facility_cache
+from booking.apps.facilities.forms import FacilityFilterForm
+from booking.apps.facilities.models import Facility
+
+# Public field names and the lookups they are read from
+FACILITY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'location': 'location',
+    'capacity': 'capacity',
+    'description': 'description',
+    'is_active': 'is_active',
+    'opening_time': 'opening_time',
+    'closing_time': 'closing_time',
+    'updated_at': 'updated_at',
+}
+BOOKING_FIELDS = {
+    'id': 'id',
+    'facility_id': 'facility_id',
+    'facility_name': 'facility__name',
+    'user_id': 'user_id',
+    'username': 'user__username',
+    'title': 'title',
+    'description': 'description',
+    'start_time': 'start_time',
+    'end_time': 'end_time',
+    'status': 'status',
+    'number_of_people': 'number_of_people',
+    'series_id': 'series_id',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+class SparseFieldsMixin:
+    """
+    Serialize read paths from ``values()``, restricted by ``?fields=``.
+
+    Views declare ``api_fields``, mapping each public field name to the
+    lookup it is read from. The fields the pagination orders by are always
+    read, but only returned when asked for.
+    """
+    api_fields = {}
+    fields_param = 'fields'
+    keyset_ordering = ()
+
+    def get_field_names(self):
+        """Return the requested field names, all by default."""
+        raw = self.request.query_params.get(self.fields_param)
+        if not raw:
+            return list(self.api_fields)
+        names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.api_fields]
+        if unknown or not names:
+            raise ValidationError({self.fields_param: [
+                _('Unknown fields: %(fields)s. Choose from: %(choices)s.') % {
+                    'fields': ', '.join(unknown), 'choices': ', '.join(self.api_fields),
+                }
+            ]})
+        return names
+
+    def get_values(self, queryset):
+        """Return ``values()`` of the requested fields and the ordering fields."""
+        names = self.get_field_names()
+        plain = [name for name in names if self.api_fields[name] == name]
+        joined = {name: F(self.api_fields[name]) for name in names if self.api_fields[name] != name}
+        plain += [
+            name.lstrip('-') for name in self.keyset_ordering
+            if name.lstrip('-') not in plain
+        ]
+        return queryset.values(*plain, **joined)
+
+    def restrict(self, rows):
+        """Drop the fields that were only read for the pagination."""
+        names = self.get_field_names()
+        return [{name: row[name] for name in names} for row in rows]
+
+    async def list(self, queryset):
+        """Return a page of the queryset's rows."""
+        page = await self.paginator.apaginate_queryset(self.get_values(queryset), self.request, view=self)
+        return self.get_paginated_response(self.restrict(page))
+
+    async def retrieve_values(self, queryset, **lookup):
+        """Return the row of one object, or raise Http404."""
+        rows = self.restrict([row async for row in self.get_values(queryset.filter(**lookup))[:1]])
+        if not rows:
+            raise Http404(_('No object found matching the query'))
+        return rows[0]
+
+
+def filter_with_form(form_class, query_params, queryset):
+    """
+    Filter a queryset with a filter form bound to the query parameters.
+
+    Building a form costs more than the query behind a small page, so it is
+    skipped when none of its fields were given. Invalid filters raise a DRF
+    ValidationError.
+    """
+    if query_params.keys().isdisjoint(form_class.base_fields):
+        return queryset
+    form = form_class(query_params)
+    if not form.is_valid():
+        raise ValidationError({
+            'non_field_errors' if field == '__all__' else field: messages
+            for field, messages in form.errors.items()
+        })
+    return form.filter_queryset(queryset)
+
+
+class AsyncAPIView(generics.GenericAPIView):
+    """
+    Base for the async read views.
+
+    Handlers are coroutines returning a Response. ``dispatch`` follows
+    ``APIView.dispatch`` step for step; only the checks that may query,
+    ``initial()``, move to a worker thread, and the handler is awaited.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Run DRF's checks, then await the handler and finalize its response."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS is answered by DRF's synchronous metadata handler
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def get_facility(pk):
+    """Return a facility from the facility cache, or raise Http404."""
+    try:
+        return await sync_to_async(facility_cache.get_facility)(pk)
+    except Facility.DoesNotExist:
+        raise Http404(_('No facility found matching the query'))
+
+
+class FacilityListView(SparseFieldsMixin, AsyncAPIView):
+    """
+    List the active facilities.
+
+    Takes the filters of the facility list; with ``available_from`` and
+    ``available_to`` it lists the facilities free for that period.
+    """
+    permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetCursorPagination
+    api_fields = FACILITY_FIELDS
+    keyset_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        """Return the filtered active facilities."""
+        # The facility filters build the query without running one
+        queryset = Facility.objects.filter(is_active=True)
+        return filter_with_form(FacilityFilterForm, self.request.query_params, queryset)
+
+    async def get(self, request, *args, **kwargs):
+        """Return a page of facilities."""
+        return await self.list(self.get_queryset())
+
+
+class FacilityDetailView(SparseFieldsMixin, AsyncAPIView):
+    """Show a facility, from the cache the facility pages share."""
+    permission_classes = [permissions.AllowAny]
+    api_fields = FACILITY_FIELDS
+
+    async def get(self, request, pk, *args, **kwargs):
+        """Return the facility."""
+        facility = await get_facility(pk)
+        return Response({name: getattr(facility, self.api_fields[name]) for name in self.get_field_names()})
+
+
+class FacilityAvailabilityView(AsyncAPIView):
+    """
+    List the free intervals of a facility within its opening hours.
+
+    Takes ``date`` and an optional inclusive ``end_date``, at most
+    ``max_days`` apart.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_days = 31
+
+    async def get(self, request, pk, *args, **kwargs):
+        """Return the free intervals of the requested days."""
+        facility = await get_facility(pk)
+        first_day = self.parse_date('date', required=True)
+        last_day = self.parse_date('end_date') or first_day
+        if last_day < first_day or (last_day - first_day).days >= self.max_days:
+            raise ValidationError({'end_date': [
+                _('The range must cover 1 to %(days)d days.') % {'days': self.max_days}
+            ]})
+        free = await sync_to_async(facility.get_free_intervals)(first_day, last_day)
+        return Response({
+            'facility_id': facility.pk,
+            'date': first_day,
+            'end_date': last_day,
+            'free': [{'start': start, 'end': end} for start, end in free],
+        })
+
+    def parse_date(self, param, required=False):
+        """Parse a ``YYYY-MM-DD`` query parameter."""
+        value = self.request.query_params.get(param)
+        if not value:
+            if required:
+                raise ValidationError({param: [_('This field is required.')]})
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({param: [_('Enter a valid date.')]})
+
+
+class BookingQuerysetMixin:
+    """Limit bookings to the requesting user's, or all of them for staff."""
+
+    def get_queryset(self):
+        """Return the bookings the user may see."""
+        if self.request.user.is_staff:
+            return Booking.objects.all()
+        return Booking.objects.filter(user=self.request.user)
+
+
+class BookingListView(BookingQuerysetMixin, SparseFieldsMixin, AsyncAPIView):
+    """
+    List bookings, newest first, or create one.
+
+    Takes the filters of the booking list. Creation runs synchronously in a
+    worker thread.
+    """
+    pagination_class = KeysetCursorPagination
+    serializer_class = BookingSerializer
+    api_fields = BOOKING_FIELDS
+    keyset_ordering = ('-start_time', '-id')
+
+    async def get(self, request, *args, **kwargs):
+        """Return a page of bookings."""
+        queryset = self.get_queryset()
+        if not request.query_params.keys().isdisjoint(BookingFilterForm.base_fields):
+            # The booking filters may read facility choices or search matches
+            queryset = await sync_to_async(filter_with_form)(BookingFilterForm, request.query_params, queryset)
+        return await self.list(queryset)
+
+    async def post(self, request, *args, **kwargs):
+        """Create a booking for the requesting user."""
+        return await sync_to_async(self.create)(request)
+
+    def create(self, request):
+        """Create the booking and queue its acknowledgement."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        booking = serializer.save()
+        send_booking_confirmation.delay(booking.pk)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class BookingDetailView(BookingQuerysetMixin, SparseFieldsMixin, AsyncAPIView):
+    """Show a booking."""
+    api_fields = BOOKING_FIELDS
+
+    async def get(self, request, pk, *args, **kwargs):
+        """Return the booking."""
+        return Response(await self.retrieve_values(self.get_queryset(), pk=pk))
+
+
+class BookingBatchView(generics.GenericAPIView):
+    """
+    Create, cancel and confirm many bookings in one request.
+
+    Takes ``operations``, each an ``action`` with the ``id`` of the booking
+    to cancel or confirm, or the ``data`` of the booking to create, and an
+    optional ``atomic`` flag. Returns the outcome of every operation, in
+    order; an atomic batch with a failed operation is a 400 and changes
+    nothing.
+    """
+    serializer_class = BatchSerializer
+    max_operations = 500
+
+    def post(self, request, *args, **kwargs):
+        """Apply the batch and return the outcome of every operation."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = [self.parse_operation(raw) for raw in serializer.validated_data['operations']]
+        result = apply_batch(request.user, operations, atomic=serializer.validated_data['atomic'])
+        if result.atomic and not result.applied:
+            return Response(result.as_dict(), status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())
+
+    def parse_operation(self, raw):
+        """Validate one raw operation into an Operation, failed if invalid."""
+        serializer = BatchOperationSerializer(data=raw)
+        if not serializer.is_valid():
+            return Operation(raw.get('action'), errors=serializer.errors)
+        action = serializer.validated_data['action']
+        if action != 'create':
+            return Operation(action, booking_id=serializer.validated_data['id'])
+        booking = BatchBookingSerializer(data=serializer.validated_data['data'])
+        if not booking.is_valid():
+            return Operation(action, errors=booking.errors)
+        return Operation(action, values=booking.validated_data)
@@ -0,0 +1,236 @@
+"""
+Vectorized utilization analytics over the bookings table.
+
+The bookings overlapping a range are read once with a ``values_list()``
+query over a server-side cursor, with timestamps converted to epoch seconds
+and statuses to small integers by the database, straight into integer
+column arrays; as every column is already an integer, the rows skip the
+ORM's per-value converters. Everything else is array arithmetic: bookings are cut into the
+hours they cover with one ``repeat``, and heatmaps and ratios are
+``bincount`` over facility and hour-of-week indexes, so no Python code
+runs per booking.
+
+Hours of the week are counted from Monday 00:00 in the project's default
+timezone. The data has no attendance record, so no-shows are approximated
+by late cancellations and by pending requests that lapsed unconfirmed.
+"""
+import datetime
+import itertools
+
+import numpy as np
+from django.db import connections
+from django.db.models import BigIntegerField, Case, Func, IntegerField, Value, When
+from django.utils import timezone
+
+from booking.apps.bookings import occupancy
+from booking.apps.core.timewindow import day_window
+from booking.apps.facilities.availability import expand_ranges
+
+HOUR = 3600
+HOURS_PER_WEEK = 7 * 24
+# The epoch fell on a Thursday, 72 hours after the start of its week
+EPOCH_HOUR_OF_WEEK = 72
+# A cancellation this close to the start counts as a late cancellation
+LATE_CANCELLATION = datetime.timedelta(hours=24)
+STATUS_CODES = {'pending': 0, 'confirmed': 1, 'cancelled': 2}
+COLUMNS = ('facility', 'status', 'start', 'end', 'updated')
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+class Epoch(Func):
+    """Whole seconds since the epoch of a datetime expression."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)::bigint'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite stores datetimes as UTC text
+        template = "CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)"
+        return self.as_sql(compiler, connection, template=template, **extra_context)
+
+
+def load_columns(start, end, facility_ids=None, chunk_size=20000):
+    """
+    Load the bookings overlapping a time range as int64 column arrays.
+
+    Returns a dict with the ``COLUMNS`` keys: facility IDs, status codes
+    from ``STATUS_CODES``, and start, end and last update times in epoch
+    seconds.
+    """
+    from booking.apps.bookings.models import Booking
+
+    queryset = Booking.objects.filter(start_time__lt=end, end_time__gt=start)
+    if facility_ids is not None:
+        queryset = queryset.filter(facility_id__in=facility_ids)
+    rows = queryset.order_by().values_list(
+        'facility_id',
+        Case(
+            *(When(status=status, then=Value(code)) for status, code in STATUS_CODES.items()),
+            output_field=IntegerField(),
+        ),
+        Epoch('start_time'),
+        Epoch('end_time'),
+        Epoch('updated_at'),
+    )
+    sql, params = rows.query.sql_with_params()
+    with connections[rows.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        chunks = iter(lambda: cursor.fetchmany(chunk_size), [])
+        values = itertools.chain.from_iterable(itertools.chain.from_iterable(chunks))
+        table = np.fromiter(values, dtype=np.int64).reshape(-1, len(COLUMNS))
+    return {name: table[:, index] for index, name in enumerate(COLUMNS)}
+
+
+def hour_offsets(first_hour, last_hour, tz):
+    """Return the UTC offset in seconds of every epoch hour from ``first_hour`` to ``last_hour`` (exclusive)."""
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    offsets = np.empty(max(last_hour - first_hour, 0), dtype=np.int64)
+    for index in range(len(offsets)):
+        instant = epoch + datetime.timedelta(hours=first_hour + index)
+        offsets[index] = instant.astimezone(tz).utcoffset().total_seconds()
+    return offsets
+
+
+class UtilizationReport:
+    """
+    Utilization analytics of facilities over a range of local days.
+
+    Attributes:
+        first_day, last_day: The range of the report (inclusive).
+        facility_ids: Facilities with bookings in the range, sorted; the row
+            order of the heatmaps and counts.
+        booked: Confirmed hours per facility and hour of the week.
+        requested: Requested hours, whatever the status, per facility and
+            hour of the week.
+        week_hours: How often each hour of the week occurs in the range.
+        counts: ``{name: array}`` of booking counts per facility, over the
+            bookings starting in the range.
+    """
+
+    def __init__(self, first_day, last_day, facility_ids=None, now=None):
+        tz = occupancy.get_timezone()
+        self.first_day, self.last_day = first_day, last_day
+        start, end = day_window(first_day, last_day, tz)
+        range_start, range_end = int(start.timestamp()), int(end.timestamp())
+        columns = load_columns(start, end, facility_ids)
+
+        self.facility_ids, facility = np.unique(columns['facility'], return_inverse=True)
+        size = len(self.facility_ids)
+        status = columns['status']
+
+        # Cut every booking, clipped to the range, into the hours it covers
+        starts = np.maximum(columns['start'], range_start)
+        ends = np.minimum(columns['end'], range_end)
+        first_hour, last_hour = range_start // HOUR, -(-range_end // HOUR)
+        booking, hour = expand_ranges(starts // HOUR, -(-ends // HOUR))
+        seconds = np.minimum(ends[booking], (hour + 1) * HOUR) - np.maximum(starts[booking], hour * HOUR)
+
+        offsets = hour_offsets(first_hour, last_hour, tz)
+        grid = np.arange(first_hour, last_hour)
+        grid_week_hour = (grid + offsets // HOUR + EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK
+        week_hour = grid_week_hour[hour - first_hour]
+        self.week_hours = np.bincount(grid_week_hour, minlength=HOURS_PER_WEEK)
+
+        cell = facility[booking] * HOURS_PER_WEEK + week_hour
+        cells = size * HOURS_PER_WEEK
+        confirmed = status[booking] == STATUS_CODES['confirmed']
+        shape = (size, HOURS_PER_WEEK)
+        self.booked = np.bincount(cell, weights=seconds * confirmed, minlength=cells).reshape(shape) / HOUR
+        self.requested = np.bincount(cell, weights=seconds, minlength=cells).reshape(shape) / HOUR
+
+        # Ratios cover the bookings starting in the range, once each
+        starting = columns['start'] >= range_start
+        now = int((now or timezone.now()).timestamp())
+        cancelled = status == STATUS_CODES['cancelled']
+        late = cancelled & (columns['start'] - columns['updated'] < LATE_CANCELLATION.total_seconds())
+        lapsed = (status == STATUS_CODES['pending']) & (columns['end'] <= now)
+        self.counts = {
+            name: np.bincount(facility[starting & mask], minlength=size)
+            for name, mask in (
+                ('bookings', np.ones(len(status), dtype=bool)),
+                ('confirmed', status == STATUS_CODES['confirmed']),
+                ('cancelled', cancelled),
+                ('late_cancelled', late),
+                ('lapsed', lapsed),
+            )
+        }
+
+    def occupancy(self):
+        """Return the confirmed fraction of each facility's hours of the week."""
+        return self.booked / np.maximum(self.week_hours, 1)
+
+    def ratios(self):
+        """
+        Return the cancellation and no-show ratios of every facility.
+
+        Returns a list of dicts, busiest facilities first.
+        """
+        counts = self.counts
+        total = np.maximum(counts['bookings'], 1)
+        cancellation = counts['cancelled'] / total
+        no_show = (counts['late_cancelled'] + counts['lapsed']) / total
+        order = np.argsort(-counts['bookings'], kind='stable')
+        return [
+            {
+                'facility_id': int(self.facility_ids[index]),
+                **{name: int(values[index]) for name, values in counts.items()},
+                'cancellation_ratio': round(float(cancellation[index]), 4),
+                'no_show_ratio': round(float(no_show[index]), 4),
+            }
+            for index in order
+        ]
+
+    def peak_windows(self, limit=10):
+        """
+        Return the busiest stretches of the week by requested hours, over all facilities.
+
+        The ``limit`` busiest hours of the week are merged into runs of
+        consecutive hours. Returns a list of dicts, busiest first.
+        """
+        requested, booked = self.requested.sum(axis=0), self.booked.sum(axis=0)
+        top = np.sort(np.argsort(-requested, kind='stable')[:limit])
+        top = top[requested[top] > 0]
+        if not len(top):
+            return []
+        runs = np.split(top, np.flatnonzero(np.diff(top) != 1) + 1)
+        windows = [
+            {
+                'weekday': WEEKDAYS[run[0] // 24],
+                'start_hour': int(run[0] % 24),
+                'end_hour': int(run[-1] % 24) + 1,
+                'requested_hours': round(float(requested[run].sum()), 2),
+                'booked_hours': round(float(booked[run].sum()), 2),
+            }
+            for run in runs
+        ]
+        return sorted(windows, key=lambda window: -window['requested_hours'])
+
+    def total_heatmap(self):
+        """Return the requested and booked hours of all facilities as ``7 x 24`` arrays."""
+        return self.requested.sum(axis=0).reshape(7, 24), self.booked.sum(axis=0).reshape(7, 24)
+
+    def heatmap_rows(self):
+        """Yield ``(facility_id, weekday, hour, requested_hours, booked_hours, occupancy)`` for the non-empty cells."""
+        facility, week_hour = np.nonzero(self.requested)
+        columns = zip(
+            self.facility_ids[facility].tolist(),
+            (week_hour // 24).tolist(),
+            (week_hour % 24).tolist(),
+            np.round(self.requested[facility, week_hour], 2).tolist(),
+            np.round(self.booked[facility, week_hour], 2).tolist(),
+            np.round(self.occupancy()[facility, week_hour], 4).tolist(),
+        )
+        for facility_id, weekday, hour, requested, booked, fraction in columns:
+            yield facility_id, WEEKDAYS[weekday], hour, requested, booked, fraction
+
+    def as_dict(self):
+        """Return the report as a JSON-serialisable dict."""
+        return {
+            'first_day': self.first_day.isoformat(),
+            'last_day': self.last_day.isoformat(),
+            'facility_ids': self.facility_ids.tolist(),
+            'requested_hours': np.round(self.requested, 2).tolist(),
+            'booked_hours': np.round(self.booked, 2).tolist(),
+            'week_hours': self.week_hours.tolist(),
+            'peak_windows': self.peak_windows(),
+            'ratios': self.ratios(),
+        }
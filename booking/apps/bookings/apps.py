@@ -10,3 +10,7 @@ class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking.apps.bookings'
     verbose_name = _('Bookings')
+    
+    def ready(self):
+        """Connect signal handlers."""
+        from booking.apps.bookings import signals  # noqa: F401
@@ -0,0 +1,304 @@
+"""
+Batches of booking operations applied together.
+
+A batch mixes creations, cancellations and confirmations. It is checked
+with a fixed number of set-based queries, whatever its size: the
+referenced bookings are loaded and locked in one query, confirmations are
+checked with the window query of ``transitions.find_conflicts``, and new
+bookings are checked against the confirmed bookings of their facilities
+with one range query. Cancellations apply first, so the time they free may
+be confirmed or booked by the same batch.
+
+Everything happens in one transaction. Operations that fail are reported
+with their errors and the others are applied, unless the batch is atomic,
+in which case a single failure leaves everything unchanged. The
+notification emails of the whole batch are queued as one grouped dispatch
+once the transaction commits.
+"""
+import bisect
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from booking.apps.bookings.models import OVERLAP_ERROR, Booking, is_overlap_violation
+from booking.apps.bookings.transitions import after_change, find_conflicts, queue_notifications
+from booking.apps.facilities.models import Facility
+
+ACTIONS = ('create', 'cancel', 'confirm')
+TARGET_STATUS = {'cancel': 'cancelled', 'confirm': 'confirmed'}
+
+
+class Operation:
+    """
+    One operation of a batch and its outcome.
+
+    Args:
+        action: One of ACTIONS.
+        booking_id: The booking to cancel or confirm.
+        values: The field values of the booking to create, with
+            ``facility_id`` rather than ``facility``.
+        errors: ``{field: [messages]}`` found while parsing the operation;
+            such an operation is reported and never applied.
+
+    Attributes:
+        status: ``created``, ``cancelled``, ``confirmed``, ``unchanged`` when
+            the booking already had the requested status, ``error``, or
+            ``not_applied`` when an atomic batch was rolled back.
+        errors: ``{field: [messages]}`` explaining an ``error`` status.
+    """
+
+    def __init__(self, action, booking_id=None, values=None, errors=None):
+        self.action = action
+        self.booking_id = booking_id
+        self.values = values or {}
+        self.invalid = errors
+        self.reset()
+
+    def reset(self):
+        """Forget the outcome of a previous attempt."""
+        self.status = 'error' if self.invalid else None
+        self.errors = self.invalid
+        self.created_id = None
+
+    def fail(self, message, field='non_field_errors'):
+        """Mark the operation as failed."""
+        self.status = 'error'
+        self.errors = {field: [str(message)]}
+
+    def as_dict(self, index):
+        """Return the outcome as a JSON-serialisable dict."""
+        result = {
+            'index': index,
+            'action': self.action,
+            'id': self.booking_id or self.created_id,
+            'status': self.status,
+        }
+        if self.errors:
+            result['errors'] = self.errors
+        return result
+
+
+class BatchResult:
+    """
+    The outcome of a batch.
+
+    Attributes:
+        operations: The operations, in request order.
+        atomic: Whether a single failure rolls back the whole batch.
+        applied: Whether the changes were committed.
+    """
+
+    def __init__(self, operations, atomic):
+        self.operations = operations
+        self.atomic = atomic
+        self.applied = False
+
+    @property
+    def failed(self):
+        """Return the number of failed operations."""
+        return sum(operation.status == 'error' for operation in self.operations)
+
+    def as_dict(self):
+        """Return the result as a JSON-serialisable dict."""
+        return {
+            'atomic': self.atomic,
+            'applied': self.applied,
+            'failed': self.failed,
+            'results': [operation.as_dict(index) for index, operation in enumerate(self.operations)],
+        }
+
+
+class RolledBack(Exception):
+    """Raised inside the transaction to undo an atomic batch with failures."""
+
+
+def apply_batch(user, operations, atomic=False, notify=True):
+    """
+    Apply a batch of operations for a user in one transaction.
+
+    Users may create bookings and cancel their own; staff may cancel any
+    booking and confirm pending ones.
+
+    Args:
+        user: The requesting user, who owns the created bookings.
+        operations: A list of Operation objects, updated with their outcome.
+        atomic: Apply nothing unless every operation succeeds.
+        notify: Queue the confirmation and cancellation emails.
+
+    Returns:
+        A BatchResult.
+    """
+    result = BatchResult(operations, atomic)
+    # The exclusion constraint stays the final authority: if a concurrent
+    # writer confirmed an overlapping booking meanwhile, check again.
+    for attempt in range(3):
+        for operation in operations:
+            operation.reset()
+        try:
+            with transaction.atomic():
+                _apply(user, operations, atomic, notify)
+        except RolledBack:
+            for operation in operations:
+                if operation.status != 'error':
+                    operation.status = 'not_applied'
+            return result
+        except IntegrityError as e:
+            if not is_overlap_violation(e) or attempt == 2:
+                raise
+            continue
+        result.applied = True
+        return result
+
+
+def _apply(user, operations, atomic, notify):
+    """Check and apply the operations inside the current transaction."""
+    duplicates = set()
+    seen = set()
+    for operation in operations:
+        if operation.booking_id in seen:
+            duplicates.add(operation.booking_id)
+        elif operation.booking_id:
+            seen.add(operation.booking_id)
+
+    rows = {
+        row[0]: row for row in Booking.objects.select_for_update().filter(pk__in=seen).values_list(
+            'pk', 'user_id', 'status', 'facility_id', 'start_time', 'end_time',
+        )
+    } if seen else {}
+    to_cancel, to_confirm = {}, {}
+    for operation in operations:
+        if operation.status or operation.action == 'create':
+            continue
+        row = rows.get(operation.booking_id)
+        if operation.booking_id in duplicates:
+            operation.fail(_('The batch holds more than one operation on this booking.'))
+        elif row is None or not (user.is_staff or row[1] == user.pk):
+            operation.fail(_('No booking found matching the query.'))
+        elif operation.action == 'confirm' and not user.is_staff:
+            operation.fail(_('Only staff can confirm bookings.'))
+        elif row[2] == TARGET_STATUS[operation.action]:
+            operation.status = 'unchanged'
+        elif operation.action == 'confirm' and row[2] != 'pending':
+            operation.fail(_('Only pending bookings can be confirmed.'))
+        elif operation.action == 'cancel':
+            to_cancel[operation.booking_id] = operation
+        else:
+            to_confirm[operation.booking_id] = operation
+
+    intervals, booked = [], []
+    if to_cancel:
+        Booking.objects.filter(pk__in=list(to_cancel)).update(status='cancelled', updated_at=timezone.now())
+        for pk, operation in to_cancel.items():
+            operation.status = 'cancelled'
+            booked.append(rows[pk][3:])
+            if rows[pk][2] == 'confirmed':
+                intervals.append(rows[pk][3:])
+
+    winners, conflicts = find_conflicts({pk: rows[pk][3:] for pk in to_confirm})
+    for pk, reason in conflicts.items():
+        to_confirm[pk].fail(reason)
+    if winners:
+        Booking.objects.filter(pk__in=winners).update(status='confirmed', updated_at=timezone.now())
+        for pk in winners:
+            to_confirm[pk].status = 'confirmed'
+            booked.append(rows[pk][3:])
+            intervals.append(rows[pk][3:])
+
+    created = create_bookings(user, [operation for operation in operations if operation.action == 'create'])
+    booked += [(booking.facility_id, booking.start_time, booking.end_time) for booking in created]
+
+    if atomic and any(operation.status == 'error' for operation in operations):
+        raise RolledBack()
+    changed = list(to_cancel) + winners + [booking.pk for booking in created]
+    if changed:
+        after_change(intervals, booked, changed)
+    if notify:
+        queue_notifications({
+            'cancellation': list(to_cancel),
+            # New bookings get the same acknowledgement as on the booking form
+            'confirmation': winners + [booking.pk for booking in created],
+        })
+
+
+def create_bookings(user, operations):
+    """
+    Check and insert the bookings of the create operations.
+
+    Capacities come from one query and overlaps with confirmed bookings from
+    another; the new bookings are pending, so they may overlap each other.
+
+    Returns:
+        The created Booking objects.
+    """
+    candidates = [operation for operation in operations if not operation.status]
+    if not candidates:
+        return []
+    capacities = dict(Facility.objects.filter(
+        pk__in={operation.values['facility_id'] for operation in candidates}, is_active=True,
+    ).values_list('pk', 'capacity'))
+    valid = []
+    for operation in candidates:
+        capacity = capacities.get(operation.values['facility_id'])
+        if capacity is None:
+            operation.fail(_('No active facility found matching the query.'), 'facility')
+        elif operation.values.get('number_of_people', 1) > capacity:
+            operation.fail(_('Number of people exceeds facility capacity of %(capacity)s.') % {'capacity': capacity})
+        else:
+            valid.append(operation)
+
+    busy = confirmed_spans([
+        (operation.values['facility_id'], operation.values['start_time'], operation.values['end_time'])
+        for operation in valid
+    ])
+    accepted = []
+    for operation in valid:
+        starts, ends = busy.get(operation.values['facility_id'], ((), ()))
+        index = bisect.bisect_right(ends, operation.values['start_time'])
+        if index < len(starts) and starts[index] < operation.values['end_time']:
+            operation.fail(OVERLAP_ERROR)
+        else:
+            accepted.append(operation)
+
+    bookings = Booking.objects.bulk_create([Booking(user=user, **operation.values) for operation in accepted])
+    for operation, booking in zip(accepted, bookings):
+        operation.status = 'created'
+        operation.created_id = booking.pk
+    return bookings
+
+
+def confirmed_spans(intervals):
+    """
+    Load the confirmed bookings that may overlap some intervals.
+
+    Args:
+        intervals: ``(facility_id, start_time, end_time)`` tuples.
+
+    Returns:
+        ``{facility_id: (starts, ends)}``, two lists sorted by start. The
+        confirmed bookings of a facility are disjoint, so both are sorted.
+    """
+    if not intervals:
+        return {}
+    by_facility = defaultdict(list)
+    for facility_id, start_time, end_time in intervals:
+        by_facility[facility_id].append((start_time, end_time))
+    spans = reduce(operator.or_, (
+        Q(
+            facility_id=facility_id,
+            start_time__lt=max(end for start, end in pairs),
+            end_time__gt=min(start for start, end in pairs),
+        )
+        for facility_id, pairs in by_facility.items()
+    ))
+    busy = defaultdict(lambda: ([], []))
+    for facility_id, start_time, end_time in Booking.objects.filter(
+        spans, status='confirmed',
+    ).order_by('facility_id', 'start_time').values_list('facility_id', 'start_time', 'end_time'):
+        busy[facility_id][0].append(start_time)
+        busy[facility_id][1].append(end_time)
+    return busy
@@ -0,0 +1,76 @@
+"""
+Streaming exports of bookings as CSV or NDJSON.
+
+Rows come from a ``values()`` iterator with the facility and user columns
+joined in, and are encoded a batch at a time, optionally gzipped on the fly,
+so an export runs in constant memory whatever its size.
+
+On PostgreSQL ``iterator()`` reads through a server-side cursor. Outside a
+transaction Django declares it ``WITH HOLD``, and PostgreSQL then computes
+the whole result before returning the first row; the rows are therefore
+read inside a transaction, which also makes the export a consistent
+snapshot.
+
+CSV exports are opened in spreadsheets, so text cells that a spreadsheet
+would read as a formula are prefixed with a quote.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from booking.apps.core.streaming import csv_chunks, ndjson_chunks
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 5000
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+# Booking fields exported under their own names
+FIELDS = (
+    'id', 'status', 'title', 'description', 'start_time', 'end_time', 'number_of_people',
+    'series_id', 'created_at', 'updated_at', 'facility_id', 'user_id',
+)
+# Joined columns and the lookups they are read from
+JOINED = {
+    'facility_name': F('facility__name'),
+    'facility_location': F('facility__location'),
+    'username': F('user__username'),
+    'user_email': F('user__email'),
+}
+COLUMNS = (*FIELDS, *JOINED)
+DATETIME_COLUMNS = ('start_time', 'end_time', 'created_at', 'updated_at')
+# Leading characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def neutralize_formula(value):
+    """Prefix a text cell with a quote if a spreadsheet would read it as a formula."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the export dicts of some bookings, in ID order.
+
+    Datetimes are formatted in ISO 8601, so both formats write them alike.
+    """
+    rows = queryset.order_by('pk').values(*FIELDS, **JOINED).iterator(chunk_size=chunk_size)
+    with transaction.atomic(using=queryset.db):
+        for row in rows:
+            for name in DATETIME_COLUMNS:
+                row[name] = row[name].isoformat()
+            yield row
+
+
+def export_chunks(queryset, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the text chunks of an export in a format from ``FORMATS``."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}.')
+    rows = export_rows(queryset, chunk_size)
+    if fmt == 'csv':
+        return csv_chunks(
+            ([neutralize_formula(value) for value in row.values()] for row in rows), header=list(COLUMNS),
+        )
+    return ndjson_chunks(rows)
@@ -7,7 +7,9 @@ from django.utils.translation import gettext_lazy as _
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field
 
-from booking.apps.bookings.models import Booking
+from booking.apps.bookings.models import Booking, BookingSeries
+from booking.apps.core.timewindow import date_range_filter
+from booking.apps.facilities.cache import get_active_facility_choices
 from booking.apps.facilities.models import Facility
 
 
@@ -80,6 +82,69 @@ class BookingForm(forms.ModelForm):
         return cleaned_data
 
 
+class BookingSeriesForm(forms.ModelForm):
+    """Form for creating a recurring booking series."""
+    skip_conflicts = forms.BooleanField(
+        label=_('Skip occurrences that conflict with existing bookings'),
+        required=False
+    )
+    
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        
+        # Filter active facilities only
+        self.fields['facility'].queryset = Facility.objects.filter(is_active=True)
+        
+        # Use better widgets for date and datetime fields
+        for name in ('start_time', 'end_time'):
+            self.fields[name].widget = forms.DateTimeInput(
+                attrs={'type': 'datetime-local'},
+                format='%Y-%m-%dT%H:%M'
+            )
+        self.fields['until'].widget = forms.DateInput(attrs={'type': 'date'})
+        
+        if self.user:
+            self.instance.user = self.user
+        
+        # Setup Crispy form layout
+        self.helper = FormHelper()
+        self.helper.form_tag = False
+        self.helper.layout = Layout(
+            Field('facility'),
+            Field('title'),
+            Row(
+                Column('start_time', css_class='form-group col-md-6'),
+                Column('end_time', css_class='form-group col-md-6'),
+                css_class='form-row'
+            ),
+            Row(
+                Column('frequency', css_class='form-group col-md-6'),
+                Column('interval', css_class='form-group col-md-6'),
+                css_class='form-row'
+            ),
+            Row(
+                Column('until', css_class='form-group col-md-6'),
+                Column('count', css_class='form-group col-md-6'),
+                css_class='form-row'
+            ),
+            Row(
+                Column('number_of_people', css_class='form-group col-md-6'),
+                css_class='form-row'
+            ),
+            Field('description'),
+            Field('skip_conflicts'),
+        )
+    
+    class Meta:
+        """Meta options for the form."""
+        model = BookingSeries
+        fields = [
+            'facility', 'title', 'description', 'start_time', 'end_time',
+            'frequency', 'interval', 'until', 'count', 'number_of_people'
+        ]
+
+
 class BookingFilterForm(forms.Form):
     """Form for filtering bookings."""
     STATUS_CHOICES = (
@@ -89,9 +154,10 @@ class BookingFilterForm(forms.Form):
         ('cancelled', _('Cancelled')),
     )
     
-    facility = forms.ModelChoiceField(
+    facility = forms.TypedChoiceField(
         label=_('Facility'),
-        queryset=Facility.objects.filter(is_active=True),
+        coerce=int,
+        empty_value=None,
         required=False
     )
     status = forms.ChoiceField(
@@ -113,6 +179,9 @@ class BookingFilterForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
+        # The choices come from the cache, so rendering the form costs no query
+        self.fields['facility'].choices = [('', '---------'), *get_active_facility_choices()]
+        
         # Setup Crispy form layout
         self.helper = FormHelper()
         self.helper.form_method = 'get'
@@ -138,15 +207,77 @@ class BookingFilterForm(forms.Form):
         date_to = self.cleaned_data.get('date_to')
         
         if facility:
-            queryset = queryset.filter(facility=facility)
+            queryset = queryset.filter(facility_id=facility)
             
         if status:
             queryset = queryset.filter(status=status)
             
-        if date_from:
-            queryset = queryset.filter(start_time__date__gte=date_from)
-            
-        if date_to:
-            queryset = queryset.filter(start_time__date__lte=date_to)
+        if date_from or date_to:
+            queryset = queryset.filter(date_range_filter('start_time', date_from, date_to))
             
         return queryset
+
+
+class UtilizationReportForm(forms.Form):
+    """Form for choosing the range and facility of a utilization report."""
+    FORMAT_CHOICES = (
+        ('html', _('Page')),
+        ('csv', _('CSV')),
+        ('json', _('JSON')),
+    )
+    # A longer range gains nothing, as every week folds onto the same 168 hours
+    MAX_DAYS = 1100
+    
+    date_from = forms.DateField(
+        label=_('From Date'),
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label=_('To Date'),
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    facility = forms.TypedChoiceField(
+        label=_('Facility'),
+        coerce=int,
+        empty_value=None,
+        required=False
+    )
+    format = forms.ChoiceField(
+        label=_('Format'),
+        choices=FORMAT_CHOICES,
+        required=False
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        self.fields['facility'].choices = [('', _('All facilities')), *get_active_facility_choices()]
+        
+        # Setup Crispy form layout
+        self.helper = FormHelper()
+        self.helper.form_method = 'get'
+        self.helper.layout = Layout(
+            Row(
+                Column('date_from', css_class='form-group col-md-4'),
+                Column('date_to', css_class='form-group col-md-4'),
+                Column('facility', css_class='form-group col-md-4'),
+                css_class='form-row'
+            ),
+            Submit('submit', _('Show'), css_class='btn btn-primary')
+        )
+    
+    def clean(self):
+        """Validate the date range."""
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        
+        if date_from and date_to:
+            if date_to < date_from:
+                raise forms.ValidationError(_('The end date must not be before the start date.'))
+            if (date_to - date_from).days >= self.MAX_DAYS:
+                raise forms.ValidationError(
+                    _('Reports cover at most %(days)d days.') % {'days': self.MAX_DAYS}
+                )
+        
+        return cleaned_data
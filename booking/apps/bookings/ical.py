@@ -0,0 +1,200 @@
+"""
+iCalendar (RFC 5545) feeds of bookings.
+
+Calendar apps poll their subscriptions every few minutes, so the feed views
+answer conditional GETs from a cheap aggregate first, and only stream the
+calendar when it changed. The calendar is written from a ``values_list()``
+iterator a batch of events at a time, so memory stays flat however many
+bookings a feed covers.
+
+A user's feed is reached without a session, through a signed token in its
+URL. The signature is salted with the user's password hash, so changing the
+password revokes the feed URLs handed out before.
+"""
+import datetime
+import itertools
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils import timezone
+
+from booking.apps.core.streaming import StreamingResponse
+
+FEED_SALT = 'booking.apps.bookings.ical'
+# Feeds start this long ago, so past bookings stay visible for a while
+# without the feed growing forever
+FEED_PAST_DAYS = 90
+BATCH_SIZE = 500
+CONTENT_TYPE = 'text/calendar; charset=utf-8'
+PRODID = '-//Booking System//Bookings//EN'
+STATUSES = {'pending': 'TENTATIVE', 'confirmed': 'CONFIRMED', 'cancelled': 'CANCELLED'}
+# Content lines are folded at 75 octets
+LINE_LIMIT = 75
+
+
+def escape_text(value):
+    """Escape a TEXT property value."""
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '')
+    )
+
+
+def fold(line):
+    """Fold a content line into CRLF-separated lines of at most 75 octets, keeping UTF-8 sequences whole."""
+    encoded = line.encode()
+    parts = []
+    limit = LINE_LIMIT
+    while len(encoded) > limit:
+        cut = limit
+        # Never cut before a UTF-8 continuation byte
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        # Continuation lines start with a space
+        limit = LINE_LIMIT - 1
+    parts.append(encoded.decode())
+    return '\r\n '.join(parts)
+
+
+def format_instant(value):
+    """Return a DATE-TIME value in UTC."""
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_lines(uid, start, end, stamp, summary, status='CONFIRMED', location='', description=''):
+    """Return the content lines of a VEVENT."""
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{format_instant(stamp)}',
+        f'DTSTART:{format_instant(start)}',
+        f'DTEND:{format_instant(end)}',
+        f'STATUS:{status}',
+        f'SUMMARY:{escape_text(summary)}',
+    ]
+    if location:
+        lines.append(f'LOCATION:{escape_text(location)}')
+    if description:
+        lines.append(f'DESCRIPTION:{escape_text(description)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def calendar_chunks(name, events, batch_size=BATCH_SIZE):
+    """
+    Yield a VCALENDAR in chunks.
+
+    Args:
+        name: Calendar name shown by calendar apps.
+        events: Iterable of content line lists, such as ``event_lines()``.
+        batch_size: Number of events per chunk.
+    """
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ]
+    yield ''.join(f'{fold(line)}\r\n' for line in header)
+    events = iter(events)
+    while batch := list(itertools.islice(events, batch_size)):
+        yield ''.join(f'{fold(line)}\r\n' for lines in batch for line in lines)
+    yield 'END:VCALENDAR\r\n'
+
+
+def feed_start():
+    """Return the instant feeds start at."""
+    return timezone.now() - datetime.timedelta(days=FEED_PAST_DAYS)
+
+
+def user_feed_queryset(user):
+    """Return the bookings of a user's feed."""
+    from booking.apps.bookings.models import Booking
+
+    return Booking.objects.filter(user=user, end_time__gte=feed_start())
+
+
+def user_feed_events(user, domain):
+    """Yield the events of a user's feed, cancelled bookings included so clients drop them."""
+    rows = user_feed_queryset(user).order_by('start_time', 'pk').values_list(
+        'pk', 'start_time', 'end_time', 'updated_at', 'status', 'title', 'description',
+        'facility__name', 'facility__location',
+    ).iterator(chunk_size=BATCH_SIZE)
+    for pk, start, end, updated, status, title, description, facility_name, facility_location in rows:
+        yield event_lines(
+            f'booking-{pk}@{domain}', start, end, updated, title, STATUSES[status],
+            location=', '.join(filter(None, (facility_name, facility_location))),
+            description=description,
+        )
+
+
+def facility_feed_queryset(facility_id):
+    """Return the bookings of a facility's feed: its confirmed bookings."""
+    from booking.apps.bookings.models import Booking
+
+    return Booking.objects.filter(facility_id=facility_id, status='confirmed', end_time__gte=feed_start())
+
+
+def facility_feed_events(facility, domain):
+    """Yield the events of a facility's feed, which show when it is busy but not who booked it."""
+    rows = facility_feed_queryset(facility.pk).order_by('start_time').values_list(
+        'pk', 'start_time', 'end_time', 'updated_at',
+    ).iterator(chunk_size=BATCH_SIZE)
+    for pk, start, end, updated in rows:
+        yield event_lines(f'booking-{pk}@{domain}', start, end, updated, 'Booked', location=facility.name)
+
+
+def _signer(user):
+    """Return the signer of a user's feed tokens."""
+    return signing.Signer(salt=f'{FEED_SALT}.{user.password}')
+
+
+def feed_token(user):
+    """Return the token of a user's feed URL."""
+    return _signer(user).sign(str(user.pk))
+
+
+def get_feed_user(token):
+    """Return the active user a feed token was made for, or None."""
+    pk = token.partition(':')[0]
+    if not pk.isdigit():
+        return None
+    user = get_user_model().objects.filter(pk=int(pk), is_active=True).first()
+    if user is None:
+        return None
+    try:
+        _signer(user).unsign(token)
+    except signing.BadSignature:
+        return None
+    return user
+
+
+class CalendarFeedMixin:
+    """
+    Stream an iCalendar feed.
+
+    Views implement ``get_calendar_name()`` and ``get_events()``; combined
+    with ConditionalGetMixin, which must come first, the feed is only built
+    when the client's copy is stale.
+    """
+    filename = 'calendar.ics'
+
+    def get_calendar_name(self):
+        """Return the name calendar apps show for the feed."""
+        raise NotImplementedError('Calendar feeds must implement get_calendar_name().')
+
+    def get_events(self):
+        """Return an iterable of the feed's events as content line lists."""
+        raise NotImplementedError('Calendar feeds must implement get_events().')
+
+    def get(self, request, *args, **kwargs):
+        """Stream the calendar."""
+        response = StreamingResponse(
+            calendar_chunks(self.get_calendar_name(), self.get_events()), content_type=CONTENT_TYPE,
+        )
+        response['Content-Disposition'] = f'inline; filename="{self.filename}"'
+        return response
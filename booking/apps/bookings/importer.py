@@ -0,0 +1,390 @@
+"""
+Streaming bulk import of bookings from CSV or NDJSON.
+
+Rows are read lazily and processed in fixed-size chunks, so memory use
+depends on the chunk size and not on the size of the file. For each chunk
+the referenced users and facilities are resolved in one query each, the
+confirmed bookings that may collide with the chunk are loaded with a single
+range query, and overlaps are found with a sort-and-sweep pass in memory
+instead of running ``Booking.clean()`` row by row. Valid rows are written
+with ``bulk_create``; the others are reported with their line number.
+
+Earlier chunks are committed before later ones are checked, so overlaps
+between rows far apart in the file are still caught through the database.
+"""
+import bisect
+import codecs
+import csv
+import json
+import operator
+from collections import defaultdict, namedtuple
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from booking.apps.bookings import transitions
+from booking.apps.bookings.models import Booking, is_overlap_violation
+from booking.apps.facilities.models import Facility
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+STATUSES = {value for value, label in Booking.STATUS_CHOICES}
+TITLE_MAX_LENGTH = Booking._meta.get_field('title').max_length
+
+RowError = namedtuple('RowError', ['line', 'message'])
+
+
+class ImportFormatError(ValueError):
+    """Raised when the input cannot be read as the requested format."""
+
+
+def guess_format(filename):
+    """Guess the import format from a file name, defaulting to CSV."""
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(lines, fmt='csv'):
+    """
+    Yield ``(line, row)`` pairs from an iterable of text or byte lines.
+
+    CSV input needs a header row; NDJSON input holds one JSON object per
+    line and blank lines are ignored.
+    """
+    if fmt not in FORMATS:
+        raise ImportFormatError(f'Unknown format {fmt!r}.')
+    try:
+        yield from _parse(_decode(lines), fmt)
+    except UnicodeDecodeError:
+        raise ImportFormatError('The file is not valid UTF-8.')
+
+
+def _parse(lines, fmt):
+    """Parse decoded lines as CSV or NDJSON."""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(f'Line {number}: invalid JSON ({e}).')
+        if not isinstance(row, dict):
+            raise ImportFormatError(f'Line {number}: expected a JSON object.')
+        yield number, row
+
+
+def _decode(lines):
+    """Decode byte lines as UTF-8, dropping a leading byte order mark."""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    if isinstance(first, bytes):
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        yield decoder.decode(first)
+        for line in lines:
+            yield decoder.decode(line)
+        return
+    yield first.lstrip('\ufeff')
+    yield from lines
+
+
+class ParsedRow:
+    """A row that passed field validation, waiting for the chunk checks."""
+
+    __slots__ = ('line', 'user', 'facility_id', 'title', 'description',
+                 'start_time', 'end_time', 'status', 'number_of_people', 'user_id')
+
+    def __init__(self, line, **values):
+        self.line = line
+        self.user_id = None
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def to_booking(self):
+        """Build the unsaved Booking for this row."""
+        return Booking(
+            user_id=self.user_id,
+            facility_id=self.facility_id,
+            title=self.title,
+            description=self.description,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            status=self.status,
+            number_of_people=self.number_of_people,
+        )
+
+
+def parse_row(line, row):
+    """
+    Validate the fields of a raw row.
+
+    Returns a ParsedRow, or raises ValueError with a readable message.
+    """
+    def value(name, default=''):
+        raw = row.get(name)
+        if raw is None:
+            return default
+        return str(raw).strip()
+
+    user = value('user')
+    if not user:
+        raise ValueError('user is required.')
+    try:
+        facility_id = int(value('facility'))
+    except ValueError:
+        raise ValueError('facility must be a facility id.')
+
+    title = value('title')
+    if not title:
+        raise ValueError('title is required.')
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError(f'title is longer than {TITLE_MAX_LENGTH} characters.')
+
+    start_time = _parse_time(value('start_time'), 'start_time')
+    end_time = _parse_time(value('end_time'), 'end_time')
+    if end_time <= start_time:
+        raise ValueError('End time must be after start time.')
+
+    status = value('status') or 'pending'
+    if status not in STATUSES:
+        raise ValueError(f'status must be one of {", ".join(sorted(STATUSES))}.')
+
+    try:
+        number_of_people = int(value('number_of_people') or 1)
+    except ValueError:
+        raise ValueError('number_of_people must be an integer.')
+    if number_of_people < 1:
+        raise ValueError('number_of_people must be at least 1.')
+
+    return ParsedRow(
+        line,
+        user=user,
+        facility_id=facility_id,
+        title=title,
+        description=value('description'),
+        start_time=start_time,
+        end_time=end_time,
+        status=status,
+        number_of_people=number_of_people,
+    )
+
+
+def _parse_time(raw, name):
+    """Parse an ISO 8601 datetime, reading naive values in the current timezone."""
+    try:
+        parsed = parse_datetime(raw)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'{name} must be an ISO 8601 datetime.')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def sweep_conflicts(existing, candidates):
+    """
+    Find the candidates of one facility that overlap a booking.
+
+    Args:
+        existing: ``(start, end)`` pairs of confirmed bookings already
+            stored, sorted by start and pairwise disjoint.
+        candidates: ParsedRow objects to check.
+
+    Returns:
+        ``{line: message}`` for every rejected candidate. Candidates are
+        swept in start order, so of two overlapping rows the one starting
+        first (then the one earlier in the file) is kept.
+    """
+    existing_ends = [end for start, end in existing]
+    rejected = {}
+    busy_until = None
+    holder = None
+    for row in sorted(candidates, key=lambda row: (row.start_time, row.line)):
+        index = bisect.bisect_right(existing_ends, row.start_time)
+        if index < len(existing) and existing[index][0] < row.end_time:
+            rejected[row.line] = 'The facility is not available during the selected time period.'
+        elif busy_until is not None and row.start_time < busy_until:
+            rejected[row.line] = f'Overlaps the booking on line {holder}.'
+        else:
+            busy_until, holder = row.end_time, row.line
+    return rejected
+
+
+class BookingImporter:
+    """
+    Import bookings chunk by chunk and collect a report.
+
+    Args:
+        chunk_size: Number of rows validated and inserted together.
+        on_error: Optional callable receiving every RowError as it is found,
+            for callers that need the complete error list.
+        max_errors: Number of errors kept on the importer for the report.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, on_error=None, max_errors=MAX_REPORTED_ERRORS):
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        """Import every ``(line, row)`` pair and return the importer."""
+        chunk = []
+        for line, row in rows:
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self
+
+    def as_dict(self):
+        """Return the report as a JSON-serialisable dict."""
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': [error._asdict() for error in self.errors],
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def add_error(self, line, message):
+        """Record a rejected row."""
+        error = RowError(line, message)
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(error)
+        if self.on_error:
+            self.on_error(error)
+
+    def import_chunk(self, raw_rows):
+        """Validate and insert one chunk of raw rows."""
+        parsed = []
+        for line, row in raw_rows:
+            try:
+                parsed.append(parse_row(line, row))
+            except ValueError as e:
+                self.add_error(line, str(e))
+        parsed = self.check_references(parsed)
+
+        # The exclusion constraint stays the final authority: if a concurrent
+        # writer got in between the check and the insert, check again.
+        for attempt in range(3):
+            rejected = self.find_overlaps(parsed)
+            valid = [row for row in parsed if row.line not in rejected]
+            try:
+                with transaction.atomic():
+                    bookings = Booking.objects.bulk_create(
+                        [row.to_booking() for row in valid], batch_size=self.chunk_size,
+                    )
+                    self.after_insert(bookings)
+                break
+            except IntegrityError as e:
+                if not is_overlap_violation(e) or attempt == 2:
+                    raise
+        for row in parsed:
+            if row.line in rejected:
+                self.add_error(row.line, rejected[row.line])
+        self.created += len(valid)
+
+    def check_references(self, parsed):
+        """Resolve users and facilities, check capacity, and drop the rows that fail."""
+        facility_ids = {row.facility_id for row in parsed}
+        capacities = dict(
+            Facility.objects.filter(pk__in=facility_ids).values_list('pk', 'capacity')
+        )
+        users = {row.user for row in parsed}
+        user_ids = {int(user) for user in users if user.isdigit()}
+        usernames = users - {str(pk) for pk in user_ids}
+        user_map = {}
+        if users:
+            for pk, username in get_user_model().objects.filter(
+                Q(pk__in=user_ids) | Q(username__in=usernames)
+            ).values_list('pk', 'username'):
+                user_map[str(pk)] = pk
+                user_map[username] = pk
+
+        checked = []
+        for row in parsed:
+            capacity = capacities.get(row.facility_id)
+            if capacity is None:
+                self.add_error(row.line, f'Facility {row.facility_id} does not exist.')
+            elif row.user not in user_map:
+                self.add_error(row.line, f'User {row.user} does not exist.')
+            elif row.number_of_people > capacity:
+                self.add_error(row.line, f'Number of people exceeds facility capacity of {capacity}.')
+            else:
+                row.user_id = user_map[row.user]
+                checked.append(row)
+        return checked
+
+    def find_overlaps(self, parsed):
+        """Return ``{line: message}`` for the confirmed rows overlapping a confirmed booking."""
+        by_facility = defaultdict(list)
+        for row in parsed:
+            if row.status == 'confirmed':
+                by_facility[row.facility_id].append(row)
+        if not by_facility:
+            return {}
+
+        spans = reduce(operator.or_, (
+            Q(
+                facility_id=facility_id,
+                start_time__lt=max(row.end_time for row in rows),
+                end_time__gt=min(row.start_time for row in rows),
+            )
+            for facility_id, rows in by_facility.items()
+        ))
+        existing = defaultdict(list)
+        for facility_id, start_time, end_time in Booking.objects.filter(
+            spans, status='confirmed'
+        ).order_by('facility_id', 'start_time').values_list('facility_id', 'start_time', 'end_time'):
+            existing[facility_id].append((start_time, end_time))
+
+        rejected = {}
+        for facility_id, rows in by_facility.items():
+            rejected.update(sweep_conflicts(existing[facility_id], rows))
+        return rejected
+
+    def after_insert(self, bookings):
+        """
+        Do the work of the Booking signal handlers for inserted bookings.
+
+        ``bulk_create`` does not send ``post_save``, so
+        ``transitions.after_change`` does it once per chunk, in the
+        transaction of the insert: the rollups, the interval indexes,
+        occupancy bitmaps and facility cache of confirmed bookings, and the
+        live updates.
+        """
+        booked = [(booking.facility_id, booking.start_time, booking.end_time) for booking in bookings]
+        intervals = [
+            interval for interval, booking in zip(booked, bookings)
+            if booking.status == 'confirmed'
+        ]
+        transitions.after_change(intervals, booked, [booking.pk for booking in bookings])
+
+
+def import_bookings(lines, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, on_error=None):
+    """
+    Import bookings from an iterable of CSV or NDJSON lines.
+
+    Returns the BookingImporter holding the report.
+    """
+    importer = BookingImporter(chunk_size=chunk_size, on_error=on_error)
+    return importer.run(read_rows(lines, fmt))
@@ -0,0 +1,129 @@
+"""
+In-process index of confirmed booking intervals per facility.
+
+Availability checks on browse paths are answered from sorted lists with a
+bisect instead of an EXISTS query. Each facility index is loaded lazily and
+tagged with the facility's version in the ``interval-index`` namespace of
+the versioned cache keys; the ``post_save`` and ``post_delete`` signals on
+Booking bump the version when a facility's confirmed time changes, so that
+every process reloads the facility on its next lookup. A process keeps the
+indexes of the MAX_INDEXES facilities it used most recently. The index is
+only an optimisation: the exclusion constraint remains the final authority
+when a booking is written.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from booking.apps.core.cache import bump_version, get_version
+
+INTERVAL_INDEX = 'interval-index'
+
+MAX_INDEXES = 1000
+
+# facility_id -> FacilityIntervalIndex, local to this process, least
+# recently used first
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def is_enabled():
+    """Return whether the interval index is switched on."""
+    return getattr(settings, 'BOOKING_INTERVAL_INDEX', False)
+
+
+def invalidate(*facility_ids):
+    """Invalidate the indexes of the given facilities in every process."""
+    if not facility_ids:
+        return
+    bump_version(INTERVAL_INDEX, *facility_ids)
+    with _lock:
+        for facility_id in facility_ids:
+            _indexes.pop(facility_id, None)
+
+
+def clear():
+    """Drop every index held by this process."""
+    with _lock:
+        _indexes.clear()
+
+
+class FacilityIntervalIndex:
+    """
+    Sorted confirmed intervals of one facility from ``horizon`` onwards.
+
+    Confirmed bookings never overlap, so sorting them by start also sorts
+    them by end, and the first booking ending after a given instant is
+    found with a single bisect.
+    """
+
+    def __init__(self, facility_id, version, horizon, rows):
+        self.facility_id = facility_id
+        self.version = version
+        self.horizon = horizon
+        self.starts = [row[0] for row in rows]
+        self.ends = [row[1] for row in rows]
+        self.pks = [row[2] for row in rows]
+
+    @classmethod
+    def load(cls, facility_id, version):
+        """Load the current and future confirmed bookings of a facility."""
+        from booking.apps.bookings.models import Booking
+
+        horizon = timezone.now()
+        rows = list(
+            Booking.objects.filter(
+                facility_id=facility_id,
+                status='confirmed',
+                end_time__gt=horizon,
+            ).order_by('start_time').values_list('start_time', 'end_time', 'pk')
+        )
+        return cls(facility_id, version, horizon, rows)
+
+    def covers(self, start_time):
+        """Return whether the index holds every booking that may overlap a range starting at ``start_time``."""
+        return start_time >= self.horizon
+
+    def overlaps(self, start_time, end_time, exclude_pk=None):
+        """Return whether any indexed booking overlaps the given range."""
+        index = bisect.bisect_right(self.ends, start_time)
+        while index < len(self.starts) and self.starts[index] < end_time:
+            if self.pks[index] != exclude_pk:
+                return True
+            index += 1
+        return False
+
+
+def get_index(facility_id):
+    """Return an up-to-date index for a facility, loading it if needed."""
+    version = get_version(INTERVAL_INDEX, facility_id)
+    with _lock:
+        index = _indexes.get(facility_id)
+        if index is not None:
+            _indexes.move_to_end(facility_id)
+    if index is None or index.version != version:
+        index = FacilityIntervalIndex.load(facility_id, version)
+        with _lock:
+            _indexes[facility_id] = index
+            _indexes.move_to_end(facility_id)
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+    return index
+
+
+def has_overlap(facility_id, start_time, end_time, exclude_pk=None):
+    """
+    Check for overlapping confirmed bookings using the in-process index.
+
+    Returns True or False, or None when the index is disabled or does not
+    cover the requested range and the caller should query the database.
+    """
+    if not is_enabled():
+        return None
+    index = get_index(facility_id)
+    if not index.covers(start_time):
+        return None
+    return index.overlaps(start_time, end_time, exclude_pk)
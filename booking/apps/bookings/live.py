@@ -0,0 +1,134 @@
+"""
+Live availability and booking status, pushed as server-sent events.
+
+Booking changes are published once their transaction commits. Each
+facility whose confirmed time changed gets an ``availability`` event on its
+channel, naming the interval and whether it is now free, and the owner of
+each booking whose status changed gets a ``booking`` event on theirs. The
+``post_save`` and ``post_delete`` signals publish the changes of single
+bookings, so ``Booking.confirm()`` and ``cancel()`` publish too, and
+``transitions.after_change`` publishes those of bulk changes, imports and
+recurring series included.
+
+Browsers follow the changes at EVENTS_PATH (see ``booking.asgi``): signed-in
+users receive the status of their own bookings, and anyone may follow the
+availability of up to MAX_FACILITIES facilities with ``?facility=<id>``.
+"""
+from django.core.exceptions import BadRequest, PermissionDenied
+
+from booking.apps.core import pubsub
+from booking.apps.core.sse import get_query, get_user
+
+EVENTS_PATH = '/events/'
+MAX_FACILITIES = 20
+
+
+def facility_channel(facility_id):
+    """Return the channel of a facility's availability."""
+    return f'facility:{facility_id}'
+
+
+def user_channel(user_id):
+    """Return the channel of the status of a user's bookings."""
+    return f'user:{user_id}'
+
+
+def publish_availability(intervals, available):
+    """
+    Publish that some confirmed time was freed or taken.
+
+    Args:
+        intervals: ``(facility_id, start_time, end_time)`` tuples.
+        available: Whether the intervals are free now.
+    """
+    broker = pubsub.get_broker()
+    for facility_id, start_time, end_time in intervals:
+        broker.publish(facility_channel(facility_id), {
+            'event': 'availability',
+            'data': {
+                'facility': facility_id,
+                'start_time': start_time,
+                'end_time': end_time,
+                'available': available,
+            },
+        })
+
+
+def publish_statuses(rows):
+    """
+    Publish the status of some bookings to their owners.
+
+    Args:
+        rows: ``(id, user_id, status, facility_id, start_time, end_time)``
+            tuples; ``deleted`` is a status too.
+    """
+    broker = pubsub.get_broker()
+    for pk, user_id, status, facility_id, start_time, end_time in rows:
+        broker.publish(user_channel(user_id), {
+            'event': 'booking',
+            'data': {
+                'id': pk,
+                'status': status,
+                'facility': facility_id,
+                'start_time': start_time,
+                'end_time': end_time,
+            },
+        })
+
+
+def publish_change(booking_id, user_id, previous, current):
+    """
+    Publish the change of one booking.
+
+    Args:
+        previous: The ``Booking.get_interval_state()`` it was loaded with,
+            None for a new booking.
+        current: Its state now, None once it is deleted.
+    """
+    if previous and previous[0] == 'confirmed':
+        publish_availability([previous[1:]], True)
+    if current and current[0] == 'confirmed':
+        publish_availability([current[1:]], False)
+    if current:
+        publish_statuses([(booking_id, user_id, *current)])
+    elif previous:
+        publish_statuses([(booking_id, user_id, 'deleted', *previous[1:])])
+
+
+def publish_bulk_change(booking_ids, intervals):
+    """
+    Publish a bulk status change once it is committed.
+
+    The bookings are read back in one query for their owners and statuses.
+
+    Args:
+        booking_ids: The bookings whose status changed.
+        intervals: The confirmed intervals that appeared or disappeared.
+    """
+    from booking.apps.bookings.models import Booking
+
+    rows = list(Booking.objects.filter(pk__in=booking_ids).values_list(
+        'pk', 'user_id', 'status', 'facility_id', 'start_time', 'end_time',
+    ))
+    changed = set(intervals)
+    # Freed time first, in case the same change took it again
+    publish_availability([row[3:] for row in rows if row[2] != 'confirmed' and row[3:] in changed], True)
+    publish_availability([row[3:] for row in rows if row[2] == 'confirmed' and row[3:] in changed], False)
+    publish_statuses(rows)
+
+
+async def get_channels(scope):
+    """Return the channels followed by a request to the event stream."""
+    facility_ids = get_query(scope).getlist('facility')
+    if len(facility_ids) > MAX_FACILITIES:
+        raise BadRequest(f'Follow at most {MAX_FACILITIES} facilities.')
+    try:
+        channels = [facility_channel(int(facility_id)) for facility_id in facility_ids]
+    except ValueError:
+        raise BadRequest('Facilities are given by their ID.')
+    user = await get_user(scope)
+    if user.is_authenticated:
+        channels.append(user_channel(user.pk))
+    elif not channels:
+        raise PermissionDenied('Sign in to follow your bookings.')
+    return channels
@@ -0,0 +1,87 @@
+"""
+Django command to check the query plans of the hot booking and facility paths.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.connection import ConnectionDoesNotExist
+
+from booking.apps.bookings.models import Booking
+from booking.apps.bookings.query_plans import get_hot_query_checks, get_sample_booking
+from booking.apps.core.query_plans import run_checks
+
+
+class Command(BaseCommand):
+    """Explain hot queries command"""
+
+    help = 'EXPLAIN the hot queries and check their indexes and cost budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--booking', type=int, help='Build the queries around this booking id')
+        parser.add_argument('--only', action='append', help='Only run this check (can be repeated)')
+        parser.add_argument('--json', action='store_true', help='Print the results and plans as JSON')
+        parser.add_argument('--plans', action='store_true', help='Print the SQL and plan of every check')
+        parser.add_argument('--database', default='default', help='Database to explain against')
+
+    def handle(self, *args, **options):
+        try:
+            vendor = connections[options['database']].vendor
+        except ConnectionDoesNotExist:
+            raise CommandError(f"Database {options['database']} is not configured.")
+        if vendor != 'postgresql':
+            raise CommandError(f"The plans are PostgreSQL's; database {options['database']} runs {vendor}.")
+        booking = self.get_booking(options)
+        checks = get_hot_query_checks(booking)
+        if options['only']:
+            names = {check.name for check in checks}
+            unknown = set(options['only']) - names
+            if unknown:
+                raise CommandError(f"Unknown checks: {', '.join(sorted(unknown))}. Available: {', '.join(sorted(names))}")
+            checks = [check for check in checks if check.name in options['only']]
+
+        results = run_checks(checks, using=options['database'])
+
+        if options['json']:
+            self.stdout.write(json.dumps([result.as_dict() for result in results], indent=2, default=str))
+        else:
+            for result in results:
+                self.write_result(result, options['plans'])
+
+        failed = [result.check.name for result in results if not result.ok]
+        if failed:
+            raise CommandError(f"Plan checks failed: {', '.join(failed)}")
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS(f'All {len(results)} plan checks passed.'))
+
+    def get_booking(self, options):
+        """Return the booking the checks are built around."""
+        if options['booking']:
+            try:
+                return Booking.objects.using(options['database']).select_related('facility', 'user').get(
+                    pk=options['booking']
+                )
+            except Booking.DoesNotExist:
+                raise CommandError(f"Booking {options['booking']} does not exist.")
+        booking = get_sample_booking(options['database'])
+        if booking is None:
+            raise CommandError('There are no confirmed bookings to build the queries from.')
+        return booking
+
+    def write_result(self, result, show_plans):
+        """Write one result in a human readable form."""
+        indexes = ', '.join(sorted(result.indexes_used)) or 'no index'
+        line = f'{result.check.name}: cost {result.cost:.1f}'
+        if result.check.max_cost is not None:
+            line += f'/{result.check.max_cost:.0f}'
+        line += f', indexes: {indexes}'
+        if result.ok:
+            self.stdout.write(self.style.SUCCESS(f'OK   {line}'))
+        else:
+            self.stdout.write(self.style.ERROR(f'FAIL {line}'))
+            for problem in result.problems:
+                self.stdout.write(f'     - {problem}')
+        if show_plans:
+            for (sql, params), plan in zip(result.statements, result.plans):
+                self.stdout.write(f'     SQL: {sql} {params or ""}')
+                self.stdout.write(json.dumps(plan, indent=2, default=str))
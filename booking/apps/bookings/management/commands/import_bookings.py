@@ -0,0 +1,82 @@
+"""
+Django command to bulk import bookings from a CSV or NDJSON file.
+"""
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from booking.apps.bookings.importer import (
+    DEFAULT_CHUNK_SIZE, FORMATS, BookingImporter, ImportFormatError, guess_format, read_rows,
+)
+
+
+class Command(BaseCommand):
+    """Import bookings command"""
+
+    help = 'Stream bookings from a CSV or NDJSON file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' to read standard input")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Input format (default: guessed from the file extension)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows validated and inserted together'
+        )
+        parser.add_argument('--errors', help='Write every rejected row to this CSV file')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate the whole file and roll back instead of committing'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        error_file = options['errors'] and open(options['errors'], 'w', newline='')
+        try:
+            on_error = None
+            if error_file:
+                writer = csv.writer(error_file)
+                writer.writerow(['line', 'message'])
+                on_error = writer.writerow
+            importer = BookingImporter(chunk_size=options['chunk_size'], on_error=on_error)
+            try:
+                self.run(importer, path, fmt, options['dry_run'])
+            except ImportFormatError as e:
+                raise CommandError(str(e))
+        finally:
+            if error_file:
+                error_file.close()
+
+        for error in importer.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'Line {error.line}: {error.message}'))
+        if importer.failed > 20:
+            self.stdout.write(self.style.WARNING(f'... and {importer.failed - 20} more rejected rows.'))
+        verb = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {importer.created} bookings, rejected {importer.failed} rows.'
+        ))
+
+    def run(self, importer, path, fmt, dry_run):
+        """Stream the file through the importer, rolling back on a dry run."""
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            if dry_run:
+                with transaction.atomic():
+                    importer.run(read_rows(stream, fmt))
+                    transaction.set_rollback(True)
+            else:
+                importer.run(read_rows(stream, fmt))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
@@ -0,0 +1,85 @@
+"""
+Django command to rebuild the facility occupancy bitmaps from the bookings table.
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from booking.apps.bookings import occupancy
+from booking.apps.bookings.models import Booking, FacilityOccupancy
+from booking.apps.facilities.models import Facility
+
+
+class Command(BaseCommand):
+    """Rebuild occupancy bitmaps command"""
+
+    help = 'Regenerate facility occupancy bitmaps from confirmed bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--facility', type=int, action='append', dest='facilities',
+            help='Only rebuild this facility id (can be repeated)'
+        )
+        parser.add_argument('--from', dest='date_from', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day to rebuild (YYYY-MM-DD)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Number of facilities rebuilt per batch'
+        )
+
+    def handle(self, *args, **options):
+        first_day, last_day = self.get_day_range(options)
+        if options['facilities']:
+            facility_ids = sorted(set(options['facilities']))
+        else:
+            facility_ids = list(Facility.objects.order_by('pk').values_list('pk', flat=True))
+
+        if first_day is None or last_day is None:
+            # No confirmed bookings to rebuild from: clear the requested range only
+            rows = FacilityOccupancy.objects.filter(facility_id__in=facility_ids)
+            if first_day is not None:
+                rows = rows.filter(date__gte=first_day)
+            if last_day is not None:
+                rows = rows.filter(date__lte=last_day)
+            rows.delete()
+            self.stdout.write(self.style.SUCCESS('No confirmed bookings, occupancy cleared.'))
+            return
+
+        start, end = occupancy.day_bounds(first_day, last_day)
+        chunk_size = options['chunk_size']
+        days = 0
+        for offset in range(0, len(facility_ids), chunk_size):
+            chunk = facility_ids[offset:offset + chunk_size]
+            rows = Booking.objects.filter(
+                facility_id__in=chunk,
+                status='confirmed',
+                start_time__lt=end,
+                end_time__gt=start,
+            ).values_list('facility_id', 'start_time', 'end_time').iterator(chunk_size=5000)
+            days += occupancy.store_bitmaps(chunk, first_day, last_day, occupancy.build_bitmaps(rows))
+            self.stdout.write(f'Rebuilt {offset + len(chunk)}/{len(facility_ids)} facilities...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Occupancy rebuilt from {first_day} to {last_day}: {days} occupied facility-days.'
+        ))
+
+    def get_day_range(self, options):
+        """Return the day range to rebuild, defaulting to the span of confirmed bookings."""
+        try:
+            first_day = options['date_from'] and datetime.date.fromisoformat(options['date_from'])
+            last_day = options['date_to'] and datetime.date.fromisoformat(options['date_to'])
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        if not first_day or not last_day:
+            bounds = Booking.objects.filter(status='confirmed').aggregate(
+                first=Min('start_time'), last=Max('end_time')
+            )
+            if bounds['first'] is None:
+                return first_day or None, last_day or None
+            first_day = first_day or occupancy.slot_of(bounds['first'])[0]
+            last_day = last_day or occupancy.slot_of(bounds['last'])[0]
+        if last_day < first_day:
+            raise CommandError('--to must not be before --from')
+        return first_day, last_day
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:33
+
+import sys
+
+import booking.apps.bookings.models
+import booking.apps.core.postgres
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def demote_overlapping_bookings(apps, schema_editor):
+    """
+    Move confirmed bookings that overlap an earlier one back to pending.
+
+    Before the exclusion constraint, the admin's confirm action updated
+    statuses without any overlap check. Of overlapping confirmed bookings the
+    earliest (by start, then ID) stays confirmed, as with bulk confirmation.
+    Only the facilities with an overlap are swept, and the bookings moved are
+    listed on stdout.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    manager = Booking.objects.db_manager(schema_editor.connection.alias)
+    if schema_editor.connection.vendor == 'postgresql':
+        # Keep new confirmations out until the constraint is in place
+        schema_editor.execute(f'LOCK TABLE {Booking._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+    confirmed = manager.filter(status='confirmed')
+    facility_ids = set(confirmed.filter(models.Exists(confirmed.filter(
+        facility_id=models.OuterRef('facility_id'),
+        start_time__lt=models.OuterRef('end_time'),
+        end_time__gt=models.OuterRef('start_time'),
+    ).exclude(pk=models.OuterRef('pk')))).values_list('facility_id', flat=True).distinct())
+    demoted = []
+    busy_until = {}
+    rows = confirmed.filter(facility_id__in=facility_ids).order_by('facility_id', 'start_time', 'id')
+    for pk, facility_id, start_time, end_time in rows.values_list('pk', 'facility_id', 'start_time', 'end_time'):
+        if busy_until.get(facility_id) and busy_until[facility_id] > start_time:
+            demoted.append(pk)
+        else:
+            busy_until[facility_id] = end_time
+    if demoted:
+        manager.filter(pk__in=demoted).update(status='pending', updated_at=Now())
+        sys.stdout.write(
+            f'\n  Moved {len(demoted)} overlapping confirmed booking(s) back to pending: '
+            f"{', '.join(map(str, demoted))}\n"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(demote_overlapping_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=booking.apps.core.postgres.ExclusionConstraint(condition=models.Q(('status', 'confirmed')), expressions=[(booking.apps.bookings.models.Int8Range('facility'), '&&'), (booking.apps.bookings.models.TsTzRange('start_time', 'end_time', models.Value('[)')), '&&')], name='exclude_overlapping_confirmed_bookings'),
+        ),
+    ]
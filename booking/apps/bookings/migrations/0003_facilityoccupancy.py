@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facilities', '0001_initial'),
+        ('bookings', '0002_booking_overlap_exclusion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacilityOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('bitmap', models.BinaryField(verbose_name='bitmap')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'facility occupancy',
+                'verbose_name_plural': 'facility occupancy',
+                'ordering': ['facility', 'date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='facilityoccupancy',
+            name='facility',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='facilities.facility', verbose_name='facility'),
+        ),
+        migrations.AddConstraint(
+            model_name='facilityoccupancy',
+            constraint=models.UniqueConstraint(fields=('facility', 'date'), name='unique_facility_occupancy_date'),
+        ),
+    ]
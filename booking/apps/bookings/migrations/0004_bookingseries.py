@@ -0,0 +1,58 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('facilities', '0001_initial'),
+        ('bookings', '0003_facilityoccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100, verbose_name='title')),
+                ('description', models.TextField(blank=True, verbose_name='description')),
+                ('start_time', models.DateTimeField(verbose_name='first start time')),
+                ('end_time', models.DateTimeField(verbose_name='first end time')),
+                ('number_of_people', models.PositiveIntegerField(default=1, verbose_name='number of people')),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly')], default='weekly', max_length=10, verbose_name='frequency')),
+                ('interval', models.PositiveIntegerField(default=1, verbose_name='interval')),
+                ('until', models.DateField(blank=True, null=True, verbose_name='until')),
+                ('count', models.PositiveIntegerField(blank=True, null=True, verbose_name='number of occurrences')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'booking series',
+                'verbose_name_plural': 'booking series',
+                'ordering': ['-start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bookingseries',
+            name='facility',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to='facilities.facility', verbose_name='facility'),
+        ),
+        migrations.AddField(
+            model_name='bookingseries',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to=settings.AUTH_USER_MODEL, verbose_name='user'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='bookings.bookingseries', verbose_name='series'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingseries',
+            constraint=models.CheckConstraint(check=models.Q(('end_time__gt', models.F('start_time'))), name='series_end_time_after_start_time'),
+        ),
+    ]
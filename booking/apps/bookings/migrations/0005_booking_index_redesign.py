@@ -0,0 +1,91 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from booking.apps.core.postgres import AddIndexConcurrently, RemoveIndexConcurrently, is_postgresql
+
+
+def user_fk_index_name(schema_editor, model):
+    """Return the name Django gave the automatic index of the user foreign key."""
+    return schema_editor._create_index_name(model._meta.db_table, ['user_id'])
+
+
+def concurrently(schema_editor):
+    """Return the keyword building and dropping indexes without locking out writes, where supported."""
+    return ' CONCURRENTLY' if is_postgresql(schema_editor) else ''
+
+
+def drop_user_fk_index(apps, schema_editor):
+    model = apps.get_model('bookings', 'Booking')
+    name = user_fk_index_name(schema_editor, model)
+    schema_editor.execute(f'DROP INDEX{concurrently(schema_editor)} IF EXISTS {schema_editor.quote_name(name)}')
+
+
+def create_user_fk_index(apps, schema_editor):
+    model = apps.get_model('bookings', 'Booking')
+    name = user_fk_index_name(schema_editor, model)
+    schema_editor.execute(
+        f'CREATE INDEX{concurrently(schema_editor)} IF NOT EXISTS {schema_editor.quote_name(name)} '
+        f'ON {schema_editor.quote_name(model._meta.db_table)} ("user_id")'
+    )
+
+
+class Migration(migrations.Migration):
+    # Indexes are built and dropped without locking out writes, which
+    # cannot happen inside a transaction. New indexes are in place before
+    # the ones they replace go away.
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bookings', '0004_bookingseries'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['-start_time', '-id'], name='bookings_start_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['user', '-start_time', '-id'], name='bookings_user_start_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['status', '-start_time', '-id'], name='bookings_status_start_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'confirmed')), fields=['facility', 'start_time'], include=('end_time',), name='bookings_conf_facility_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='booking',
+            name='bookings_bo_user_id_6a6c3a_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='booking',
+            name='bookings_bo_facilit_d42c9a_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='booking',
+            name='bookings_bo_status_4e2153_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='booking',
+            name='bookings_bo_start_t_4d5d70_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_user_fk_index, create_user_fk_index),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='booking',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to=settings.AUTH_USER_MODEL, verbose_name='user'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facilities', '0002_facility_search_vector'),
+        ('bookings', '0006_booking_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacilityUtilization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, verbose_name='booked minutes')),
+                ('confirmed_count', models.PositiveIntegerField(default=0, verbose_name='confirmed bookings')),
+                ('pending_count', models.PositiveIntegerField(default=0, verbose_name='pending bookings')),
+                ('cancelled_count', models.PositiveIntegerField(default=0, verbose_name='cancelled bookings')),
+                ('peak_concurrency', models.PositiveIntegerField(default=0, verbose_name='peak concurrency')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('facility', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='utilization', to='facilities.facility', verbose_name='facility')),
+            ],
+            options={
+                'verbose_name': 'facility utilization',
+                'verbose_name_plural': 'facility utilization',
+                'ordering': ['facility', 'date'],
+                'indexes': [models.Index(fields=['date'], name='utilization_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='facilityutilization',
+            constraint=models.UniqueConstraint(fields=('facility', 'date'), name='unique_facility_utilization_date'),
+        ),
+    ]
@@ -2,11 +2,105 @@
 Booking models for the booking project.
 """
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField, RangeOperators
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, connections, models, router, transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from psycopg2.extras import DateTimeTZRange
+
+from booking.apps.core.postgres import ExclusionConstraint, GinIndex
+from booking.apps.core.search import SearchSpec, full_text_q, ranked
+
+# Name of the exclusion constraint keeping confirmed bookings from overlapping
+OVERLAP_CONSTRAINT = 'exclude_overlapping_confirmed_bookings'
+OVERLAP_ERROR = _('The facility is not available during the selected time period.')
+
+
+class TsTzRange(models.Func):
+    """Build a half-open ``tstzrange`` from two datetime expressions."""
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class Int8Range(models.Func):
+    """
+    Build a single-value ``int8range`` from an integer expression.
+
+    Ranges have native GiST support, so comparing ``[id, id]`` ranges with
+    ``&&`` gives equality inside an exclusion constraint without requiring
+    the ``btree_gist`` extension.
+    """
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, expression, models.Value('[]'), **extra)
+
+
+def confirmed_overlaps(facility, start_time, end_time):
+    """
+    Return the confirmed bookings of a facility overlapping a time range.
+    
+    The filter is written with the same range expressions as the overlap
+    exclusion constraint, so its GiST index bounds the lookup by both the
+    facility and the period instead of scanning the facility's history.
+    Other databases, which have neither, compare the bounds directly.
+    ``facility`` is a facility id or an expression such as an OuterRef.
+    """
+    if connections[router.db_for_read(Booking)].vendor != 'postgresql':
+        return Booking.objects.filter(
+            status='confirmed', facility_id=facility, start_time__lt=end_time, end_time__gt=start_time,
+        )
+    if not hasattr(facility, 'resolve_expression'):
+        facility = models.Value(facility)
+    return Booking.objects.alias(
+        facility_range=Int8Range('facility'),
+        period=TsTzRange('start_time', 'end_time', models.Value('[)')),
+    ).filter(
+        status='confirmed',
+        facility_range__overlap=Int8Range(facility),
+        period__overlap=DateTimeTZRange(start_time, end_time, '[)'),
+    )
+
+
+class BookingQuerySet(models.QuerySet):
+    """QuerySet for the Booking model."""
+    SEARCH_INLINE_IDS = 1000
+    
+    def search(self, term):
+        """
+        Filter bookings by a search term.
+        
+        Titles and descriptions are matched through the full-text index;
+        users and facilities are resolved by their own indexed lookups
+        first, so the bookings are then fetched by foreign key instead of
+        joining every row to test it. Resolved ids are inlined, which lets
+        the planner estimate the match and combine the indexes; very broad
+        terms keep a subquery instead. Text matches rank first.
+        """
+        from django.contrib.auth import get_user_model
+        from booking.apps.facilities.models import Facility
+        users = get_user_model().objects.filter(
+            models.Q(username__icontains=term) | models.Q(email__icontains=term)
+        )
+        facilities = Facility.objects.filter(name__icontains=term)
+        queryset = self.filter(
+            full_text_q(self, term, Booking.search_spec)
+            | self._related_in('user', users)
+            | self._related_in('facility', facilities)
+        )
+        return ranked(queryset, term, Booking.search_spec)
+    
+    def _related_in(self, field, queryset):
+        """Build a ``field__in`` condition from a queryset of related objects."""
+        ids = list(queryset.values_list('pk', flat=True)[:self.SEARCH_INLINE_IDS + 1])
+        if len(ids) > self.SEARCH_INLINE_IDS:
+            return models.Q(**{f'{field}__in': queryset.values('pk')})
+        return models.Q(**{f'{field}_id__in': ids})
+
 
 class Booking(models.Model):
     """
@@ -23,7 +117,9 @@ class Booking(models.Model):
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE,
         related_name='bookings',
-        verbose_name=_('user')
+        verbose_name=_('user'),
+        # Covered by the leading column of bookings_user_start_id_idx
+        db_index=False
     )
     facility = models.ForeignKey(
         'facilities.Facility', 
@@ -44,22 +140,47 @@ class Booking(models.Model):
         default='pending'
     )
     number_of_people = models.PositiveIntegerField(_('number of people'), default=1)
+    series = models.ForeignKey(
+        'bookings.BookingSeries',
+        on_delete=models.SET_NULL,
+        related_name='bookings',
+        verbose_name=_('series'),
+        null=True,
+        blank=True
+    )
     
     # Metadata
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
     
+    # Full-text search, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+    search_spec = SearchSpec({'title': 'A', 'description': 'B'})
+    
+    objects = BookingQuerySet.as_manager()
+    
     class Meta:
         """Meta options for the Booking model."""
         verbose_name = _('booking')
         verbose_name_plural = _('bookings')
         ordering = ['-start_time']
-        # Database optimization - add indexes
+        # Database optimization - indexes follow the hot queries; the
+        # facility foreign key keeps its own index for all-status lookups.
         indexes = [
-            models.Index(fields=['user']),
-            models.Index(fields=['facility']),
-            models.Index(fields=['status']),
-            models.Index(fields=['start_time', 'end_time']),
+            # Staff booking list and date filters, newest first
+            models.Index(fields=['-start_time', '-id'], name='bookings_start_id_idx'),
+            # A user's booking list, newest first
+            models.Index(fields=['user', '-start_time', '-id'], name='bookings_user_start_id_idx'),
+            # Status filters and reminders for confirmed bookings in a period
+            models.Index(fields=['status', '-start_time', '-id'], name='bookings_status_start_id_idx'),
+            # Busy intervals of a facility, answered from the index alone
+            models.Index(
+                fields=['facility', 'start_time'],
+                include=['end_time'],
+                condition=models.Q(status='confirmed'),
+                name='bookings_conf_facility_idx'
+            ),
+            GinIndex(fields=['search_vector'], name='bookings_search_idx'),
         ]
         # Add constraints
         constraints = [
@@ -67,11 +188,37 @@ class Booking(models.Model):
                 check=models.Q(end_time__gt=models.F('start_time')),
                 name='end_time_after_start_time'
             ),
+            # Confirmed bookings of a facility may not overlap; the GiST index
+            # behind this constraint also serves every overlap query.
+            ExclusionConstraint(
+                name=OVERLAP_CONSTRAINT,
+                expressions=[
+                    (Int8Range('facility'), RangeOperators.OVERLAPS),
+                    (TsTzRange('start_time', 'end_time', models.Value('[)')), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(status='confirmed'),
+            ),
         ]
     
     def __str__(self):
         """Return string representation."""
-        return f"{self.title} - {self.facility.name} ({self.start_time.strftime('%Y-%m-%d %H:%M')})"
+        # Only name the facility when it is loaded, so listing bookings never queries per row
+        facility = self.facility.name if Booking.facility.is_cached(self) else f'#{self.facility_id}'
+        return f"{self.title} - {facility} ({self.start_time.strftime('%Y-%m-%d %H:%M')})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded state so saves can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance.get_interval_state()
+        return instance
+    
+    def get_interval_state(self):
+        """Return the fields that decide which facility time this booking occupies."""
+        deferred = self.get_deferred_fields()
+        if deferred & {'status', 'facility_id', 'start_time', 'end_time'}:
+            return None
+        return (self.status, self.facility_id, self.start_time, self.end_time)
     
     def clean(self):
         """Validate booking data."""
@@ -92,27 +239,268 @@ class Booking(models.Model):
         
         # Check for availability
         if not self.is_facility_available():
-            raise ValidationError(_('The facility is not available during the selected time period.'))
+            raise ValidationError(OVERLAP_ERROR)
+    
+    def get_constraints(self):
+        """
+        Leave the overlap constraint out of model validation: clean() already
+        performs the same check, and the database enforces it on write.
+        """
+        return [
+            (model_class, [c for c in constraints if c.name != OVERLAP_CONSTRAINT])
+            for model_class, constraints in super().get_constraints()
+        ]
     
     def is_facility_available(self):
         """Check if the facility is available for this booking."""
         if not self.pk:  # New booking
             return self.facility.is_available(self.start_time, self.end_time)
         else:  # Existing booking
-            overlapping_bookings = Booking.objects.filter(
-                facility=self.facility,
-                status='confirmed',
-                start_time__lt=self.end_time,
-                end_time__gt=self.start_time
-            ).exclude(pk=self.pk).exists()
-            return not overlapping_bookings
+            from booking.apps.bookings import interval_index
+            overlap = interval_index.has_overlap(
+                self.facility_id, self.start_time, self.end_time, exclude_pk=self.pk
+            )
+            if overlap is not None:
+                return not overlap
+            return not self.overlapping_bookings().exists()
+    
+    def overlapping_bookings(self):
+        """Return the confirmed bookings of the facility overlapping this one."""
+        queryset = confirmed_overlaps(self.facility_id, self.start_time, self.end_time)
+        if self.pk:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+    
+    def save(self, *args, **kwargs):
+        """
+        Save the booking, guarding confirmed bookings against overlaps.
+        
+        On PostgreSQL the exclusion constraint rejects an overlapping row in
+        the same statement as the write. Other backends, which do not get
+        the constraint, lock the facility row and re-check inside the
+        transaction instead. Either way a conflict is
+        raised as a ValidationError so forms can report it.
+        """
+        using = kwargs.get('using') or router.db_for_write(Booking, instance=self)
+        try:
+            with transaction.atomic(using=using):
+                if self.status == 'confirmed' and connections[using].vendor != 'postgresql':
+                    self._lock_facility(using)
+                    if self.overlapping_bookings().using(using).exists():
+                        raise ValidationError(OVERLAP_ERROR)
+                super().save(*args, **kwargs)
+        except IntegrityError as exc:
+            if not is_overlap_violation(exc):
+                raise
+            raise ValidationError(OVERLAP_ERROR) from exc
+    
+    def _lock_facility(self, using):
+        """Serialise writers of the same facility for the current transaction."""
+        from booking.apps.facilities.models import Facility
+        list(Facility.objects.using(using).select_for_update().filter(pk=self.facility_id).values_list('pk'))
     
     def confirm(self):
         """Confirm the booking."""
+        previous_status = self.status
         self.status = 'confirmed'
-        self.save()
+        try:
+            self.save()
+        except ValidationError:
+            self.status = previous_status
+            raise
     
     def cancel(self):
         """Cancel the booking."""
         self.status = 'cancelled'
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+class BookingSeries(models.Model):
+    """
+    Recurring booking series, expanded into one Booking per occurrence.
+    
+    The first occurrence is given by ``start_time``/``end_time``; later ones
+    repeat every ``interval`` days or weeks until ``until`` or ``count``.
+    """
+    FREQUENCY_CHOICES = (
+        ('daily', _('Daily')),
+        ('weekly', _('Weekly')),
+    )
+    MAX_OCCURRENCES = 366
+    
+    # Relations
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='booking_series',
+        verbose_name=_('user')
+    )
+    facility = models.ForeignKey(
+        'facilities.Facility',
+        on_delete=models.CASCADE,
+        related_name='booking_series',
+        verbose_name=_('facility')
+    )
+    
+    # Series details
+    title = models.CharField(_('title'), max_length=100)
+    description = models.TextField(_('description'), blank=True)
+    start_time = models.DateTimeField(_('first start time'))
+    end_time = models.DateTimeField(_('first end time'))
+    number_of_people = models.PositiveIntegerField(_('number of people'), default=1)
+    frequency = models.CharField(
+        _('frequency'),
+        max_length=10,
+        choices=FREQUENCY_CHOICES,
+        default='weekly'
+    )
+    interval = models.PositiveIntegerField(_('interval'), default=1)
+    until = models.DateField(_('until'), null=True, blank=True)
+    count = models.PositiveIntegerField(_('number of occurrences'), null=True, blank=True)
+    
+    # Metadata
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        """Meta options for the BookingSeries model."""
+        verbose_name = _('booking series')
+        verbose_name_plural = _('booking series')
+        ordering = ['-start_time']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(end_time__gt=models.F('start_time')),
+                name='series_end_time_after_start_time'
+            ),
+        ]
+    
+    def __str__(self):
+        """Return string representation."""
+        return f"{self.title} ({self.get_frequency_display()})"
+    
+    def clean(self):
+        """Validate series data."""
+        if self.start_time is None or self.end_time is None:
+            return
+        if self.end_time <= self.start_time:
+            raise ValidationError(_('End time must be after start time.'))
+        if not self.pk and self.start_time < timezone.now():
+            raise ValidationError(_('Start time must be in the future.'))
+        if not self.count and not self.until:
+            raise ValidationError(_('Please provide either an end date or a number of occurrences.'))
+        if self.end_time - self.start_time > self.get_period():
+            raise ValidationError(_('A booking may not last longer than the repeat interval.'))
+        if self.number_of_people > self.facility.capacity:
+            raise ValidationError(
+                _('Number of people exceeds facility capacity of %(capacity)s.'),
+                params={'capacity': self.facility.capacity},
+            )
+        occurrences = self.get_occurrences()
+        if not occurrences:
+            raise ValidationError(_('The series has no occurrences.'))
+        if len(occurrences) > self.MAX_OCCURRENCES:
+            raise ValidationError(
+                _('A series may have at most %(max)s occurrences.'),
+                params={'max': self.MAX_OCCURRENCES},
+            )
+    
+    def get_period(self):
+        """Return the time between two occurrences."""
+        days = 7 if self.frequency == 'weekly' else 1
+        return timezone.timedelta(days=days * self.interval)
+    
+    def get_occurrences(self):
+        """Return the ``(start, end)`` of every occurrence of the series."""
+        from booking.apps.bookings.recurrence import expand_occurrences
+        return expand_occurrences(
+            self.start_time, self.end_time, self.get_period(),
+            count=self.count, until=self.until, limit=self.MAX_OCCURRENCES + 1
+        )
+
+
+class FacilityOccupancy(models.Model):
+    """
+    Denormalized occupancy of a facility for one day.
+    
+    The bitmap holds one bit per fixed-size slot of the day, set when a
+    confirmed booking overlaps the slot.
+    """
+    facility = models.ForeignKey(
+        'facilities.Facility',
+        on_delete=models.CASCADE,
+        related_name='occupancy',
+        verbose_name=_('facility')
+    )
+    date = models.DateField(_('date'))
+    bitmap = models.BinaryField(_('bitmap'))
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        """Meta options for the FacilityOccupancy model."""
+        verbose_name = _('facility occupancy')
+        verbose_name_plural = _('facility occupancy')
+        ordering = ['facility', 'date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['facility', 'date'],
+                name='unique_facility_occupancy_date'
+            ),
+        ]
+    
+    def __str__(self):
+        """Return string representation."""
+        return f"{self.facility_id} - {self.date}"
+
+
+class FacilityUtilization(models.Model):
+    """
+    Daily utilization rollup of a facility.
+    
+    Counts cover the bookings overlapping the local day in each status, and
+    booked time the confirmed part of the day. Peak concurrency is the
+    largest number of pending or confirmed bookings overlapping at one
+    instant, which shows demand beyond the single confirmed booking a
+    facility can hold at a time.
+    """
+    facility = models.ForeignKey(
+        'facilities.Facility',
+        on_delete=models.CASCADE,
+        related_name='utilization',
+        verbose_name=_('facility')
+    )
+    date = models.DateField(_('date'))
+    booked_minutes = models.PositiveIntegerField(_('booked minutes'), default=0)
+    confirmed_count = models.PositiveIntegerField(_('confirmed bookings'), default=0)
+    pending_count = models.PositiveIntegerField(_('pending bookings'), default=0)
+    cancelled_count = models.PositiveIntegerField(_('cancelled bookings'), default=0)
+    peak_concurrency = models.PositiveIntegerField(_('peak concurrency'), default=0)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        """Meta options for the FacilityUtilization model."""
+        verbose_name = _('facility utilization')
+        verbose_name_plural = _('facility utilization')
+        ordering = ['facility', 'date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['facility', 'date'],
+                name='unique_facility_utilization_date'
+            ),
+        ]
+        indexes = [
+            # Reports over every facility for a period
+            models.Index(fields=['date'], name='utilization_date_idx'),
+        ]
+    
+    def __str__(self):
+        """Return string representation."""
+        return f"{self.facility_id} - {self.date}"
+
+
+def is_overlap_violation(exc):
+    """Return whether an IntegrityError comes from the overlap exclusion constraint."""
+    diag = getattr(exc.__cause__, 'diag', None)
+    constraint_name = getattr(diag, 'constraint_name', None)
+    if constraint_name:
+        return constraint_name == OVERLAP_CONSTRAINT
+    return OVERLAP_CONSTRAINT in str(exc)
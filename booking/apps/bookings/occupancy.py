@@ -0,0 +1,274 @@
+"""
+Compact occupancy bitmaps per facility and day.
+
+Each day is split into fixed-size slots in the project's default timezone
+and stored as a little-endian bitmap: bit ``n`` of the integer value is set
+when a confirmed booking overlaps slot ``n``. Availability badges and
+heatmaps then become bit operations over a few bytes instead of range scans
+on the bookings table.
+
+The slots of a confirmed interval that appears or disappears are updated
+in the transaction that changes it, under a lock on the rows of its days,
+so the bitmaps never disagree with the committed bookings. Once
+``rebuild_occupancy`` has filled them for the existing bookings, the
+``BOOKING_OCCUPANCY_CHECKS`` setting lets ``Facility.is_available()``
+answer from them.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from booking.apps.core.timewindow import day_window
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_BYTES = SLOTS_PER_DAY // 8
+# Any slot boundary, for aligning instants to slots
+SLOT_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_timezone():
+    """Return the timezone days and slots are laid out in."""
+    return timezone.get_default_timezone()
+
+
+def to_bytes(value):
+    """Pack a bitmap integer into its stored form."""
+    return value.to_bytes(BITMAP_BYTES, 'little')
+
+
+def from_bytes(data):
+    """Unpack a stored bitmap into an integer."""
+    return int.from_bytes(bytes(data), 'little') if data else 0
+
+
+def slot_of(value):
+    """Return the local date and slot index of an aware datetime."""
+    local = timezone.localtime(value, get_timezone())
+    return local.date(), (local.hour * 60 + local.minute) // SLOT_MINUTES
+
+
+def slot_mask(first, last):
+    """Return a bitmap with slots ``first`` to ``last`` (exclusive) set."""
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def interval_masks(start_time, end_time):
+    """
+    Yield ``(date, mask)`` for every day a half-open interval touches.
+
+    Slots are set when the interval overlaps them even partially.
+    """
+    tz = get_timezone()
+    start = timezone.localtime(start_time, tz).replace(tzinfo=None)
+    end = timezone.localtime(end_time, tz).replace(tzinfo=None)
+    day = start.date()
+    while datetime.datetime.combine(day, datetime.time.min) < end:
+        midnight = datetime.datetime.combine(day, datetime.time.min)
+        first_minutes = max((start - midnight).total_seconds() / 60, 0)
+        last_minutes = min((end - midnight).total_seconds() / 60, 24 * 60)
+        first = int(first_minutes // SLOT_MINUTES)
+        last = min(-int(-last_minutes // SLOT_MINUTES), SLOTS_PER_DAY)
+        mask = slot_mask(first, last)
+        if mask:
+            yield day, mask
+        day += datetime.timedelta(days=1)
+
+
+def day_bounds(first_day, last_day):
+    """Return the aware instants enclosing a range of local days."""
+    return day_window(first_day, last_day, get_timezone())
+
+
+def build_bitmaps(rows):
+    """Fold ``(facility_id, start_time, end_time)`` rows into ``{(facility_id, date): bitmap}``."""
+    bitmaps = {}
+    for facility_id, start_time, end_time in rows:
+        for day, mask in interval_masks(start_time, end_time):
+            key = (facility_id, day)
+            bitmaps[key] = bitmaps.get(key, 0) | mask
+    return bitmaps
+
+
+def store_bitmaps(facility_ids, first_day, last_day, bitmaps):
+    """
+    Replace the stored bitmaps of the given facilities and day range.
+
+    Returns the number of occupied facility-days stored.
+    """
+    from booking.apps.bookings.models import FacilityOccupancy
+
+    rows = [
+        FacilityOccupancy(facility_id=facility_id, date=day, bitmap=to_bytes(value))
+        for (facility_id, day), value in bitmaps.items()
+        if value and first_day <= day <= last_day
+    ]
+    with transaction.atomic():
+        FacilityOccupancy.objects.filter(
+            facility_id__in=facility_ids,
+            date__gte=first_day,
+            date__lte=last_day,
+        ).delete()
+        FacilityOccupancy.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def day_spans(intervals):
+    """Return ``{facility_id: (first_day, last_day)}`` spanning some ``(facility_id, start_time, end_time)`` intervals."""
+    spans = {}
+    for facility_id, start_time, end_time in intervals:
+        first_day = slot_of(start_time)[0]
+        last_day = slot_of(end_time - datetime.timedelta(microseconds=1))[0]
+        if facility_id in spans:
+            first_day = min(first_day, spans[facility_id][0])
+            last_day = max(last_day, spans[facility_id][1])
+        spans[facility_id] = (first_day, last_day)
+    return spans
+
+
+def update_intervals(intervals, using=None):
+    """
+    Update the slots of some ``(facility_id, start_time, end_time)`` intervals.
+
+    Call this inside the transaction that made the intervals' confirmed
+    time appear or disappear, after the change. Only the slots the
+    intervals touch change: they are cleared and set again from the
+    confirmed bookings overlapping them, which keeps slots shared with
+    neighbouring bookings. The rows of the touched days are created if
+    missing and locked in order, so concurrent changes to the same days
+    apply one after the other, and rows left empty are deleted.
+    """
+    from booking.apps.bookings.models import Booking, FacilityOccupancy
+
+    masks = build_bitmaps(intervals)
+    if not masks:
+        return
+    manager = FacilityOccupancy.objects.db_manager(using)
+    manager.bulk_create([
+        FacilityOccupancy(facility_id=facility_id, date=day, bitmap=to_bytes(0))
+        for facility_id, day in masks
+    ], ignore_conflicts=True)
+    spans = day_spans(intervals)
+    rows = list(manager.select_for_update().filter(Q(*[
+        Q(facility_id=facility_id, date__gte=first_day, date__lte=last_day)
+        for facility_id, (first_day, last_day) in spans.items()
+    ], _connector=Q.OR)).order_by('facility_id', 'date'))
+    # Read the bookings overlapping the slots of each facility's intervals
+    # once the rows are locked, so that a concurrent change to the same
+    # days is committed and seen
+    extents = {}
+    for facility_id, start_time, end_time in intervals:
+        start, end = _outer_slots(start_time, end_time)
+        if facility_id in extents:
+            start, end = min(start, extents[facility_id][0]), max(end, extents[facility_id][1])
+        extents[facility_id] = (start, end)
+    busy = build_bitmaps(Booking.objects.db_manager(using).filter(Q(*[
+        Q(facility_id=facility_id, start_time__lt=end, end_time__gt=start)
+        for facility_id, (start, end) in extents.items()
+    ], _connector=Q.OR), status='confirmed').order_by().values_list('facility_id', 'start_time', 'end_time'))
+
+    changed, empty = [], []
+    now = timezone.now()
+    for row in rows:
+        key = (row.facility_id, row.date)
+        mask = masks.get(key, 0)
+        old = from_bytes(row.bitmap)
+        value = old & ~mask | busy.get(key, 0) & mask
+        if not value:
+            empty.append(row.pk)
+        elif value != old:
+            row.bitmap = to_bytes(value)
+            row.updated_at = now
+            changed.append(row)
+    if changed:
+        manager.bulk_update(changed, ['bitmap', 'updated_at'])
+    if empty:
+        manager.filter(pk__in=empty).delete()
+
+
+def is_enabled():
+    """Return whether availability checks may be answered from the bitmaps."""
+    return getattr(settings, 'BOOKING_OCCUPANCY_CHECKS', False)
+
+
+def get_bitmaps(facility_ids, first_day, last_day=None):
+    """Return ``{(facility_id, date): bitmap}`` for the stored days in a range."""
+    from booking.apps.bookings.models import FacilityOccupancy
+
+    rows = FacilityOccupancy.objects.filter(
+        facility_id__in=facility_ids,
+        date__gte=first_day,
+        date__lte=last_day or first_day,
+    ).values_list('facility_id', 'date', 'bitmap')
+    return {(facility_id, day): from_bytes(bitmap) for facility_id, day, bitmap in rows}
+
+
+def busy_at(facility_ids, moment=None):
+    """Return the ids of the facilities whose slot at ``moment`` (default now) is occupied."""
+    day, slot = slot_of(moment or timezone.now())
+    bitmaps = get_bitmaps(facility_ids, day)
+    return {facility_id for (facility_id, _day), value in bitmaps.items() if value >> slot & 1}
+
+
+def is_free(facility_id, start_time, end_time):
+    """
+    Check a time range against the bitmaps.
+
+    Returns True when no slot touched by the range is occupied and False
+    when a slot lying entirely inside the range is occupied. Ranges that
+    only share a partially covered slot with a booking return None, and
+    the caller should fall back to the bookings table.
+    """
+    masks = list(interval_masks(start_time, end_time))
+    if not masks:
+        return True
+    bitmaps = get_bitmaps([facility_id], masks[0][0], masks[-1][0])
+    inner = {day: mask for day, mask in interval_masks(*_inner_slots(start_time, end_time))}
+    ambiguous = False
+    for day, mask in masks:
+        value = bitmaps.get((facility_id, day), 0)
+        if value & inner.get(day, 0):
+            return False
+        if value & mask:
+            ambiguous = True
+    return None if ambiguous else True
+
+
+def _inner_slots(start_time, end_time):
+    """Shrink a range to the slots it covers completely."""
+    step = datetime.timedelta(minutes=SLOT_MINUTES)
+    start = SLOT_EPOCH + -((SLOT_EPOCH - start_time) // step) * step
+    end = SLOT_EPOCH + ((end_time - SLOT_EPOCH) // step) * step
+    return start, max(start, end)
+
+
+def _outer_slots(start_time, end_time):
+    """Widen a range to the slots it touches."""
+    step = datetime.timedelta(minutes=SLOT_MINUTES)
+    start = SLOT_EPOCH + ((start_time - SLOT_EPOCH) // step) * step
+    end = SLOT_EPOCH + -((SLOT_EPOCH - end_time) // step) * step
+    return start, end
+
+
+def month_heatmap(facility_id, year, month):
+    """
+    Return the occupied fraction of every day of a month.
+
+    Returns a list of ``(date, fraction)`` tuples computed from bit counts.
+    """
+    first_day = datetime.date(year, month, 1)
+    next_month = (first_day + datetime.timedelta(days=32)).replace(day=1)
+    last_day = next_month - datetime.timedelta(days=1)
+    bitmaps = get_bitmaps([facility_id], first_day, last_day)
+    heatmap = []
+    day = first_day
+    while day <= last_day:
+        value = bitmaps.get((facility_id, day), 0)
+        heatmap.append((day, bin(value).count('1') / SLOTS_PER_DAY))
+        day += datetime.timedelta(days=1)
+    return heatmap
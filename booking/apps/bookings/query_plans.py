@@ -0,0 +1,114 @@
+"""
+Plan checks for the hot booking and facility queries.
+
+Every check builds its query the way the application does, from a sample
+booking taken from the database, so the plans reflect the real code paths.
+Budgets are estimated planner costs; the queries are bounded by an index
+range or a page limit, so their cost should not grow with the table.
+"""
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from booking.apps.bookings.models import OVERLAP_CONSTRAINT, Booking
+from booking.apps.bookings.tasks import get_reminder_bookings
+from booking.apps.core.pagination import KeysetPaginator
+from booking.apps.core.query_plans import PlanCheck
+
+
+def get_sample_booking(using='default'):
+    """Return the most recent confirmed booking of a database to build checks from, or None."""
+    return Booking.objects.using(using).filter(status='confirmed').select_related('facility', 'user').order_by('-pk').first()
+
+
+def list_page_queryset(user, params=None):
+    """Return the first page query of BookingListView for a user."""
+    from booking.apps.bookings.views import BookingListView
+
+    request = RequestFactory().get('/bookings/', params or {})
+    request.user = user
+    view = BookingListView()
+    view.setup(request)
+    paginator = KeysetPaginator(view.get_queryset(), view.paginate_by, view.keyset_ordering)
+    return paginator.queryset[:paginator.per_page + 1]
+
+
+def get_hot_query_checks(booking):
+    """Return the PlanChecks of the hot paths, built around a sample booking."""
+    from booking.apps.facilities.forms import FacilityFilterForm
+    from booking.apps.facilities.models import Facility
+
+    facility = booking.facility
+    start, end = booking.start_time, booking.end_time
+    day = timezone.localdate(start)
+    staff = get_user_model()(username='plan-check', is_staff=True)
+
+    def facility_is_available():
+        # The interval index and the occupancy bitmaps would answer without
+        # the overlap query
+        with override_settings(BOOKING_INTERVAL_INDEX=False, BOOKING_OCCUPANCY_CHECKS=False):
+            facility.is_available(start, end)
+
+    def booking_is_facility_available():
+        with override_settings(BOOKING_INTERVAL_INDEX=False, BOOKING_OCCUPANCY_CHECKS=False):
+            booking.is_facility_available()
+
+    def available_facilities():
+        form = FacilityFilterForm(data={'available_from': start, 'available_to': end})
+        form.is_valid()
+        return form.filter_queryset(Facility.objects.filter(is_active=True))[:11]
+
+    return [
+        PlanCheck(
+            'facility_is_available',
+            facility_is_available,
+            indexes=[OVERLAP_CONSTRAINT],
+            max_cost=50,
+            description='Facility.is_available',
+        ),
+        PlanCheck(
+            'booking_is_facility_available',
+            booking_is_facility_available,
+            indexes=[OVERLAP_CONSTRAINT],
+            max_cost=50,
+            description='Booking.is_facility_available',
+        ),
+        PlanCheck(
+            'user_booking_list',
+            lambda: list_page_queryset(booking.user),
+            indexes=['bookings_user_start_id_idx'],
+            max_cost=250,
+            description='BookingListView.get_queryset for a user',
+        ),
+        PlanCheck(
+            'staff_booking_list',
+            lambda: list_page_queryset(staff),
+            indexes=['bookings_start_id_idx'],
+            max_cost=100,
+            description='BookingListView.get_queryset for staff',
+        ),
+        PlanCheck(
+            'staff_booking_list_by_date',
+            lambda: list_page_queryset(staff, {'date_from': day, 'date_to': day}),
+            indexes=['bookings_start_id_idx'],
+            max_cost=100,
+            description='BookingListView.get_queryset for staff filtered by date',
+        ),
+        PlanCheck(
+            'facility_availability_search',
+            available_facilities,
+            indexes=[OVERLAP_CONSTRAINT],
+            max_cost=500,
+            description='FacilityFilterForm.filter_queryset with a time range',
+        ),
+        PlanCheck(
+            'booking_reminders',
+            lambda: get_reminder_bookings(day),
+            indexes=['bookings_start_id_idx', 'bookings_status_start_id_idx'],
+            # Proportional to one day of bookings rather than to the table:
+            # about 490 on the seeded test data
+            max_cost=2500,
+            description='send_booking_reminders',
+        ),
+    ]
@@ -0,0 +1,100 @@
+"""
+Signal handlers for the bookings app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from booking.apps.bookings import interval_index, live, occupancy, utilization
+from booking.apps.bookings.models import Booking
+from booking.apps.facilities import cache as facility_cache
+
+
+def confirmed_intervals(*states):
+    """Return the ``(facility_id, start_time, end_time)`` intervals of the confirmed states."""
+    return [state[1:] for state in states if state and state[0] == 'confirmed']
+
+
+def booked_intervals(*states):
+    """Return the ``(facility_id, start_time, end_time)`` intervals of the states, whatever their status."""
+    return [state[1:] for state in states if state]
+
+
+def confirmed_time_changed(intervals, using):
+    """
+    Refresh what derives from the confirmed time of some intervals' facilities.
+    
+    The occupancy bitmaps are updated within the change's transaction. The
+    cached facility data is invalidated right away and again once the change
+    is committed, so nothing read meanwhile outlives the commit.
+    """
+    facility_ids = {interval[0] for interval in intervals}
+    occupancy.update_intervals(intervals, using=using)
+    facility_cache.invalidate_facilities(*facility_ids)
+    transaction.on_commit(lambda: facility_cache.invalidate_facilities(*facility_ids), using=using)
+
+
+def invalidate_interval_index(intervals, using):
+    """Invalidate the interval indexes of some confirmed intervals' facilities once the change is committed."""
+    facility_ids = {interval[0] for interval in intervals}
+    if facility_ids:
+        transaction.on_commit(lambda: interval_index.invalidate(*facility_ids), using=using)
+
+
+@receiver(post_save, sender=Booking)
+def invalidate_interval_index_on_save(sender, instance, using, **kwargs):
+    """
+    Invalidate the interval indexes of the facilities whose confirmed time changed.
+    
+    New pending bookings and edits that leave the status, facility and time
+    alone keep the indexes. This handler is connected before
+    ``booking_changed_on_save``, so the loaded state is still the previous
+    one.
+    """
+    previous = getattr(instance, '_loaded_state', None)
+    current = instance.get_interval_state()
+    if previous != current:
+        invalidate_interval_index(confirmed_intervals(previous, current), using)
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_interval_index_on_delete(sender, instance, using, **kwargs):
+    """Invalidate the interval indexes of a deleted confirmed booking's facility."""
+    invalidate_interval_index(confirmed_intervals(instance.get_interval_state()), using)
+
+
+@receiver(post_save, sender=Booking)
+def booking_changed_on_save(sender, instance, using, **kwargs):
+    """
+    Refresh what derives from a booking's status, facility and time when they changed.
+    
+    The occupancy bitmaps and cached facility data follow confirmed time;
+    the utilization rollups and the live updates follow every status.
+    """
+    previous = getattr(instance, '_loaded_state', None)
+    current = instance.get_interval_state()
+    instance._loaded_state = current
+    if previous == current:
+        return
+    intervals = confirmed_intervals(previous, current)
+    if intervals:
+        confirmed_time_changed(intervals, using)
+    booked = booked_intervals(previous, current)
+    utilization.refresh_later(booked, using=using)
+    booking_id, user_id = instance.pk, instance.user_id
+    transaction.on_commit(lambda: live.publish_change(booking_id, user_id, previous, current), using=using)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_changed_on_delete(sender, instance, using, **kwargs):
+    """Refresh what derives from a deleted booking, and publish its deletion live."""
+    state = instance.get_interval_state()
+    intervals = confirmed_intervals(state)
+    if intervals:
+        confirmed_time_changed(intervals, using)
+    booked = booked_intervals(state)
+    if booked:
+        utilization.refresh_later(booked, using=using)
+    # The primary key is cleared once the deletion completes
+    booking_id, user_id = instance.pk, instance.user_id
+    transaction.on_commit(lambda: live.publish_change(booking_id, user_id, state, None), using=using)
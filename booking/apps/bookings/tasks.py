@@ -1,16 +1,34 @@
 """
 Celery tasks for the bookings app.
 """
+import datetime
 import logging
 
 from celery import shared_task
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
 
 logger = logging.getLogger(__name__)
 
+# Notification kind -> (subject, template name without extension)
+BOOKING_NOTIFICATIONS = {
+    'confirmation': (_('Booking Confirmation: %(title)s'), 'bookings/emails/booking_confirmation'),
+    'cancellation': (_('Booking Cancellation: %(title)s'), 'bookings/emails/booking_cancellation'),
+}
+
+
+def get_reminder_bookings(day):
+    """Return the confirmed bookings starting on a local day."""
+    from booking.apps.bookings.models import Booking
+    from booking.apps.core.timewindow import date_range_filter
+    
+    return Booking.objects.filter(
+        date_range_filter('start_time', day, day),
+        status='confirmed',
+    ).select_related('user', 'facility')
+
 
 @shared_task
 def send_booking_confirmation(booking_id):
@@ -57,6 +75,53 @@ def send_booking_confirmation(booking_id):
         return False
 
 
+@shared_task
+def send_series_confirmation(series_id):
+    """
+    Send one confirmation email for a booking series, listing every occurrence.
+    
+    Args:
+        series_id: The ID of the series to confirm.
+    """
+    from booking.apps.bookings.models import BookingSeries
+    
+    try:
+        series = BookingSeries.objects.select_related('user', 'facility').get(pk=series_id)
+        bookings = list(series.bookings.order_by('start_time'))
+        
+        # Prepare the email
+        subject = _('Booking Series Confirmation: %(title)s') % {'title': series.title}
+        
+        # Render the email template
+        email_context = {
+            'series': series,
+            'bookings': bookings,
+            'user': series.user,
+        }
+        html_message = render_to_string('bookings/emails/booking_series_confirmation.html', email_context)
+        plain_message = render_to_string('bookings/emails/booking_series_confirmation_plain.txt', email_context)
+        
+        # Send the email
+        send_mail(
+            subject=subject,
+            message=plain_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[series.user.email],
+            html_message=html_message,
+            fail_silently=False,
+        )
+        
+        logger.info(f"Booking series confirmation email sent for series ID: {series_id}")
+        return True
+        
+    except BookingSeries.DoesNotExist:
+        logger.error(f"Failed to send booking series confirmation: Series {series_id} does not exist")
+        return False
+    except Exception as e:
+        logger.error(f"Failed to send booking series confirmation for series {series_id}: {str(e)}")
+        return False
+
+
 @shared_task
 def send_booking_cancellation(booking_id):
     """
@@ -102,24 +167,65 @@ def send_booking_cancellation(booking_id):
         return False
 
 
+@shared_task
+def send_booking_notifications(kind, booking_ids):
+    """
+    Send one kind of notification email for many bookings.
+    
+    The bookings are loaded in one query and the emails are sent over a
+    single mail connection.
+    
+    Args:
+        kind: A key of BOOKING_NOTIFICATIONS.
+        booking_ids: The IDs of the bookings to notify about.
+    
+    Returns:
+        The number of emails sent.
+    """
+    from booking.apps.bookings.models import Booking
+    
+    subject, template = BOOKING_NOTIFICATIONS[kind]
+    messages = []
+    for booking in Booking.objects.filter(pk__in=booking_ids).select_related('user', 'facility'):
+        try:
+            email_context = {
+                'booking': booking,
+                'user': booking.user,
+            }
+            message = EmailMultiAlternatives(
+                subject=subject % {'title': booking.title},
+                body=render_to_string(f'{template}_plain.txt', email_context),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[booking.user.email],
+            )
+            message.attach_alternative(render_to_string(f'{template}.html', email_context), 'text/html')
+            messages.append(message)
+        except Exception as e:
+            logger.error(f"Failed to prepare booking {kind} for booking {booking.pk}: {str(e)}")
+    
+    try:
+        sent = get_connection(fail_silently=False).send_messages(messages) or 0
+    except Exception as e:
+        logger.error(f"Failed to send {len(messages)} booking {kind} emails: {str(e)}")
+        return 0
+    logger.info(f"Booking {kind} emails sent: {sent} of {len(booking_ids)}")
+    return sent
+
+
 @shared_task
 def send_booking_reminders():
     """
     Send reminder emails for upcoming bookings.
     This task should be scheduled to run daily.
     """
-    from booking.apps.bookings.models import Booking
     from django.utils import timezone
     
     # Get bookings starting tomorrow
-    tomorrow = timezone.now().date() + timezone.timedelta(days=1)
+    tomorrow = timezone.localdate() + timezone.timedelta(days=1)
     
     try:
         # Find confirmed bookings for tomorrow
-        bookings = Booking.objects.filter(
-            status='confirmed',
-            start_time__date=tomorrow
-        ).select_related('user', 'facility')
+        bookings = get_reminder_bookings(tomorrow)
         
         for booking in bookings:
             try:
@@ -154,3 +260,18 @@ def send_booking_reminders():
     except Exception as e:
         logger.error(f"Failed to process booking reminders: {str(e)}")
         return False
+
+
+@shared_task
+def refresh_utilization(spans):
+    """
+    Recompute the utilization rollups of some facilities over ranges of days.
+    
+    Args:
+        spans: ``[facility_id, first_day, last_day]`` lists, with the days in
+            ISO format.
+    """
+    from booking.apps.bookings import utilization
+    
+    for facility_id, first_day, last_day in spans:
+        utilization.refresh([facility_id], datetime.date.fromisoformat(first_day), datetime.date.fromisoformat(last_day))
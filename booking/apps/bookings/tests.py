@@ -1,18 +1,66 @@
 """
 Tests for the bookings app.
 """
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.apps import apps
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.utils.http import http_date
 
-from booking.apps.bookings.models import Booking
+from booking.apps.bookings import interval_index, live, occupancy, utilization
+from booking.apps.bookings.analytics import UtilizationReport
+from booking.apps.bookings.ical import feed_token, fold
+from booking.apps.bookings.importer import import_bookings
+from booking.apps.bookings.query_plans import get_hot_query_checks, get_sample_booking
+from booking.apps.bookings.tasks import get_reminder_bookings, send_booking_notifications
+from booking.apps.bookings.transitions import bulk_cancel, bulk_confirm, find_conflicts
+from booking.apps.bookings.models import (
+    Booking, BookingQuerySet, BookingSeries, FacilityOccupancy, FacilityUtilization,
+)
+from booking.apps.bookings.recurrence import SeriesConflictError, create_series
 from booking.apps.bookings.forms import BookingForm, BookingFilterForm
+from booking.apps.bookings.views import BookingDetailView, BookingListView
+from booking.apps.core import pubsub
+from booking.apps.core.instrumentation import get_budget
+from booking.apps.core.pagination import CappedCountPaginator, KeysetPaginator
+from booking.apps.core.query_plans import run_check
 from booking.apps.facilities.models import Facility
 
 User = get_user_model()
 
 
+def create_booking(user, facility, start, end, status='pending', title="Booking"):
+    """Create a booking of a facility for a user."""
+    return Booking.objects.create(
+        user=user,
+        facility=facility,
+        title=title,
+        start_time=start,
+        end_time=end,
+        status=status,
+    )
+
+
 class BookingModelTest(TestCase):
     """Test the Booking model."""
 
@@ -66,6 +114,1099 @@ class BookingModelTest(TestCase):
         self.assertEqual(self.booking.status, "cancelled")
 
 
+class BookingOverlapConstraintTest(TestCase):
+    """Test the database-enforced non-overlap of confirmed bookings."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.staff_user = User.objects.create_user(
+            username='staffuser',
+            email='staff@example.com',
+            password='password',
+            is_staff=True
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        self.start = timezone.now() + timezone.timedelta(days=1)
+        self.confirmed = create_booking(
+            self.user, self.facility, self.start, self.start + timezone.timedelta(hours=2), 'confirmed'
+        )
+
+    def test_overlapping_confirmed_booking_is_rejected(self):
+        """Test that saving an overlapping confirmed booking raises a validation error."""
+        with self.assertRaises(ValidationError):
+            create_booking(
+                self.user, self.facility,
+                self.start + timezone.timedelta(hours=1),
+                self.start + timezone.timedelta(hours=3),
+                'confirmed'
+            )
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 1)
+
+    def test_adjacent_and_other_facility_bookings_are_allowed(self):
+        """Test that touching bookings and other facilities do not conflict."""
+        other = Facility.objects.create(name="Other", location="Elsewhere", capacity=5)
+        end = self.start + timezone.timedelta(hours=2)
+        create_booking(self.user, self.facility, end, end + timezone.timedelta(hours=1), 'confirmed')
+        create_booking(self.user, other, self.start, end, 'confirmed')
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 3)
+
+    def test_overlap_check_without_constraint(self):
+        """Test that databases without the constraint lock the facility and check for overlaps before writing."""
+        with mock.patch.object(connection, 'vendor', 'sqlite'), CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(ValidationError):
+                create_booking(
+                    self.user, self.facility,
+                    self.start + timezone.timedelta(hours=1),
+                    self.start + timezone.timedelta(hours=3),
+                    'confirmed'
+                )
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([sql for sql in statements if sql.startswith('INSERT')])
+        if connection.features.has_select_for_update:
+            self.assertTrue([sql for sql in statements if sql.endswith('FOR UPDATE')])
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The exclusion constraint only exists on PostgreSQL')
+    def test_constraint_applies_to_bulk_writes(self):
+        """Test that the database rejects overlaps that bypass the model."""
+        pending = create_booking(self.user, self.facility, self.start, self.start + timezone.timedelta(hours=1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.filter(pk=pending.pk).update(status='confirmed')
+
+    @skipUnless(connection.vendor == 'postgresql', 'The exclusion constraint only exists on PostgreSQL')
+    def test_migration_demotes_overlapping_bookings(self):
+        """Test that the constraint's migration keeps the earliest of overlapping confirmed bookings."""
+        migration = import_module('booking.apps.bookings.migrations.0002_booking_overlap_exclusion')
+        constraint = next(c for c in Booking._meta.constraints if c.name == 'exclude_overlapping_confirmed_bookings')
+        with connection.schema_editor() as schema_editor:
+            # Check the deferred foreign keys now, as tables with pending checks cannot be altered
+            schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            schema_editor.remove_constraint(Booking, constraint)
+        other = Facility.objects.create(name="Other", location="Elsewhere", capacity=5)
+        hour = timezone.timedelta(hours=1)
+        overlapping, adjacent, elsewhere = Booking.objects.bulk_create([
+            Booking(user=self.user, facility=self.facility, title="Booking", status='confirmed',
+                    start_time=self.start + hour, end_time=self.start + 3 * hour),
+            Booking(user=self.user, facility=self.facility, title="Booking", status='confirmed',
+                    start_time=self.start + 2 * hour, end_time=self.start + 4 * hour),
+            Booking(user=self.user, facility=other, title="Booking", status='confirmed',
+                    start_time=self.start, end_time=self.start + 2 * hour),
+        ])
+        stdout = StringIO()
+        with connection.schema_editor() as schema_editor, mock.patch('sys.stdout', stdout):
+            migration.demote_overlapping_bookings(apps, schema_editor)
+            schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            schema_editor.add_constraint(Booking, constraint)
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        # The second booking only overlapped the one moved back to pending
+        self.assertEqual(statuses[overlapping.pk], 'pending')
+        self.assertEqual(statuses[adjacent.pk], 'confirmed')
+        self.assertEqual(statuses[self.confirmed.pk], 'confirmed')
+        self.assertEqual(statuses[elsewhere.pk], 'confirmed')
+        self.assertIn(f'back to pending: {overlapping.pk}', stdout.getvalue())
+
+    def test_confirm_conflict_keeps_status(self):
+        """Test that a conflicting confirm raises and leaves the booking pending."""
+        pending = create_booking(self.user, self.facility, self.start, self.start + timezone.timedelta(hours=1))
+        with self.assertRaises(ValidationError):
+            pending.confirm()
+        self.assertEqual(pending.status, 'pending')
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'pending')
+
+    def test_confirm_view_reports_conflict(self):
+        """Test that the confirm view reports a conflict instead of failing."""
+        pending = create_booking(self.user, self.facility, self.start, self.start + timezone.timedelta(hours=1))
+        self.client.login(username='staffuser', password='password')
+        url = reverse('bookings:booking_confirm', args=[pending.pk])
+        response = self.client.post(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'error')
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'pending')
+
+
+class BookingIndexTest(TestCase):
+    """Test the index layout of the bookings table."""
+
+    def test_no_redundant_indexes(self):
+        """Test that no plain index is a prefix of another btree index."""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Booking._meta.db_table)
+        btree = {
+            name: tuple(info['columns'])
+            for name, info in constraints.items()
+            if info['index'] and info['type'] == 'idx' and not info['primary_key']
+        }
+        self.assertIn('bookings_user_start_id_idx', btree)
+        self.assertIn('bookings_conf_facility_idx', btree)
+        for name, columns in btree.items():
+            for other, other_columns in btree.items():
+                if name != other and other != 'bookings_conf_facility_idx':
+                    self.assertNotEqual(other_columns[:len(columns)], columns, f'{name} is covered by {other}')
+
+
+@override_settings(BOOKING_INTERVAL_INDEX=True)
+class BookingIntervalIndexTest(TestCase):
+    """Test the in-process interval index for availability checks."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        interval_index.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        self.start = timezone.now() + timezone.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = Booking.objects.create(
+                user=self.user,
+                facility=self.facility,
+                title="Booking",
+                start_time=self.start,
+                end_time=self.start + timezone.timedelta(hours=2),
+                status='confirmed',
+            )
+
+    def test_lookups_do_not_query_once_loaded(self):
+        """Test that repeated checks are answered without the database."""
+        later = self.start + timezone.timedelta(hours=2)
+        self.assertFalse(self.facility.is_available(self.start, later))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.facility.is_available(
+                self.start + timezone.timedelta(hours=1), later + timezone.timedelta(hours=1)
+            ))
+            self.assertTrue(self.facility.is_available(later, later + timezone.timedelta(hours=1)))
+            self.assertTrue(self.booking.is_facility_available())
+
+    def test_changes_invalidate_the_index(self):
+        """Test that saving a booking invalidates the facility index."""
+        later = self.start + timezone.timedelta(hours=2)
+        self.assertFalse(self.facility.is_available(self.start, later))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.cancel()
+        self.assertTrue(self.facility.is_available(self.start, later))
+
+    def test_unconfirmed_changes_keep_the_index(self):
+        """Test that pending bookings and title edits leave the facility index loaded."""
+        index = interval_index.get_index(self.facility.pk)
+        later = self.start + timezone.timedelta(hours=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                user=self.user, facility=self.facility, title="Pending",
+                start_time=later, end_time=later + timezone.timedelta(hours=1),
+            )
+            self.booking.title = "Renamed"
+            self.booking.save()
+        self.assertIs(interval_index.get_index(self.facility.pk), index)
+
+    def test_moving_a_booking_invalidates_both_facilities(self):
+        """Test that a booking moved to another facility frees its time in the old facility's index."""
+        other = Facility.objects.create(name="Other", location="Elsewhere", capacity=10)
+        later = self.start + timezone.timedelta(hours=2)
+        self.assertFalse(self.facility.is_available(self.start, later))
+        self.assertTrue(other.is_available(self.start, later))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.facility = other
+            self.booking.save()
+        self.assertTrue(self.facility.is_available(self.start, later))
+        self.assertFalse(other.is_available(self.start, later))
+
+    def test_indexes_are_bounded(self):
+        """Test that a process keeps only the most recently used indexes."""
+        other = Facility.objects.create(name="Other", location="Elsewhere", capacity=10)
+        with mock.patch.object(interval_index, 'MAX_INDEXES', 1):
+            interval_index.get_index(self.facility.pk)
+            interval_index.get_index(other.pk)
+        self.assertEqual(list(interval_index._indexes), [other.pk])
+
+    def test_past_ranges_fall_back_to_the_database(self):
+        """Test that ranges before the index horizon are checked in the database."""
+        past = timezone.now() - timezone.timedelta(days=1)
+        self.assertIsNone(interval_index.has_overlap(self.facility.pk, past, self.start))
+        self.assertFalse(self.facility.is_available(past, self.start + timezone.timedelta(minutes=1)))
+
+
+class FacilityOccupancyTest(TestCase):
+    """Test the occupancy bitmaps."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        self.day = timezone.localdate() + timezone.timedelta(days=3)
+
+    def at(self, hour, minute=0, day=None):
+        """Return an aware datetime on the test day."""
+        return timezone.make_aware(
+            timezone.datetime.combine(day or self.day, timezone.datetime.min.time())
+        ) + timezone.timedelta(hours=hour, minutes=minute)
+
+    def create_booking(self, start, end, status='confirmed'):
+        """Create a booking of the test facility and run its commit hooks."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_booking(self.user, self.facility, start, end, status)
+
+    def bitmap(self, day=None):
+        """Return the stored bitmap of the test facility."""
+        return occupancy.get_bitmaps([self.facility.pk], day or self.day).get((self.facility.pk, day or self.day), 0)
+
+    def test_interval_masks(self):
+        """Test that partially covered slots are marked."""
+        masks = list(occupancy.interval_masks(self.at(10, 5), self.at(10, 30)))
+        self.assertEqual(masks, [(self.day, occupancy.slot_mask(40, 42))])
+        next_day = self.day + timezone.timedelta(days=1)
+        masks = list(occupancy.interval_masks(self.at(23), self.at(1, day=next_day)))
+        self.assertEqual([day for day, mask in masks], [self.day, next_day])
+
+    def test_confirm_and_cancel_keep_bitmaps_in_sync(self):
+        """Test that state changes update the stored bitmaps."""
+        booking = self.create_booking(self.at(9), self.at(10), status='pending')
+        self.assertEqual(self.bitmap(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.confirm()
+        self.assertEqual(self.bitmap(), occupancy.slot_mask(36, 40))
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.cancel()
+        self.assertFalse(FacilityOccupancy.objects.exists())
+
+    def test_moving_a_booking_clears_the_old_slots(self):
+        """Test that rescheduling a confirmed booking moves its bits."""
+        booking = self.create_booking(self.at(9), self.at(10))
+        self.create_booking(self.at(10), self.at(10, 10))
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.start_time, booking.end_time = self.at(12), self.at(13)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertEqual(self.bitmap(), occupancy.slot_mask(40, 41) | occupancy.slot_mask(48, 52))
+
+    def test_is_free_and_busy_at(self):
+        """Test availability answers from the bitmaps."""
+        self.create_booking(self.at(9), self.at(10, 10))
+        self.assertFalse(occupancy.is_free(self.facility.pk, self.at(8), self.at(12)))
+        self.assertTrue(occupancy.is_free(self.facility.pk, self.at(11), self.at(12)))
+        self.assertIsNone(occupancy.is_free(self.facility.pk, self.at(10, 10), self.at(10, 30)))
+        self.assertEqual(occupancy.busy_at([self.facility.pk], self.at(9, 30)), {self.facility.pk})
+        self.assertEqual(occupancy.busy_at([self.facility.pk], self.at(11)), set())
+
+    def test_cancel_keeps_shared_slots(self):
+        """Test that freeing a slot shared with another booking keeps it set."""
+        booking = self.create_booking(self.at(9), self.at(10, 5))
+        self.create_booking(self.at(10, 5), self.at(10, 30))
+        booking.cancel()
+        self.assertEqual(self.bitmap(), occupancy.slot_mask(40, 42))
+
+    @override_settings(BOOKING_OCCUPANCY_CHECKS=True)
+    def test_is_available_uses_bitmaps(self):
+        """Test that availability checks read the bitmaps first."""
+        self.create_booking(self.at(9), self.at(10, 10))
+        with self.assertNumQueries(1):
+            self.assertFalse(self.facility.is_available(self.at(8), self.at(12)))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.facility.is_available(self.at(11), self.at(12)))
+        # A partially shared slot falls back to the bookings table
+        with self.assertNumQueries(2):
+            self.assertTrue(self.facility.is_available(self.at(10, 10), self.at(10, 30)))
+
+    def test_month_heatmap(self):
+        """Test the monthly heatmap fractions."""
+        self.create_booking(self.at(0), self.at(6))
+        heatmap = dict(occupancy.month_heatmap(self.facility.pk, self.day.year, self.day.month))
+        self.assertEqual(heatmap[self.day], 0.25)
+        self.assertEqual(sum(heatmap.values()), 0.25)
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command regenerates bitmaps from bookings."""
+        self.create_booking(self.at(9), self.at(10))
+        FacilityOccupancy.objects.all().delete()
+        call_command('rebuild_occupancy', stdout=StringIO())
+        self.assertEqual(self.bitmap(), occupancy.slot_mask(36, 40))
+
+    def test_rebuild_without_bookings_keeps_other_days(self):
+        """Test that an open-ended rebuild with no bookings only clears the requested days."""
+        next_day = self.day + timezone.timedelta(days=1)
+        FacilityOccupancy.objects.bulk_create([
+            FacilityOccupancy(facility=self.facility, date=day, bitmap=b'\x01') for day in (self.day, next_day)
+        ])
+        call_command('rebuild_occupancy', '--from', next_day.isoformat(), stdout=StringIO())
+        self.assertEqual(list(FacilityOccupancy.objects.values_list('date', flat=True)), [self.day])
+
+
+class FacilityUtilizationTest(TestCase):
+    """Test the daily utilization rollups."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.facility = Facility.objects.create(name="Test Facility", location="Test Location", capacity=10)
+        self.day = timezone.localdate() + timezone.timedelta(days=3)
+
+    at = FacilityOccupancyTest.at
+    create_booking = FacilityOccupancyTest.create_booking
+
+    def rollup(self, day=None):
+        """Return the stored rollup of the test facility as a dict, or None."""
+        return FacilityUtilization.objects.filter(facility=self.facility, date=day or self.day).values(
+            'booked_minutes', 'confirmed_count', 'pending_count', 'cancelled_count', 'peak_concurrency',
+        ).first()
+
+    def test_state_changes_keep_rollups_in_sync(self):
+        """Test that creating, confirming and cancelling update the day's rollup."""
+        booking = self.create_booking(self.at(9), self.at(10, 30), status='pending')
+        self.create_booking(self.at(10), self.at(11), status='pending')
+        self.assertEqual(self.rollup(), {
+            'booked_minutes': 0, 'confirmed_count': 0, 'pending_count': 2,
+            'cancelled_count': 0, 'peak_concurrency': 2,
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.confirm()
+        self.assertEqual(self.rollup()['booked_minutes'], 90)
+        self.assertEqual(self.rollup()['confirmed_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.cancel()
+        self.assertEqual(self.rollup(), {
+            'booked_minutes': 0, 'confirmed_count': 0, 'pending_count': 1,
+            'cancelled_count': 1, 'peak_concurrency': 1,
+        })
+
+    def test_refresh_is_queued(self):
+        """Test that changes queue the refresh of the days they touch for the worker."""
+        with mock.patch('booking.apps.bookings.tasks.refresh_utilization.delay') as delay:
+            self.create_booking(self.at(9), self.at(10), status='pending')
+        delay.assert_called_once_with([[self.facility.pk, self.day.isoformat(), self.day.isoformat()]])
+        self.assertIsNone(self.rollup())
+
+    def test_bookings_across_midnight_are_split(self):
+        """Test that a booking spanning midnight counts on both days."""
+        next_day = self.day + timezone.timedelta(days=1)
+        self.create_booking(self.at(23), self.at(1, day=next_day))
+        self.assertEqual(self.rollup()['booked_minutes'], 60)
+        self.assertEqual(self.rollup(next_day)['booked_minutes'], 60)
+
+    def test_bulk_transitions_update_rollups(self):
+        """Test that set-based transitions refresh the rollups they bypass signals for."""
+        booking = self.create_booking(self.at(9), self.at(10), status='pending')
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_confirm([booking.pk], notify=False)
+        self.assertEqual(self.rollup()['confirmed_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_cancel([booking.pk], notify=False)
+        self.assertEqual(self.rollup()['cancelled_count'], 1)
+        self.assertEqual(self.rollup()['booked_minutes'], 0)
+
+    def test_report_by_month(self):
+        """Test that the monthly report sums the daily rollups."""
+        other_day = self.day.replace(day=1) if self.day.day > 1 else self.day.replace(day=2)
+        self.create_booking(self.at(9), self.at(10))
+        self.create_booking(self.at(9), self.at(11), status='pending')
+        self.create_booking(self.at(9, day=other_day), self.at(9, 30, day=other_day))
+        first_day = self.day.replace(day=1)
+        last_day = (first_day + timezone.timedelta(days=32)).replace(day=1) - timezone.timedelta(days=1)
+        rows = list(utilization.report(first_day, last_day, [self.facility.pk], period='month'))
+        self.assertEqual(rows, [{
+            'facility_id': self.facility.pk, 'period': first_day, 'minutes': 90,
+            'confirmed': 2, 'pending': 1, 'cancelled': 0, 'peak': 2,
+        }])
+
+    def test_rebuild_command(self):
+        """Test that the backfill rebuilds the rollups in chunks of days."""
+        self.create_booking(self.at(9), self.at(10))
+        self.create_booking(self.at(9, day=self.day + timezone.timedelta(days=5)),
+                            self.at(10, day=self.day + timezone.timedelta(days=5)), status='pending')
+        expected = list(FacilityUtilization.objects.values_list('date', 'booked_minutes', 'pending_count'))
+        FacilityUtilization.objects.all().delete()
+        call_command('rebuild_utilization', '--days', '2', stdout=StringIO())
+        self.assertEqual(list(FacilityUtilization.objects.values_list('date', 'booked_minutes', 'pending_count')),
+                         expected)
+        self.assertEqual(len(expected), 2)
+
+    def test_rebuild_without_bookings_keeps_other_days(self):
+        """Test that an open-ended backfill with no bookings only clears the requested days."""
+        next_day = self.day + timezone.timedelta(days=1)
+        FacilityUtilization.objects.bulk_create([
+            FacilityUtilization(facility=self.facility, date=day, booked_minutes=60) for day in (self.day, next_day)
+        ])
+        call_command('rebuild_utilization', '--from', next_day.isoformat(), stdout=StringIO())
+        self.assertEqual(list(FacilityUtilization.objects.values_list('date', flat=True)), [self.day])
+
+
+class BookingAnalyticsTest(TestCase):
+    """Test the vectorized utilization analytics and their view."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.staff_user = User.objects.create_user(username='staffuser', password='password', is_staff=True)
+        self.facility = Facility.objects.create(name="Main Hall", location="North", capacity=10)
+        self.other = Facility.objects.create(name="Side Room", location="South", capacity=10)
+        # A Monday, in the past so that pending requests have lapsed
+        self.day = timezone.datetime(2026, 3, 2).date()
+        self.url = reverse('bookings:booking_analytics')
+
+    def at(self, hour, minute=0, days=0):
+        """Return an aware datetime some days after the test Monday."""
+        return timezone.make_aware(
+            timezone.datetime.combine(self.day, timezone.datetime.min.time())
+        ) + timezone.timedelta(days=days, hours=hour, minutes=minute)
+
+    def report(self, **kwargs):
+        """Return the report of the test week."""
+        return UtilizationReport(self.day, self.day + timezone.timedelta(days=6), **kwargs)
+
+    def test_heatmap_splits_bookings_into_hours_of_the_week(self):
+        """Test that booked time lands in the right facility and hour-of-week cells."""
+        create_booking(self.user, self.facility, self.at(9, 30), self.at(11), status='confirmed')
+        create_booking(self.user, self.facility, self.at(14, days=2), self.at(15, days=2), status='pending')
+        create_booking(self.user, self.other, self.at(9), self.at(10), status='confirmed')
+        report = self.report()
+        self.assertEqual(report.facility_ids.tolist(), [self.facility.pk, self.other.pk])
+        self.assertEqual(report.booked[0, 9], 0.5)
+        self.assertEqual(report.booked[0, 10], 1)
+        self.assertEqual(report.booked[0].sum(), 1.5)
+        # Pending time is requested but not booked
+        self.assertEqual(report.requested[0, 2 * 24 + 14], 1)
+        self.assertEqual(report.booked[0, 2 * 24 + 14], 0)
+        self.assertEqual(report.booked[1, 9], 1)
+        self.assertEqual(report.week_hours.tolist(), [1] * 168)
+
+    def test_bookings_are_clipped_to_the_range(self):
+        """Test that only the part of a booking inside the range is counted."""
+        create_booking(self.user, self.facility, self.at(22, days=-1), self.at(2), status='confirmed')
+        report = self.report()
+        self.assertEqual(report.booked.sum(), 2)
+        # It started before the range, so it is left out of the ratios
+        self.assertEqual(report.counts['bookings'].tolist(), [0])
+
+    def test_ratios(self):
+        """Test the cancellation and no-show ratios."""
+        create_booking(self.user, self.facility, self.at(9), self.at(10), status='confirmed')
+        create_booking(self.user, self.facility, self.at(11), self.at(12), status='pending')
+        early = create_booking(self.user, self.facility, self.at(9, days=1), self.at(10, days=1), status='cancelled')
+        late = create_booking(self.user, self.facility, self.at(9, days=2), self.at(10, days=2), status='cancelled')
+        Booking.objects.filter(pk=early.pk).update(updated_at=self.at(9, days=-3))
+        Booking.objects.filter(pk=late.pk).update(updated_at=self.at(8, days=2))
+        [ratios] = self.report(now=self.at(0, days=7)).ratios()
+        self.assertEqual(ratios, {
+            'facility_id': self.facility.pk, 'bookings': 4, 'confirmed': 1, 'cancelled': 2,
+            'late_cancelled': 1, 'lapsed': 1, 'cancellation_ratio': 0.5, 'no_show_ratio': 0.5,
+        })
+        # A pending request has not lapsed before it ends
+        [ratios] = self.report(now=self.at(11, 30)).ratios()
+        self.assertEqual(ratios['lapsed'], 0)
+
+    def test_peak_windows_merge_consecutive_hours(self):
+        """Test that the busiest hours are reported as runs."""
+        create_booking(self.user, self.facility, self.at(9), self.at(12), status='confirmed')
+        create_booking(self.user, self.other, self.at(9), self.at(11), status='confirmed')
+        create_booking(self.user, self.facility, self.at(18, days=4), self.at(19, days=4), status='pending')
+        windows = self.report().peak_windows(limit=4)
+        self.assertEqual(windows, [
+            {'weekday': 'Monday', 'start_hour': 9, 'end_hour': 12, 'requested_hours': 5.0, 'booked_hours': 5.0},
+            {'weekday': 'Friday', 'start_hour': 18, 'end_hour': 19, 'requested_hours': 1.0, 'booked_hours': 0.0},
+        ])
+
+    def test_view_is_staff_only(self):
+        """Test that only staff can see the analytics."""
+        self.client.login(username='testuser', password='password')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'bookings/utilization_report.html')
+
+    def test_view_shows_monthly_rollups(self):
+        """Test that the page lists the monthly totals of the busiest facilities from the rollups."""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_booking(self.user, self.facility, self.at(9), self.at(10, 30), status='confirmed')
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url, {
+            'date_from': self.day.isoformat(), 'date_to': (self.day + timezone.timedelta(days=6)).isoformat(),
+        })
+        [row] = response.context['monthly']
+        self.assertEqual((row['facility_id'], row['minutes'], row['confirmed']), (self.facility.pk, 90, 1))
+        self.assertContains(response, 'March 2026')
+
+    def test_csv_export(self):
+        """Test that the CSV export streams the non-empty heatmap cells."""
+        create_booking(self.user, self.facility, self.at(9), self.at(10, 30), status='confirmed')
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url, {
+            'date_from': self.day.isoformat(), 'date_to': (self.day + timezone.timedelta(days=6)).isoformat(),
+            'format': 'csv',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            'facility_id,weekday,hour,requested_hours,booked_hours,occupancy',
+            f'{self.facility.pk},Monday,9,1.0,1.0,1.0',
+            f'{self.facility.pk},Monday,10,0.5,0.5,0.5',
+        ])
+
+    def test_json_export_and_errors(self):
+        """Test the JSON export and the validation of the range."""
+        create_booking(self.user, self.facility, self.at(9), self.at(10), status='confirmed')
+        create_booking(self.user, self.other, self.at(9), self.at(10), status='confirmed')
+        self.client.login(username='staffuser', password='password')
+        params = {
+            'date_from': self.day.isoformat(), 'date_to': self.day.isoformat(),
+            'facility': self.other.pk, 'format': 'json',
+        }
+        data = self.client.get(self.url, params).json()
+        self.assertEqual(data['facility_ids'], [self.other.pk])
+        self.assertEqual(data['requested_hours'][0][9], 1.0)
+        self.assertEqual(data['ratios'][0]['bookings'], 1)
+
+        params['date_to'] = (self.day - timezone.timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
+
+
+class BookingExportTest(TestCase):
+    """Test the streaming CSV and NDJSON exports."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password')
+        self.staff_user = User.objects.create_user(username='staffuser', password='password', is_staff=True)
+        self.facility = Facility.objects.create(name="Main Hall", location="North, Wing", capacity=10)
+        self.other = Facility.objects.create(name="Side Room", location="South", capacity=10)
+        start = (timezone.now() + timezone.timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.bookings = [
+            Booking.objects.create(
+                user=self.user, facility=facility, title=f"Booking {index}",
+                start_time=start + timezone.timedelta(hours=index),
+                end_time=start + timezone.timedelta(hours=index + 1), status=status,
+            )
+            for index, (facility, status) in enumerate([
+                (self.facility, 'confirmed'), (self.facility, 'pending'), (self.other, 'confirmed'),
+            ])
+        ]
+        self.url = reverse('bookings:booking_export')
+
+    def test_export_is_staff_only(self):
+        """Test that only staff can export."""
+        self.client.login(username='testuser', password='password')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_csv_export_with_filters(self):
+        """Test that the CSV export applies the list filters and joins the facility and user."""
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url, {'facility': self.facility.pk, 'status': 'confirmed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 1)
+        booking = self.bookings[0]
+        self.assertEqual(rows[0]['id'], str(booking.pk))
+        self.assertEqual(rows[0]['facility_location'], 'North, Wing')
+        self.assertEqual(rows[0]['user_email'], 'test@example.com')
+        self.assertEqual(rows[0]['start_time'], booking.start_time.isoformat())
+
+    def test_csv_cells_are_not_formulas(self):
+        """Test that text cells starting like a spreadsheet formula are quoted in CSV but not in NDJSON."""
+        Booking.objects.filter(pk=self.bookings[0].pk).update(title='=HYPERLINK("http://x")', description='-1+1')
+        self.client.login(username='staffuser', password='password')
+        filters = {'status': 'confirmed', 'facility': self.facility.pk}
+        response = self.client.get(self.url, filters)
+        row = next(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(row['title'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['description'], "'-1+1")
+        self.assertEqual(row['number_of_people'], '1')
+        response = self.client.get(self.url, {'format': 'ndjson', **filters})
+        row = json.loads(b''.join(response.streaming_content).decode())
+        self.assertEqual(row['title'], '=HYPERLINK("http://x")')
+
+    def test_gzipped_ndjson_export(self):
+        """Test that the NDJSON export can be gzipped on the fly."""
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url, {'format': 'ndjson', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [booking.pk for booking in self.bookings])
+        self.assertEqual(rows[2]['facility_name'], 'Side Room')
+
+    def test_invalid_parameters(self):
+        """Test that an unknown format or an invalid filter is a 400."""
+        self.client.login(username='staffuser', password='password')
+        self.assertEqual(self.client.get(self.url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': 'yesterday'}).status_code, 400)
+
+    def test_export_command(self):
+        """Test that the command writes the filtered bookings to a gzipped file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bookings.csv.gz')
+            call_command('export_bookings', path, '--gzip', '--status', 'confirmed', '--chunk-size', '1',
+                         stdout=StringIO())
+            with gzip.open(path, 'rt', newline='') as export_file:
+                rows = list(csv.DictReader(export_file))
+        self.assertEqual([int(row['id']) for row in rows], [self.bookings[0].pk, self.bookings[2].pk])
+        with self.assertRaises(CommandError):
+            call_command('export_bookings', '-', '--status', 'unknown', stdout=StringIO())
+
+
+class BookingFeedTest(TestCase):
+    """Test the iCalendar feed of a user's bookings."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.other_user = User.objects.create_user(username='otheruser', password='password')
+        self.facility = Facility.objects.create(name="Main Hall", location="North Wing", capacity=10)
+        start = (timezone.now() + timezone.timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.booking = Booking.objects.create(
+            user=self.user, facility=self.facility, title="Board meeting; Q3, budget",
+            description="Agenda:\nfigures", start_time=start, end_time=start + timezone.timedelta(hours=1),
+            status='confirmed',
+        )
+        self.cancelled = Booking.objects.create(
+            user=self.user, facility=self.facility, title="Dropped", start_time=start + timezone.timedelta(hours=3),
+            end_time=start + timezone.timedelta(hours=4), status='cancelled',
+        )
+        Booking.objects.create(
+            user=self.other_user, facility=self.facility, title="Someone else's", start_time=start,
+            end_time=start + timezone.timedelta(hours=1),
+        )
+        self.url = reverse('bookings:booking_feed', kwargs={'token': feed_token(self.user)})
+
+    def get_feed(self, **headers):
+        """Return the feed response and its unfolded content lines."""
+        response = self.client.get(self.url, **headers)
+        content = b''.join(response.streaming_content).decode() if response.status_code == 200 else ''
+        return response, content.replace('\r\n ', '').split('\r\n')
+
+    def test_feed_lists_the_users_bookings(self):
+        """Test that the feed holds the user's bookings, escaped, with their status."""
+        response, lines = self.get_feed()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertEqual(lines[0], 'BEGIN:VCALENDAR')
+        self.assertEqual(lines[-2:], ['END:VCALENDAR', ''])
+        self.assertEqual(lines.count('BEGIN:VEVENT'), 2)
+        self.assertIn(f'UID:booking-{self.booking.pk}@testserver', lines)
+        self.assertIn('SUMMARY:Board meeting\\; Q3\\, budget', lines)
+        self.assertIn('DESCRIPTION:Agenda:\\nfigures', lines)
+        self.assertIn('LOCATION:Main Hall\\, North Wing', lines)
+        self.assertIn(f'DTSTART:{self.booking.start_time.strftime("%Y%m%dT%H%M%SZ")}', lines)
+        self.assertEqual([line for line in lines if line.startswith('STATUS:')], ['STATUS:CONFIRMED', 'STATUS:CANCELLED'])
+        self.assertNotIn("SUMMARY:Someone else's", lines)
+
+    def test_invalid_and_revoked_tokens(self):
+        """Test that a forged token, or one issued before a password change, is a 404."""
+        forged = feed_token(self.other_user).replace(str(self.other_user.pk), str(self.user.pk), 1)
+        self.assertEqual(self.client.get(reverse('bookings:booking_feed', kwargs={'token': forged})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('bookings:booking_feed', kwargs={'token': 'garbage'})).status_code, 404)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_conditional_get(self):
+        """Test that an unchanged feed is a 304 and a changed booking refreshes it."""
+        response, _lines = self.get_feed()
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            response, _lines = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.booking.title = "Renamed"
+        self.booking.save()
+        response, lines = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:Renamed', lines)
+
+    def test_deleted_booking_refreshes_the_feed(self):
+        """Test that the feed has no Last-Modified, which a deleted booking would not advance."""
+        response, _lines = self.get_feed()
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.cancelled.delete()
+        response, lines = self.get_feed(HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lines.count('BEGIN:VEVENT'), 1)
+
+    def test_long_lines_are_folded(self):
+        """Test that content lines are folded at 75 octets without splitting characters."""
+        line = 'SUMMARY:' + 'é' * 60
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', ''), line)
+
+
+class BookingSeriesTest(TestCase):
+    """Test recurring booking series."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        self.start = (timezone.now() + timezone.timedelta(days=1)).replace(microsecond=0)
+
+    def make_series(self, **kwargs):
+        """Build an unsaved weekly series."""
+        values = {
+            'user': self.user,
+            'facility': self.facility,
+            'title': "Weekly Meeting",
+            'start_time': self.start,
+            'end_time': self.start + timezone.timedelta(hours=1),
+            'frequency': 'weekly',
+            'count': 52,
+        }
+        values.update(kwargs)
+        return BookingSeries(**values)
+
+    def test_occurrences(self):
+        """Test the expansion of daily and weekly series."""
+        occurrences = self.make_series(count=3).get_occurrences()
+        self.assertEqual(
+            [start - self.start for start, end in occurrences],
+            [timezone.timedelta(weeks=week) for week in range(3)]
+        )
+        until = timezone.localtime(self.start).date() + timezone.timedelta(days=4)
+        daily = self.make_series(frequency='daily', interval=2, count=None, until=until)
+        self.assertEqual(len(daily.get_occurrences()), 3)
+
+    def test_series_created_with_constant_queries(self):
+        """Test that a 52-week series costs a constant number of queries."""
+        series = self.make_series()
+        with self.assertNumQueries(5):
+            bookings, conflicts = create_series(series)
+        self.assertEqual(len(bookings), 52)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(series.bookings.filter(status='pending').count(), 52)
+
+    def test_conflicts_are_reported_together(self):
+        """Test that every conflicting occurrence is reported at once."""
+        for week in (3, 10):
+            start = self.start + timezone.timedelta(weeks=week, minutes=30)
+            Booking.objects.create(
+                user=self.user,
+                facility=self.facility,
+                title="Existing",
+                start_time=start,
+                end_time=start + timezone.timedelta(hours=1),
+                status='confirmed',
+            )
+        with self.assertRaises(SeriesConflictError) as cm:
+            create_series(self.make_series())
+        self.assertEqual(len(cm.exception.conflicts), 2)
+        self.assertFalse(BookingSeries.objects.exists())
+
+        bookings, conflicts = create_series(self.make_series(), skip_conflicts=True)
+        self.assertEqual(len(bookings), 50)
+        self.assertEqual(len(conflicts), 2)
+
+    def test_series_validation(self):
+        """Test that invalid series are rejected."""
+        with self.assertRaises(ValidationError):
+            self.make_series(count=None).full_clean()
+        with self.assertRaises(ValidationError):
+            self.make_series(frequency='daily', end_time=self.start + timezone.timedelta(days=2)).full_clean()
+        with self.assertRaises(ValidationError):
+            self.make_series(count=BookingSeries.MAX_OCCURRENCES + 1).full_clean()
+
+    def test_create_view(self):
+        """Test creating a series through the view."""
+        self.client.login(username='testuser', password='password')
+        data = {
+            'facility': self.facility.id,
+            'title': 'Weekly Meeting',
+            'start_time': self.start.strftime('%Y-%m-%dT%H:%M'),
+            'end_time': (self.start + timezone.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'frequency': 'weekly',
+            'interval': 1,
+            'count': 4,
+            'number_of_people': 2,
+        }
+        response = self.client.post(reverse('bookings:booking_series_create'), data)
+        self.assertRedirects(response, reverse('bookings:booking_list'))
+        self.assertEqual(Booking.objects.filter(series__isnull=False, user=self.user).count(), 4)
+        # One email for the series, listing every occurrence
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Weekly Meeting', mail.outbox[0].subject)
+        for booking in Booking.objects.filter(series__isnull=False):
+            self.assertIn(timezone.localtime(booking.start_time).strftime('%Y-%m-%d %H:%M'), mail.outbox[0].body)
+
+
+class BookingImportTest(TestCase):
+    """Test the streaming bulk import."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.staff = User.objects.create_user(
+            username='staffuser',
+            email='staff@example.com',
+            password='password',
+            is_staff=True
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        self.start = (timezone.now() + timezone.timedelta(days=1)).replace(microsecond=0)
+        start = self.start + timezone.timedelta(hours=10)
+        Booking.objects.create(
+            user=self.user,
+            facility=self.facility,
+            title="Existing",
+            start_time=start,
+            end_time=start + timezone.timedelta(hours=1),
+            status='confirmed',
+        )
+
+    def csv_lines(self, rows):
+        """Render ``(user, hour, hours, status, people)`` rows as CSV lines."""
+        lines = ['user,facility,title,start_time,end_time,status,number_of_people\n']
+        for user, hour, hours, status, people in rows:
+            start = self.start + timezone.timedelta(hours=hour)
+            end = start + timezone.timedelta(hours=hours)
+            lines.append(
+                f'{user},{self.facility.id},Imported,{start.isoformat()},{end.isoformat()},{status},{people}\n'
+            )
+        return lines
+
+    def test_import_validates_rows(self):
+        """Test that invalid rows are reported and the rest are inserted."""
+        lines = self.csv_lines([
+            ('testuser', 0, 1, 'confirmed', 2),       # line 2: valid
+            (self.user.id, 0, 2, 'confirmed', 2),     # line 3: overlaps line 2
+            ('testuser', 10, 1, 'confirmed', 2),      # line 4: overlaps the existing booking
+            ('testuser', 10, 1, 'pending', 2),        # line 5: pending may overlap
+            ('nobody', 3, 1, 'pending', 2),           # line 6: unknown user
+            ('testuser', 4, 1, 'pending', 20),        # line 7: over capacity
+            ('testuser', 6, -1, 'pending', 2),        # line 8: ends before it starts
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            importer = import_bookings(lines, chunk_size=3)
+        self.assertEqual(importer.created, 2)
+        self.assertEqual([error.line for error in sorted(importer.errors)], [3, 4, 6, 7, 8])
+        self.assertEqual(Booking.objects.filter(title='Imported').count(), 2)
+        self.assertEqual(
+            occupancy.is_free(self.facility.id, self.start, self.start + timezone.timedelta(hours=1)),
+            False
+        )
+
+    def test_overlaps_across_chunks(self):
+        """Test that rows overlapping rows of an earlier chunk are rejected."""
+        lines = self.csv_lines([('testuser', hour, 1, 'confirmed', 1) for hour in range(4)])
+        lines += self.csv_lines([('testuser', 2, 1, 'confirmed', 1)])[1:]
+        importer = import_bookings(lines, chunk_size=2)
+        self.assertEqual(importer.created, 4)
+        self.assertEqual([error.line for error in importer.errors], [6])
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test that a chunk costs a constant number of queries."""
+        # Few enough rows for one INSERT within SQLite's limit on parameters
+        lines = self.csv_lines([('testuser', 24 + hour, 1, 'confirmed', 1) for hour in range(80)])
+        # Facilities, users, existing bookings, and the insert and occupancy
+        # update (insert, lock, bookings, update) in a savepoint
+        with self.assertNumQueries(10):
+            importer = import_bookings(lines, chunk_size=500)
+        self.assertEqual(importer.created, 80)
+
+    def test_ndjson_command(self):
+        """Test the management command with NDJSON input and a dry run."""
+        start = self.start + timezone.timedelta(hours=20)
+        row = {
+            'user': 'testuser',
+            'facility': self.facility.id,
+            'title': 'Imported',
+            'start_time': start.isoformat(),
+            'end_time': (start + timezone.timedelta(hours=1)).isoformat(),
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write(json.dumps(row) + '\n\n' + json.dumps(dict(row, facility='x')) + '\n')
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('import_bookings', f.name, '--dry-run', stdout=out)
+        self.assertIn('Would import 1 bookings, rejected 1 rows.', out.getvalue())
+        self.assertFalse(Booking.objects.filter(title='Imported').exists())
+
+        call_command('import_bookings', f.name, stdout=StringIO())
+        self.assertTrue(Booking.objects.filter(title='Imported').exists())
+
+    def test_import_view(self):
+        """Test that only staff can import and that a report is returned."""
+        upload = SimpleUploadedFile(
+            'bookings.csv', ''.join(self.csv_lines([('testuser', 0, 1, 'pending', 1)])).encode()
+        )
+        self.client.login(username='testuser', password='password')
+        response = self.client.post(reverse('bookings:booking_import'), {'file': upload})
+        self.assertEqual(response.status_code, 403)
+
+        upload.seek(0)
+        self.client.login(username='staffuser', password='password')
+        response = self.client.post(reverse('bookings:booking_import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+
+
+class BookingBulkTransitionTest(TestCase):
+    """Test bulk confirmation and cancellation."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.staff_user = User.objects.create_user(
+            username='staffuser',
+            email='staff@example.com',
+            password='password',
+            is_staff=True,
+            is_superuser=True,
+        )
+        self.facility = Facility.objects.create(name="Main Hall", location="North", capacity=10)
+        self.other = Facility.objects.create(name="Side Room", location="South", capacity=10)
+        self.start = (timezone.now() + timezone.timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.confirmed = self.create_booking(self.facility, 0, 2, status='confirmed')
+        # Overlaps the confirmed booking
+        self.blocked = self.create_booking(self.facility, 1, 2)
+        # Two selections overlapping each other, the earlier one wins
+        self.first = self.create_booking(self.facility, 4, 2)
+        self.second = self.create_booking(self.facility, 5, 2)
+        self.elsewhere = self.create_booking(self.other, 0, 2)
+        self.selection = [self.confirmed, self.blocked, self.first, self.second, self.elsewhere]
+
+    def create_booking(self, facility, hour, hours, status='pending'):
+        """Create a booking starting some hours after the test start."""
+        start = self.start + timezone.timedelta(hours=hour)
+        return create_booking(self.user, facility, start, start + timezone.timedelta(hours=hours), status)
+
+    def statuses(self):
+        """Return the status of every selected booking, in selection order."""
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        return [statuses[booking.pk] for booking in self.selection]
+
+    def test_bulk_confirm_keeps_winners_only(self):
+        """Test that overlapping selections are left pending and reported."""
+        with mock.patch('booking.apps.bookings.tasks.send_booking_notifications.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = bulk_confirm([booking.pk for booking in self.selection])
+        self.assertEqual(sorted(result.changed), sorted([self.first.pk, self.elsewhere.pk]))
+        self.assertEqual(result.skipped, [self.confirmed.pk])
+        self.assertEqual(set(result.conflicts), {self.blocked.pk, self.second.pk})
+        self.assertEqual(self.statuses(), ['confirmed', 'pending', 'confirmed', 'pending', 'confirmed'])
+        # One batched dispatch for all the confirmations
+        delay.assert_called_once_with('confirmation', result.changed)
+        self.assertFalse(occupancy.is_free(self.other.pk, self.start, self.start + timezone.timedelta(hours=1)))
+
+    def test_bulk_confirm_query_count_does_not_grow(self):
+        """Test that the number of queries does not depend on the selection size."""
+        for hour in range(10, 20):
+            self.selection.append(self.create_booking(self.other, hour, 1))
+        ids = [booking.pk for booking in self.selection]
+        # Lock, window query, update and occupancy update (insert, lock,
+        # bookings, update), inside a savepoint
+        with self.assertNumQueries(9):
+            bulk_confirm(ids, notify=False)
+
+    def test_conflict_check_reads_overlapping_bookings_only(self):
+        """Test that the confirmed bookings between distant candidates are not read."""
+        for hour in range(10, 20):
+            self.create_booking(self.facility, hour, 1, status='confirmed')
+        late = self.create_booking(self.facility, 19, 2)
+        with CaptureQueriesContext(connection) as captured:
+            winners, conflicts = find_conflicts({
+                booking.pk: (booking.facility_id, booking.start_time, booking.end_time)
+                for booking in [self.first, late]
+            })
+        self.assertEqual(winners, [self.first.pk])
+        self.assertEqual(set(conflicts), {late.pk})
+        with connection.cursor() as cursor:
+            cursor.execute(captured[0]['sql'])
+            # The two candidates and the confirmed booking overlapping the late one
+            self.assertEqual(len(cursor.fetchall()), 3)
+
+    def test_bulk_cancel(self):
+        """Test that bulk cancellation frees the confirmed time."""
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_confirm([self.elsewhere.pk], notify=False)
+        with mock.patch('booking.apps.bookings.tasks.send_booking_notifications.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = bulk_cancel([self.elsewhere.pk, self.blocked.pk, 0])
+        self.assertEqual(sorted(result.changed), sorted([self.elsewhere.pk, self.blocked.pk]))
+        self.assertEqual(result.skipped, [0])
+        delay.assert_called_once()
+        self.assertTrue(occupancy.is_free(self.other.pk, self.start, self.start + timezone.timedelta(hours=1)))
+
+    def test_batched_notifications(self):
+        """Test that the batched task sends every email over one connection."""
+        with mock.patch('booking.apps.bookings.tasks.get_connection') as get_connection:
+            get_connection.return_value.send_messages.return_value = 2
+            sent = send_booking_notifications('confirmation', [self.first.pk, self.elsewhere.pk])
+        self.assertEqual(sent, 2)
+        messages, = get_connection.return_value.send_messages.call_args.args
+        self.assertEqual([message.to for message in messages], [['test@example.com']] * 2)
+
+    def test_admin_action(self):
+        """Test that the admin action reports the bookings left pending."""
+        self.client.login(username='staffuser', password='password')
+        response = self.client.post(reverse('admin:bookings_booking_changelist'), {
+            'action': 'confirm_bookings',
+            '_selected_action': [booking.pk for booking in self.selection],
+        }, follow=True)
+        self.assertContains(response, '2 booking(s) were successfully confirmed.')
+        self.assertContains(response, '2 booking(s) overlap another booking and were left pending.')
+
+    def test_bulk_status_endpoint(self):
+        """Test the staff endpoint for bulk transitions."""
+        url = reverse('bookings:booking_bulk_status')
+        self.client.login(username='testuser', password='password')
+        self.assertEqual(self.client.post(url, {'action': 'cancel', 'ids': [self.first.pk]}).status_code, 403)
+        self.client.login(username='staffuser', password='password')
+        self.assertEqual(self.client.post(url, {'action': 'delete', 'ids': [self.first.pk]}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'action': 'cancel', 'ids': ['x']}).status_code, 400)
+        response = self.client.post(url, {'action': 'confirm', 'ids': [self.first.pk, self.second.pk]})
+        data = response.json()
+        self.assertEqual(data['changed'], [self.first.pk])
+        self.assertEqual([conflict['id'] for conflict in data['conflicts']], [self.second.pk])
+
+
 class BookingFormTest(TestCase):
     """Test the Booking form."""
 
@@ -137,6 +1278,153 @@ class BookingFormTest(TestCase):
         self.assertFalse(form.is_valid())
 
 
+class BookingDateFilterTest(TestCase):
+    """Test that date filters are half-open ranges on the indexed column."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        self.day = timezone.localdate() + timezone.timedelta(days=10)
+        # 23:30 in Paris is already the next day in UTC and 00:30 is still the previous one
+        with timezone.override('Europe/Paris'):
+            for title, hour, minute in (('Late', 23, 30), ('Early', 0, 30)):
+                day = self.day if title == 'Late' else self.day + timezone.timedelta(days=1)
+                start = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+                start += timezone.timedelta(hours=hour, minutes=minute)
+                Booking.objects.create(
+                    user=self.user,
+                    facility=self.facility,
+                    title=title,
+                    start_time=start,
+                    end_time=start + timezone.timedelta(minutes=20),
+                    status='confirmed',
+                )
+
+    def get_form_queryset(self):
+        """Return the bookings the filter form selects for the test day."""
+        form = BookingFilterForm(data={'date_from': self.day, 'date_to': self.day})
+        self.assertTrue(form.is_valid())
+        return form.filter_queryset(Booking.objects.all())
+
+    def assertComparesStartTime(self, queryset):
+        """Assert that the SQL bounds the start_time column itself, not a function of it."""
+        sql, _params = queryset.query.sql_with_params()
+        self.assertRegex(sql, r'"start_time" >= %s')
+        self.assertRegex(sql, r'"start_time" < %s')
+        # Such as django_datetime_cast_date() on SQLite or ::date on PostgreSQL
+        self.assertNotRegex(sql, r'\w+\("\w+"\."start_time"')
+        self.assertNotIn('::date', sql)
+
+    def assertUsesStartTimeIndex(self, queryset):
+        """Assert that the plan bounds start_time through an index."""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertRegex(plan, r'Index Cond: .*start_time >=.*start_time <')
+        self.assertNotIn('::date', plan)
+
+    def test_form_filters_by_local_day(self):
+        """Test that the filter form selects whole days in the current timezone."""
+        with timezone.override('Europe/Paris'):
+            queryset = self.get_form_queryset()
+            self.assertEqual([booking.title for booking in queryset], ['Late'])
+            self.assertComparesStartTime(queryset)
+
+    def test_reminders_select_local_day(self):
+        """Test that reminder lookups select one local day."""
+        with timezone.override('Europe/Paris'):
+            queryset = get_reminder_bookings(self.day + timezone.timedelta(days=1))
+            self.assertEqual([booking.title for booking in queryset], ['Early'])
+            self.assertComparesStartTime(queryset)
+
+    def test_date_cast_is_detected(self):
+        """Test that the SQL check rejects a filter casting the column to a date."""
+        with self.assertRaises(AssertionError):
+            self.assertComparesStartTime(Booking.objects.filter(start_time__date=self.day))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Index usage is checked on PostgreSQL plans')
+    def test_filters_use_index(self):
+        """Test that the form and reminder filters are served by the start_time index."""
+        with timezone.override('Europe/Paris'):
+            for name, queryset in (
+                ('form', self.get_form_queryset()),
+                ('reminders', get_reminder_bookings(self.day + timezone.timedelta(days=1))),
+            ):
+                with self.subTest(name):
+                    self.assertUsesStartTimeIndex(queryset)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The plans and costs are those of PostgreSQL')
+class QueryPlanRegressionTest(TestCase):
+    """Test that the hot queries keep their indexes and cost budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed enough rows for the planner to prefer indexes, then analyze."""
+        users = User.objects.bulk_create([
+            User(username=f'user{number}', email=f'user{number}@example.com')
+            for number in range(50)
+        ])
+        facilities = Facility.objects.bulk_create([
+            Facility(name=f'Facility {number:03}', location='Campus', capacity=20)
+            for number in range(200)
+        ])
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) - timezone.timedelta(days=30)
+        Booking.objects.bulk_create([
+            Booking(
+                user=users[(slot + position) % len(users)],
+                facility=facility,
+                title='Seeded',
+                start_time=start + timezone.timedelta(hours=2 * slot),
+                end_time=start + timezone.timedelta(hours=2 * slot + 1),
+                status=('confirmed', 'pending', 'cancelled')[slot % 3],
+            )
+            for position, facility in enumerate(facilities)
+            for slot in range(100)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries(self):
+        """Test every hot query against its expected indexes and budget."""
+        for check in get_hot_query_checks(get_sample_booking()):
+            with self.subTest(check.name):
+                result = run_check(check)
+                self.assertTrue(result.ok, result.problems)
+
+    def test_command(self):
+        """Test the diagnosis command."""
+        out = StringIO()
+        call_command('explain_hot_queries', '--only', 'user_booking_list', '--json', stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual([result['name'] for result in results], ['user_booking_list'])
+        self.assertTrue(results[0]['ok'])
+
+
+class ExplainHotQueriesCommandTest(TestCase):
+    """Test the databases the plan command accepts."""
+
+    def test_unknown_database(self):
+        """Test that an unknown alias is a command error."""
+        with self.assertRaisesMessage(CommandError, 'not configured'):
+            call_command('explain_hot_queries', '--database', 'missing', stdout=StringIO())
+
+    @skipIf(connection.vendor == 'postgresql', 'PostgreSQL is the database the plans are checked on')
+    def test_other_vendors_are_refused(self):
+        """Test that databases other than PostgreSQL are refused before any EXPLAIN."""
+        with self.assertRaisesMessage(CommandError, connection.vendor):
+            call_command('explain_hot_queries', stdout=StringIO())
+
+
 class BookingListViewTest(TestCase):
     """Test the booking list view."""
 
@@ -210,6 +1498,246 @@ class BookingListViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'bookings/booking_list.html')
 
+    def test_query_budget(self):
+        """Test that the list stays within its query budget."""
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url)
+        stats = response.wsgi_request.query_stats
+        self.assertLessEqual(stats.count, get_budget(BookingListView))
+        self.assertEqual(stats.duplicates, 0)
+
+
+class BookingSearchTest(TestCase):
+    """Test the indexed booking search used by the admin."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='password')
+        self.bob = User.objects.create_user(username='bob', email='bob@corp.example', password='password')
+        self.gym = Facility.objects.create(name="Gymnasium", location="East", capacity=40)
+        self.lab = Facility.objects.create(name="Chemistry Lab", location="West", capacity=12)
+        start = timezone.now() + timezone.timedelta(days=1)
+        self.workshop = Booking.objects.create(
+            user=self.alice, facility=self.lab, title="Polymer workshop",
+            start_time=start, end_time=start + timezone.timedelta(hours=1),
+        )
+        self.match = Booking.objects.create(
+            user=self.bob, facility=self.gym, title="Basketball match",
+            description="Regional finals",
+            start_time=start, end_time=start + timezone.timedelta(hours=1),
+        )
+
+    def test_search_by_text(self):
+        """Test that titles and descriptions are matched by word prefix."""
+        self.assertEqual(list(Booking.objects.search('polym')), [self.workshop])
+        self.assertEqual(list(Booking.objects.search('final')), [self.match])
+
+    def test_search_by_user_and_facility(self):
+        """Test that usernames, emails and facility names are matched by substring."""
+        self.assertEqual(list(Booking.objects.search('ALI')), [self.workshop])
+        self.assertEqual(list(Booking.objects.search('corp.example')), [self.match])
+        self.assertEqual(list(Booking.objects.search('nasium')), [self.match])
+
+    def test_search_with_many_related_matches(self):
+        """Test that broad terms fall back to a subquery with the same results."""
+        with mock.patch.object(BookingQuerySet, 'SEARCH_INLINE_IDS', 0):
+            results = list(Booking.objects.search('example').order_by('pk'))
+        self.assertEqual(results, [self.workshop, self.match])
+
+    def test_admin_search(self):
+        """Test that the admin changelist searches through the index."""
+        User.objects.create_user(username='admin', password='password', is_staff=True, is_superuser=True)
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('admin:bookings_booking_changelist'), {'q': 'chemistry'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [self.workshop])
+
+    def test_admin_search_ranks_text_matches_first(self):
+        """Test that the changelist lists text matches before related matches, unless a column is sorted."""
+        start = self.workshop.start_time - timezone.timedelta(days=1)
+        briefing = Booking.objects.create(
+            user=self.bob, facility=self.gym, title="Lab safety briefing",
+            start_time=start, end_time=start + timezone.timedelta(hours=1),
+        )
+        User.objects.create_user(username='admin', password='password', is_staff=True, is_superuser=True)
+        self.client.login(username='admin', password='password')
+        url = reverse('admin:bookings_booking_changelist')
+        response = self.client.get(url, {'q': 'lab'})
+        self.assertEqual(list(response.context['cl'].result_list), [briefing, self.workshop])
+        response = self.client.get(url, {'q': 'lab', 'o': '-4'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.workshop, briefing])
+
+
+class BookingAdminChangelistTest(TestCase):
+    """Test that the booking changelist scales with the table."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username='admin', password='password', is_staff=True, is_superuser=True
+        )
+        self.facilities = [
+            Facility.objects.create(name=f"Facility {number}", location="Here", capacity=10)
+            for number in range(3)
+        ]
+        self.start = timezone.make_aware(timezone.datetime(2025, 3, 10, 9, 0))
+        self.url = reverse('admin:bookings_booking_changelist')
+        self.client.login(username='admin', password='password')
+
+    def create_bookings(self, count, start=None):
+        """Create bookings spread over the facilities, a day apart."""
+        start = start or self.start
+        Booking.objects.bulk_create([
+            Booking(
+                user=self.admin,
+                facility=self.facilities[number % 3],
+                title=f"Booking {number}",
+                start_time=start + timezone.timedelta(days=number),
+                end_time=start + timezone.timedelta(days=number, hours=1),
+            )
+            for number in range(count)
+        ])
+
+    def get_query_count(self, params=None):
+        """Return the number of queries a changelist request runs."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Test that the changelist runs the same queries for few and many rows."""
+        self.create_bookings(3)
+        # The first request also caches the month filter's index
+        self.get_query_count()
+        few = self.get_query_count()
+        self.create_bookings(40, start=self.start + timezone.timedelta(days=5))
+        self.assertEqual(self.get_query_count(), few)
+
+    def test_facility_filter_loads_only_selected_facility(self):
+        """Test that the facility filter does not list every facility."""
+        self.create_bookings(6)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, "Facility 2</option>")
+        self.assertContains(response, 'admin/js/autocomplete.js')
+        response = self.client.get(self.url, {'facility__id__exact': self.facilities[2].pk})
+        self.assertContains(response, "Facility 2</option>")
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_month_filter(self):
+        """Test filtering by year and by the months holding bookings, with no other date filter."""
+        self.create_bookings(40)
+        self.create_bookings(1, start=self.start + timezone.timedelta(days=90))
+        response = self.client.get(self.url)
+        self.assertContains(response, '?start_month=2025')
+        self.assertNotContains(response, '?start_month=2025-03')
+        self.assertNotContains(response, 'start_time__gte')
+        response = self.client.get(self.url, {'start_month': '2025'})
+        self.assertContains(response, '?start_month=2025-04')
+        self.assertNotContains(response, '?start_month=2025-05')
+        self.assertContains(response, '?start_month=2025-06')
+        self.assertNotContains(response, '?start_month=2025-07')
+        response = self.client.get(self.url, {'start_month': '2025-04'})
+        self.assertEqual(response.context['cl'].result_count, 18)
+        response = self.client.get(self.url, {'start_month': '2025-13'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_count_is_capped(self):
+        """Test that the changelist stops counting at the paginator's cap."""
+        self.create_bookings(5)
+        with mock.patch.object(CappedCountPaginator, 'count_cap', 2):
+            response = self.client.get(self.url)
+        paginator = response.context['cl'].paginator
+        self.assertFalse(paginator.count_is_exact)
+        self.assertGreaterEqual(paginator.count, 2)
+
+    def test_str_does_not_load_facility(self):
+        """Test that str() names an unloaded facility by id without a query."""
+        self.create_bookings(1)
+        booking = Booking.objects.get()
+        with self.assertNumQueries(0):
+            self.assertIn(f"#{booking.facility_id}", str(booking))
+        booking = Booking.objects.select_related('facility').get()
+        self.assertIn("Facility 0", str(booking))
+
+
+class BookingKeysetPaginationTest(TestCase):
+    """Test cursor pagination of the booking list."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.staff_user = User.objects.create_user(
+            username='staffuser',
+            email='staff@example.com',
+            password='password',
+            is_staff=True
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+        )
+        start = timezone.now() + timezone.timedelta(days=1)
+        # Pairs of bookings share a start time, so the id breaks ties
+        Booking.objects.bulk_create([
+            Booking(
+                user=self.staff_user,
+                facility=self.facility,
+                title=f"Booking {number}",
+                start_time=start + timezone.timedelta(hours=number // 2),
+                end_time=start + timezone.timedelta(hours=number // 2 + 1),
+            )
+            for number in range(25)
+        ])
+        self.expected = list(Booking.objects.order_by('-start_time', '-id').values_list('pk', flat=True))
+
+    def test_paginator_walks_forwards_and_backwards(self):
+        """Test that next and previous cursors visit every row exactly once."""
+        paginator = KeysetPaginator(Booking.objects.all(), 10, ('-start_time', '-id'))
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([booking.pk for page in pages for booking in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        previous = paginator.page(pages[2].previous_cursor)
+        self.assertEqual([booking.pk for booking in previous], self.expected[10:20])
+        previous = paginator.page(previous.previous_cursor)
+        self.assertEqual([booking.pk for booking in previous], self.expected[:10])
+        self.assertFalse(previous.has_previous())
+
+    def test_count_modes(self):
+        """Test exact, capped and estimated counts."""
+        queryset = Booking.objects.all()
+        self.assertEqual(KeysetPaginator(queryset, 10, ('-id',), count_mode='exact').count, 25)
+        capped = KeysetPaginator(queryset, 10, ('-id',), count_mode='capped', count_cap=20)
+        self.assertEqual((capped.count, capped.count_is_exact), (20, False))
+        estimate = KeysetPaginator(queryset, 10, ('-id',), count_mode='estimate').count
+        if connection.vendor == 'postgresql':
+            self.assertIsInstance(estimate, int)
+        else:
+            # Only PostgreSQL exposes a row estimate
+            self.assertIsNone(estimate)
+
+    def test_list_view_uses_cursors(self):
+        """Test that the list view renders and follows cursor links."""
+        self.client.login(username='staffuser', password='password')
+        url = reverse('bookings:booking_list')
+        response = self.client.get(url, {'status': 'pending'})
+        page = response.context['page_obj']
+        self.assertEqual([booking.pk for booking in page], self.expected[:10])
+        self.assertContains(response, f'status=pending&cursor={page.next_cursor}')
+        response = self.client.get(url, {'status': 'pending', 'cursor': page.next_cursor})
+        self.assertEqual([booking.pk for booking in response.context['page_obj']], self.expected[10:20])
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is a 404."""
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(reverse('bookings:booking_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
 
 class BookingDetailViewTest(TestCase):
     """Test the booking detail view."""
@@ -290,6 +1818,89 @@ class BookingDetailViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'bookings/booking_detail.html')
 
+    def test_query_budget(self):
+        """Test that the booking is loaded once, with its facility and user."""
+        self.client.login(username='testuser', password='password')
+        response = self.client.get(self.url)
+        stats = response.wsgi_request.query_stats
+        self.assertLessEqual(stats.count, get_budget(BookingDetailView))
+        self.assertEqual(stats.duplicates, 0)
+
+
+class BookingConditionalGetTest(TestCase):
+    """Test ETag and Last-Modified on the booking pages."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.facility = Facility.objects.create(name="Test Facility", location="Test Location", capacity=10)
+        start = timezone.now() + timezone.timedelta(days=1)
+        self.booking = Booking.objects.create(
+            user=self.user, facility=self.facility, title="Polled Booking",
+            start_time=start, end_time=start + timezone.timedelta(hours=1),
+        )
+        self.client.login(username='testuser', password='password')
+
+    def assertRevalidates(self, url):
+        """Fetch a page, then check that its ETag gets a 304 and return the ETag."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return etag
+
+    def test_detail_not_modified_until_status_changes(self):
+        """Test that a polled booking gets a 304 until its status changes."""
+        url = reverse('bookings:booking_detail', args=[self.booking.pk])
+        etag = self.assertRevalidates(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        # The user and the booking; the session comes from the cache
+        self.assertLessEqual(response.wsgi_request.query_stats.count, 2)
+
+        bulk_confirm([self.booking.pk], notify=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Confirmed")
+
+    def test_detail_if_modified_since(self):
+        """Test that Last-Modified alone validates the page."""
+        url = reverse('bookings:booking_detail', args=[self.booking.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_not_modified_until_a_row_changes(self):
+        """Test that the list revalidates within its budget, and changes with its rows."""
+        url = reverse('bookings:booking_list')
+        etag = self.assertRevalidates(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertLess(response.wsgi_request.query_stats.count, get_budget(BookingListView))
+
+        self.booking.title = "Renamed Booking"
+        self.booking.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Renamed Booking")
+
+    def test_list_changes_when_a_row_is_deleted(self):
+        """Test that deleting a booking changes the ETag."""
+        url = reverse('bookings:booking_list')
+        etag = self.assertRevalidates(url)
+        self.booking.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_between_users(self):
+        """Test that a page validated for one user is not reused for another."""
+        url = reverse('bookings:booking_list')
+        etag = self.client.get(url)['ETag']
+        User.objects.create_user(username='otheruser', password='password')
+        self.client.login(username='otheruser', password='password')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
 
 class BookingCreateViewTest(TestCase):
     """Test the booking create view."""
@@ -346,3 +1957,164 @@ class BookingCreateViewTest(TestCase):
         self.assertRedirects(response, reverse('bookings:booking_list'))
         # Check if booking was created
         self.assertTrue(Booking.objects.filter(title='New Booking').exists())
+
+
+class BookingLiveEventsTest(TestCase):
+    """Test the live updates published when bookings change."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password')
+        self.facility = Facility.objects.create(name="Main Hall", location="North", capacity=10)
+        self.start = (timezone.now() + timezone.timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.end = self.start + timezone.timedelta(hours=2)
+        self.booking = Booking.objects.create(
+            user=self.user, facility=self.facility, title="Booking", start_time=self.start, end_time=self.end,
+        )
+
+    def listen(self, *channels):
+        """Subscribe to channels on an event loop of the test; return a function reading what arrived."""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def subscribe():
+            return pubsub.get_broker().subscribe(channels)
+
+        subscription = loop.run_until_complete(subscribe())
+        self.addCleanup(subscription.close)
+
+        def received():
+            loop.run_until_complete(asyncio.sleep(0))
+            messages = []
+            while not subscription.queue.empty():
+                messages.append(subscription.queue.get_nowait())
+            return messages
+        return received
+
+    def availability(self, available):
+        """Return the message of the booking's time being freed or taken."""
+        return {'event': 'availability', 'data': {
+            'facility': self.facility.pk, 'start_time': self.start, 'end_time': self.end, 'available': available,
+        }}
+
+    def status(self, status):
+        """Return the message of the booking's status."""
+        return {'event': 'booking', 'data': {
+            'id': self.booking.pk, 'status': status, 'facility': self.facility.pk,
+            'start_time': self.start, 'end_time': self.end,
+        }}
+
+    def test_confirm_and_cancel_are_published(self):
+        """Test that the facility and the owner hear of status changes once they are committed."""
+        received = self.listen(live.facility_channel(self.facility.pk), live.user_channel(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.confirm()
+            self.assertEqual(received(), [])
+        self.assertEqual(received(), [self.availability(False), self.status('confirmed')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.cancel()
+        self.assertEqual(received(), [self.availability(True), self.status('cancelled')])
+
+        # Other changes do not concern live clients
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.title = "Renamed"
+            self.booking.save()
+        self.assertEqual(received(), [])
+
+    def test_bulk_transitions_are_published(self):
+        """Test that bulk confirmations and cancellations are published like single ones."""
+        received = self.listen(live.facility_channel(self.facility.pk), live.user_channel(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_confirm([self.booking.pk], notify=False)
+        self.assertEqual(received(), [self.availability(False), self.status('confirmed')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_cancel([self.booking.pk], notify=False)
+        self.assertEqual(received(), [self.availability(True), self.status('cancelled')])
+
+    def test_imports_and_series_are_published(self):
+        """Test that bookings written in bulk are published like single ones."""
+        received = self.listen(live.facility_channel(self.facility.pk), live.user_channel(self.user.pk))
+        self.booking.delete()
+        received()
+        with self.captureOnCommitCallbacks(execute=True):
+            import_bookings([
+                'user,facility,title,start_time,end_time,status\n',
+                f'testuser,{self.facility.pk},Imported,{self.start.isoformat()},{self.end.isoformat()},confirmed\n',
+            ])
+        self.booking = Booking.objects.get(title="Imported")
+        self.assertEqual(received(), [self.availability(False), self.status('confirmed')])
+
+        later = self.start + timezone.timedelta(days=1)
+        series = BookingSeries(
+            user=self.user, facility=self.facility, title="Daily", start_time=later,
+            end_time=later + timezone.timedelta(hours=1), frequency='daily', count=2,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            bookings, conflicts = create_series(series)
+        self.assertCountEqual(
+            [(message['event'], message['data']['id'], message['data']['status']) for message in received()],
+            [('booking', booking.pk, 'pending') for booking in bookings],
+        )
+
+
+class BookingEventStreamTest(TransactionTestCase):
+    """
+    Test the live event stream served by the ASGI application.
+
+    The stream looks users up outside of any request and releases the
+    database connection afterwards, which the transaction of a TestCase
+    would not survive.
+    """
+
+    def setUp(self):
+        """Set up test data."""
+        from booking.asgi import application
+
+        self.application = application
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password')
+        self.facility = Facility.objects.create(name="Main Hall", location="North", capacity=10)
+        start = timezone.now() + timezone.timedelta(days=2)
+        self.booking = Booking.objects.create(
+            user=self.user, facility=self.facility, title="Booking",
+            start_time=start, end_time=start + timezone.timedelta(hours=2),
+        )
+
+    async def request(self, query_string=b'', cookie=None):
+        """Start a request to the event stream and return its communicator and response status."""
+        headers = [(b'cookie', cookie.encode())] if cookie else []
+        communicator = ApplicationCommunicator(self.application, {
+            'type': 'http', 'method': 'GET', 'path': live.EVENTS_PATH,
+            'query_string': query_string, 'headers': headers,
+        })
+        await communicator.send_input({'type': 'http.request'})
+        return communicator, (await communicator.receive_output(5))['status']
+
+    async def test_signed_in_user_follows_own_bookings(self):
+        """Test that a signed-in user receives the status changes of their bookings."""
+        await sync_to_async(self.client.force_login)(self.user)
+        communicator, status = await self.request(cookie=f'sessionid={self.client.cookies["sessionid"].value}')
+        self.assertEqual(status, 200)
+        await communicator.receive_output(5)  # The reconnection delay
+
+        await sync_to_async(self.booking.confirm)()
+        body = (await communicator.receive_output(5))['body'].decode()
+        self.assertTrue(body.startswith('event: booking\n'))
+        self.assertEqual(json.loads(body.split('data: ')[1])['status'], 'confirmed')
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def test_channels_are_checked(self):
+        """Test that anonymous visitors may only follow facilities, and only a few of them."""
+        self.assertEqual((await self.request())[1], 403)
+        self.assertEqual((await self.request(b'facility=main'))[1], 400)
+        too_many = '&'.join(['facility=1'] * (live.MAX_FACILITIES + 1)).encode()
+        self.assertEqual((await self.request(too_many))[1], 400)
+
+        communicator, status = await self.request(f'facility={self.facility.pk}'.encode())
+        self.assertEqual(status, 200)
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
@@ -0,0 +1,253 @@
+"""
+Set-based status transitions for many bookings at once.
+
+Confirming bookings one ``save()`` at a time costs a query per row, and a
+plain ``update()`` skips the overlap check. Here the selected bookings are
+checked in one window-function query: ordered by start within each
+facility, every candidate sees the latest end of the confirmed bookings
+before it and the earliest start of those after it, which tells whether it
+overlaps one. Candidates that pass are swept in start order, so of two
+overlapping selections the earlier one wins. The winners are then written
+with a single ``update()``.
+
+``update()`` sends no ``post_save``, so the interval indexes, occupancy
+bitmaps and utilization rollups are refreshed and the live updates
+published explicitly, and the notification emails are queued as batches
+once the transaction commits.
+"""
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from celery import group
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Max, Min, Q, QuerySet, RowRange, When, Window
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from booking.apps.bookings import interval_index, live, occupancy, utilization
+from booking.apps.bookings.models import OVERLAP_ERROR, Booking, is_overlap_violation
+from booking.apps.facilities import cache as facility_cache
+
+NOTIFICATION_BATCH_SIZE = 500
+
+
+class TransitionResult:
+    """
+    The outcome of a bulk transition.
+
+    Attributes:
+        changed: IDs of the bookings whose status changed.
+        skipped: IDs of the selected bookings the transition does not apply
+            to, such as missing ones or ones already in the target status.
+        conflicts: ``{id: reason}`` for the bookings left unchanged because
+            they overlap another booking.
+    """
+
+    def __init__(self):
+        self.changed = []
+        self.skipped = []
+        self.conflicts = {}
+
+    def as_dict(self):
+        """Return the result as a JSON-serialisable dict."""
+        return {
+            'changed': self.changed,
+            'skipped': self.skipped,
+            'conflicts': [{'id': pk, 'reason': reason} for pk, reason in sorted(self.conflicts.items())],
+        }
+
+
+def get_ids(bookings):
+    """Return the primary keys of a queryset or an iterable of IDs."""
+    if isinstance(bookings, QuerySet):
+        return list(bookings.values_list('pk', flat=True))
+    return list(dict.fromkeys(int(pk) for pk in bookings))
+
+
+def find_conflicts(candidates):
+    """
+    Split candidate bookings into the ones that may be confirmed and the rest.
+
+    Args:
+        candidates: ``{id: (facility_id, start_time, end_time)}`` of pending
+            bookings.
+
+    Returns:
+        A ``(winners, conflicts)`` tuple: the IDs to confirm, and
+        ``{id: reason}`` for the others.
+    """
+    if not candidates:
+        return [], {}
+    # Only the confirmed bookings overlapping a candidate can conflict, so
+    # the query selects the ones overlapping the candidates' merged ranges
+    by_facility = defaultdict(list)
+    for facility_id, start_time, end_time in sorted(candidates.values()):
+        ranges = by_facility[facility_id]
+        if ranges and start_time <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end_time)
+        else:
+            ranges.append([start_time, end_time])
+    overlapping = reduce(operator.or_, (
+        Q(facility_id=facility_id, start_time__lt=end_time, end_time__gt=start_time)
+        for facility_id, ranges in by_facility.items()
+        for start_time, end_time in ranges
+    ))
+    # A candidate is pending itself, so the condition leaves it out of its
+    # own frames. It is a CASE rather than a FILTER clause, which SQLite
+    # ignores in frames that end after the current row.
+    confirmed = Q(status='confirmed')
+    window = {
+        'partition_by': [F('facility_id')],
+        'order_by': [F('start_time').asc(), F('id').asc()],
+    }
+    rows = Booking.objects.filter(
+        Q(overlapping, confirmed) | Q(pk__in=list(candidates)),
+    ).annotate(
+        confirmed_end_before=Window(Max(Case(When(confirmed, then='end_time'))), frame=RowRange(None, 0), **window),
+        confirmed_start_after=Window(Min(Case(When(confirmed, then='start_time'))), frame=RowRange(0, None), **window),
+    ).order_by('facility_id', 'start_time', 'id').values_list(
+        'pk', 'facility_id', 'start_time', 'end_time', 'confirmed_end_before', 'confirmed_start_after',
+    )
+
+    winners, conflicts = [], {}
+    busy_until = {}
+    for pk, facility_id, start_time, end_time, end_before, start_after in rows:
+        if pk not in candidates:
+            continue
+        if (end_before and end_before > start_time) or (start_after and start_after < end_time):
+            conflicts[pk] = str(OVERLAP_ERROR)
+            continue
+        holder = busy_until.get(facility_id)
+        if holder and holder[0] > start_time:
+            conflicts[pk] = _('Overlaps booking %(id)s, which is confirmed instead.') % {'id': holder[1]}
+            continue
+        busy_until[facility_id] = (end_time, pk)
+        winners.append(pk)
+    return winners, conflicts
+
+
+def bulk_confirm(bookings, notify=True):
+    """
+    Confirm many pending bookings in one transaction.
+
+    Bookings overlapping a confirmed booking, or an earlier selected one,
+    are left pending and reported.
+
+    Args:
+        bookings: A queryset or an iterable of booking IDs.
+        notify: Queue the confirmation emails.
+
+    Returns:
+        A TransitionResult.
+    """
+    ids = get_ids(bookings)
+    # The exclusion constraint stays the final authority: if a concurrent
+    # writer confirmed an overlapping booking meanwhile, check again.
+    for attempt in range(3):
+        try:
+            with transaction.atomic():
+                return _confirm(ids, notify)
+        except IntegrityError as e:
+            if not is_overlap_violation(e) or attempt == 2:
+                raise
+
+
+def _confirm(ids, notify):
+    """Confirm the winners among ``ids`` inside the current transaction."""
+    result = TransitionResult()
+    candidates = {
+        pk: (facility_id, start_time, end_time)
+        for pk, facility_id, start_time, end_time in Booking.objects.select_for_update().filter(
+            pk__in=ids, status='pending',
+        ).values_list('pk', 'facility_id', 'start_time', 'end_time')
+    }
+    result.skipped = [pk for pk in ids if pk not in candidates]
+    winners, result.conflicts = find_conflicts(candidates)
+    if winners:
+        Booking.objects.filter(pk__in=winners).update(status='confirmed', updated_at=timezone.now())
+        intervals = [candidates[pk] for pk in winners]
+        after_change(intervals, intervals, winners, 'confirmation' if notify else None)
+    result.changed = winners
+    return result
+
+
+def bulk_cancel(bookings, notify=True):
+    """
+    Cancel many bookings in one transaction.
+
+    Args:
+        bookings: A queryset or an iterable of booking IDs.
+        notify: Queue the cancellation emails.
+
+    Returns:
+        A TransitionResult.
+    """
+    ids = get_ids(bookings)
+    result = TransitionResult()
+    with transaction.atomic():
+        rows = list(
+            Booking.objects.select_for_update().filter(pk__in=ids).exclude(status='cancelled').values_list(
+                'pk', 'status', 'facility_id', 'start_time', 'end_time',
+            )
+        )
+        changed = [row[0] for row in rows]
+        result.skipped = sorted(set(ids) - set(changed))
+        if changed:
+            Booking.objects.filter(pk__in=changed).update(status='cancelled', updated_at=timezone.now())
+            intervals = [row[2:] for row in rows if row[1] == 'confirmed']
+            after_change(intervals, [row[2:] for row in rows], changed, 'cancellation' if notify else None)
+    result.changed = changed
+    return result
+
+
+def after_change(intervals, booked, booking_ids, notification=None):
+    """
+    Do the work of the Booking signal handlers for a bulk status change.
+
+    The occupancy bitmaps of the confirmed ``intervals`` that appeared or
+    disappeared are updated right away, within the transaction. Once it
+    commits, the interval indexes and cached data of the affected
+    facilities are invalidated, the rollups of every changed booking's
+    ``booked`` interval are queued for recomputation, the changes are
+    published to live clients, and the notification emails are queued in
+    batches.
+    """
+    from booking.apps.bookings.tasks import send_booking_notifications
+
+    if booked:
+        utilization.refresh_later(booked)
+    if intervals:
+        facility_ids = {interval[0] for interval in intervals}
+        occupancy.update_intervals(intervals)
+        transaction.on_commit(lambda: interval_index.invalidate(*facility_ids))
+        transaction.on_commit(lambda: facility_cache.invalidate_facilities(*facility_ids))
+    if booking_ids:
+        transaction.on_commit(lambda: live.publish_bulk_change(booking_ids, intervals))
+    if notification:
+        def notify():
+            for start in range(0, len(booking_ids), NOTIFICATION_BATCH_SIZE):
+                send_booking_notifications.delay(notification, booking_ids[start:start + NOTIFICATION_BATCH_SIZE])
+        transaction.on_commit(notify)
+
+
+def queue_notifications(notifications):
+    """
+    Queue the notification emails of several kinds as one grouped dispatch.
+
+    The batches of every kind are sent to the broker together, as a Celery
+    group, once the transaction commits.
+
+    Args:
+        notifications: ``{kind: booking_ids}``, with kinds of
+            ``tasks.BOOKING_NOTIFICATIONS``.
+    """
+    from booking.apps.bookings.tasks import send_booking_notifications
+
+    signatures = [
+        send_booking_notifications.si(kind, booking_ids[start:start + NOTIFICATION_BATCH_SIZE])
+        for kind, booking_ids in notifications.items()
+        for start in range(0, len(booking_ids), NOTIFICATION_BATCH_SIZE)
+    ]
+    if signatures:
+        transaction.on_commit(lambda: group(signatures).apply_async())
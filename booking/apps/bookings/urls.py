@@ -11,6 +11,12 @@ urlpatterns = [
     path('', views.BookingListView.as_view(), name='booking_list'),
     path('<int:pk>/', views.BookingDetailView.as_view(), name='booking_detail'),
     path('create/', views.BookingCreateView.as_view(), name='booking_create'),
+    path('export/', views.BookingExportView.as_view(), name='booking_export'),
+    path('import/', views.BookingImportView.as_view(), name='booking_import'),
+    path('bulk-status/', views.BookingBulkStatusView.as_view(), name='booking_bulk_status'),
+    path('feed/<str:token>.ics', views.BookingFeedView.as_view(), name='booking_feed'),
+    path('analytics/', views.UtilizationAnalyticsView.as_view(), name='booking_analytics'),
+    path('series/create/', views.BookingSeriesCreateView.as_view(), name='booking_series_create'),
     path('<int:pk>/update/', views.BookingUpdateView.as_view(), name='booking_update'),
     path('<int:pk>/cancel/', views.BookingCancelView.as_view(), name='booking_cancel'),
     path('<int:pk>/confirm/', views.BookingConfirmView.as_view(), name='booking_confirm'),
@@ -0,0 +1,183 @@
+"""
+Daily utilization rollups per facility.
+
+Booked time, booking counts and peak concurrency per facility and local day
+are kept in FacilityUtilization, so reports over months of history read a
+row per facility-day instead of scanning the bookings table.
+
+When a booking's status, facility or time changes, the Celery worker
+recomputes the rows of the days it touches from the bookings table once the
+change is committed, off the request path. Refreshes of a facility run one
+after the other, so the last one sees every committed change.
+``rebuild_utilization`` backfills the rows in chunks, and staff read them
+on the analytics page and in the admin.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncMonth
+
+from booking.apps.bookings import occupancy
+from booking.apps.core.timewindow import day_window
+
+COUNT_FIELDS = {
+    'confirmed': 'confirmed_count',
+    'pending': 'pending_count',
+    'cancelled': 'cancelled_count',
+}
+
+
+def interval_days(start_time, end_time):
+    """Yield ``(date, start, end)`` for the part of an interval falling on each local day."""
+    tz = occupancy.get_timezone()
+    day = occupancy.slot_of(start_time)[0]
+    while True:
+        day_start, day_end = day_window(day, tz=tz)
+        if day_start >= end_time:
+            return
+        yield day, max(start_time, day_start), min(end_time, day_end)
+        day += datetime.timedelta(days=1)
+
+
+def peak(spans):
+    """Return the largest number of half-open ``(start, end)`` spans overlapping at one instant."""
+    # An end sorts before a start at the same instant, as the spans are half-open
+    events = sorted([(start, 1) for start, end in spans] + [(end, -1) for start, end in spans])
+    current = highest = 0
+    for _instant, change in events:
+        current += change
+        highest = max(highest, current)
+    return highest
+
+
+def build_rollups(rows):
+    """
+    Fold ``(facility_id, status, start_time, end_time)`` rows into rollups.
+
+    Returns ``{(facility_id, date): {field: value}}``.
+    """
+    seconds = defaultdict(float)
+    counts = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS.values(), 0))
+    spans = defaultdict(list)
+    for facility_id, status, start_time, end_time in rows:
+        for day, start, end in interval_days(start_time, end_time):
+            key = (facility_id, day)
+            counts[key][COUNT_FIELDS[status]] += 1
+            if status == 'confirmed':
+                seconds[key] += (end - start).total_seconds()
+            if status != 'cancelled':
+                spans[key].append((start, end))
+    return {
+        key: {
+            **values,
+            'booked_minutes': round(seconds[key] / 60),
+            'peak_concurrency': peak(spans[key]),
+        }
+        for key, values in counts.items()
+    }
+
+
+def store_rollups(facility_ids, first_day, last_day, rollups):
+    """
+    Replace the stored rollups of the given facilities and day range.
+
+    Returns the number of facility-days stored.
+    """
+    from booking.apps.bookings.models import FacilityUtilization
+
+    rows = [
+        FacilityUtilization(facility_id=facility_id, date=day, **values)
+        for (facility_id, day), values in rollups.items()
+        if first_day <= day <= last_day
+    ]
+    with transaction.atomic():
+        FacilityUtilization.objects.filter(
+            facility_id__in=facility_ids,
+            date__gte=first_day,
+            date__lte=last_day,
+        ).delete()
+        FacilityUtilization.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def booking_rows(facility_ids, first_day, last_day):
+    """Return the ``(facility_id, status, start_time, end_time)`` rows overlapping a range of days."""
+    from booking.apps.bookings.models import Booking
+
+    start, end = occupancy.day_bounds(first_day, last_day)
+    return Booking.objects.filter(
+        facility_id__in=facility_ids,
+        start_time__lt=end,
+        end_time__gt=start,
+    ).values_list('facility_id', 'status', 'start_time', 'end_time')
+
+
+def refresh(facility_ids, first_day, last_day):
+    """
+    Recompute the rollups of some facilities over a range of days from the bookings table.
+
+    The facility rows are locked meanwhile, so that concurrent refreshes of
+    a facility run one after the other. ``FOR NO KEY UPDATE`` still lets
+    bookings of the facilities be written.
+    """
+    from booking.apps.facilities.models import Facility
+
+    facility_ids = sorted(set(facility_ids))
+    with transaction.atomic():
+        list(Facility.objects.select_for_update(no_key=True).filter(pk__in=facility_ids).order_by('pk').values_list('pk'))
+        rows = booking_rows(facility_ids, first_day, last_day)
+        return store_rollups(facility_ids, first_day, last_day, build_rollups(rows))
+
+
+def refresh_later(intervals, using=None):
+    """
+    Have the worker recompute the rollups touched by some intervals once the transaction commits.
+
+    Args:
+        intervals: ``(facility_id, start_time, end_time)`` tuples.
+        using: The database alias of the transaction.
+    """
+    from booking.apps.bookings.tasks import refresh_utilization
+
+    spans = [
+        [facility_id, first_day.isoformat(), last_day.isoformat()]
+        for facility_id, (first_day, last_day) in occupancy.day_spans(intervals).items()
+    ]
+    if spans:
+        transaction.on_commit(lambda: refresh_utilization.delay(spans), using=using)
+
+
+def report(first_day, last_day, facility_ids=None, period='day'):
+    """
+    Return the utilization of facilities over a range of days.
+
+    Args:
+        first_day: First day of the report.
+        last_day: Last day of the report (inclusive).
+        facility_ids: Facilities to report on; all when None.
+        period: ``'day'`` for a row per facility-day, ``'month'`` for a row
+            per facility-month.
+
+    Returns:
+        A queryset of dicts with ``facility_id``, ``period`` (the day, or
+        the first day of the month), the summed ``minutes``, ``confirmed``,
+        ``pending`` and ``cancelled``, and the highest ``peak``.
+    """
+    from booking.apps.bookings.models import FacilityUtilization
+
+    if period not in ('day', 'month'):
+        raise ValueError(f'Unknown period {period!r}.')
+    queryset = FacilityUtilization.objects.filter(date__gte=first_day, date__lte=last_day)
+    if facility_ids is not None:
+        queryset = queryset.filter(facility_id__in=facility_ids)
+    return queryset.values(
+        'facility_id', period=TruncMonth('date') if period == 'month' else F('date'),
+    ).annotate(
+        minutes=Sum('booked_minutes'),
+        confirmed=Sum('confirmed_count'),
+        pending=Sum('pending_count'),
+        cancelled=Sum('cancelled_count'),
+        peak=Max('peak_concurrency'),
+    ).order_by('facility_id', 'period')
@@ -1,29 +1,55 @@
 """
 Views for the bookings app.
 """
+import datetime
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect
-from django.urls import reverse_lazy
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.views import View
 from django.views.generic import (
     ListView, DetailView, CreateView, UpdateView, DeleteView
 )
 
-from booking.apps.bookings.forms import BookingForm, BookingFilterForm
-from booking.apps.bookings.models import Booking
-from booking.apps.bookings.tasks import send_booking_confirmation, send_booking_cancellation
+from booking.apps.bookings.analytics import WEEKDAYS, UtilizationReport
+from booking.apps.bookings import export, utilization
+from booking.apps.bookings.forms import (
+    BookingForm, BookingFilterForm, BookingSeriesForm, UtilizationReportForm
+)
+from booking.apps.bookings.ical import (
+    CalendarFeedMixin, feed_token, get_feed_user, user_feed_events, user_feed_queryset
+)
+from booking.apps.bookings.importer import FORMATS, ImportFormatError, guess_format, import_bookings
+from booking.apps.bookings.models import Booking, BookingSeries
+from booking.apps.bookings.recurrence import create_series
+from booking.apps.bookings.tasks import (
+    send_booking_confirmation, send_booking_cancellation, send_series_confirmation,
+)
+from booking.apps.bookings.transitions import bulk_cancel, bulk_confirm
+from booking.apps.core.cache import get_version
+from booking.apps.core.conditional import ConditionalGetMixin
+from booking.apps.core.instrumentation import query_budget
+from booking.apps.core.pagination import KeysetPaginationMixin
+from booking.apps.core.streaming import csv_response, streaming_response
+from booking.apps.facilities.cache import FACILITY_LIST
 from booking.apps.facilities.models import Facility
 
 
-class BookingListView(LoginRequiredMixin, ListView):
+@query_budget(5)
+class BookingListView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
     """View for listing bookings."""
     model = Booking
     context_object_name = 'bookings'
     template_name = 'bookings/booking_list.html'
     paginate_by = 10
+    keyset_ordering = ('-start_time', '-id')
+    cache_control = {'private': True, 'no_cache': True}
     
     def get_queryset(self):
         """Get filtered queryset for user's bookings."""
@@ -40,25 +66,95 @@ class BookingListView(LoginRequiredMixin, ListView):
             
         return queryset.select_related('facility', 'user')
     
+    def get_validators(self):
+        """
+        Validate with the rows of the requested page and the result count.
+        
+        The page and the count are loaded once and shared with the response,
+        so validating costs no query beyond the page itself; the facility
+        list version covers renamed facilities.
+        """
+        queryset = self.get_queryset()
+        paginator = self.get_keyset_paginator(queryset, self.get_paginate_by(queryset))
+        page = self.get_keyset_page(paginator)
+        last_modified = max((booking.updated_at for booking in page), default=None)
+        return last_modified, (
+            [(booking.pk, booking.updated_at) for booking in page], paginator.count,
+            get_version(FACILITY_LIST), self.request.GET.urlencode(), feed_token(self.request.user),
+        )
+    
     def get_context_data(self, **kwargs):
         """Add extra context data."""
         context = super().get_context_data(**kwargs)
         context['form'] = self.form
         context['is_staff'] = self.request.user.is_staff
+        context['feed_url'] = self.request.build_absolute_uri(
+            reverse('bookings:booking_feed', kwargs={'token': feed_token(self.request.user)})
+        )
         return context
 
 
-class BookingDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class BookingFeedView(ConditionalGetMixin, CalendarFeedMixin, View):
+    """iCalendar feed of a user's bookings, reached through a signed token."""
+    filename = 'bookings.ics'
+    cache_control = {'private': True, 'no_cache': True}
+    
+    def dispatch(self, request, *args, **kwargs):
+        """Resolve the feed's user from the token."""
+        self.feed_user = get_feed_user(kwargs['token'])
+        if self.feed_user is None:
+            raise Http404(_('No calendar feed found matching the query'))
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_validators(self):
+        """
+        Validate with the latest change and the number of bookings in the feed.
+        
+        There is no Last-Modified: deleting a booking does not advance it, so
+        only the ETag, which counts the bookings, can tell the feed changed.
+        """
+        state = user_feed_queryset(self.feed_user).aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        return None, (self.feed_user.pk, state['last_modified'], state['count'], get_version(FACILITY_LIST))
+    
+    def get_calendar_name(self):
+        """Name the calendar after the user."""
+        return _('Bookings of %(user)s') % {'user': self.feed_user.get_full_name() or self.feed_user.get_username()}
+    
+    def get_events(self):
+        """Return the user's bookings as events."""
+        return user_feed_events(self.feed_user, self.request.get_host())
+
+
+@query_budget(3)
+class BookingDetailView(LoginRequiredMixin, UserPassesTestMixin, ConditionalGetMixin, DetailView):
     """View for showing booking details."""
     model = Booking
     context_object_name = 'booking'
     template_name = 'bookings/booking_detail.html'
+    cache_control = {'private': True, 'no_cache': True}
+    
+    def get_queryset(self):
+        """Load the facility and user with the booking."""
+        return super().get_queryset().select_related('facility', 'user')
+    
+    def get_object(self, queryset=None):
+        """Return the booking, loading it once for the permission check and the page."""
+        if queryset is None and hasattr(self, '_object'):
+            return self._object
+        self._object = super().get_object(queryset)
+        return self._object
     
     def test_func(self):
         """Test if user can view this booking."""
         booking = self.get_object()
         # Staff can view all bookings, users can only view their own
-        return self.request.user.is_staff or booking.user == self.request.user
+        return self.request.user.is_staff or booking.user_id == self.request.user.pk
+    
+    def get_validators(self):
+        """Validate with the booking and its facility, loaded already by the permission check."""
+        booking = self.get_object()
+        last_modified = max(booking.updated_at, booking.facility.updated_at)
+        return last_modified, (booking.pk, booking.status, booking.facility.updated_at)
 
 
 class BookingCreateView(LoginRequiredMixin, CreateView):
@@ -100,7 +196,12 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
         """Handle valid form."""
         # Set the user
         form.instance.user = self.request.user
-        response = super().form_valid(form)
+        try:
+            response = super().form_valid(form)
+        except ValidationError as e:
+            # Conflicts detected by the database at write time
+            form.add_error(None, e)
+            return self.form_invalid(form)
         
         # Send confirmation email as a background task
         send_booking_confirmation.delay(self.object.pk)
@@ -109,6 +210,54 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
         return response
 
 
+class BookingSeriesCreateView(LoginRequiredMixin, CreateView):
+    """View for creating a recurring booking series."""
+    model = BookingSeries
+    form_class = BookingSeriesForm
+    template_name = 'bookings/booking_series_form.html'
+    success_url = reverse_lazy('bookings:booking_list')
+    
+    def get_form_kwargs(self):
+        """Add user to form kwargs."""
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        
+        # Pre-select facility if provided in GET parameters
+        facility_id = self.request.GET.get('facility')
+        if facility_id and not kwargs.get('data'):
+            kwargs['initial'] = kwargs.get('initial', {})
+            kwargs['initial']['facility'] = facility_id
+            
+        return kwargs
+    
+    def form_valid(self, form):
+        """Handle valid form."""
+        try:
+            bookings, conflicts = create_series(
+                form.instance, skip_conflicts=form.cleaned_data.get('skip_conflicts')
+            )
+        except ValidationError as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
+        self.object = form.instance
+        
+        # A single acknowledgement listing every occurrence, rather than one per occurrence
+        if bookings:
+            send_series_confirmation.delay(self.object.pk)
+        
+        messages.success(
+            self.request,
+            _('%(count)d booking(s) created.') % {'count': len(bookings)}
+        )
+        if conflicts:
+            messages.warning(
+                self.request,
+                _('%(count)d occurrence(s) were skipped because the facility is not available.')
+                % {'count': len(conflicts)}
+            )
+        return redirect(self.get_success_url())
+
+
 class BookingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     """View for updating a booking."""
     model = Booking
@@ -127,6 +276,15 @@ class BookingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         context['title'] = _('Update Booking')
         return context
     
+    def form_valid(self, form):
+        """Handle valid form."""
+        try:
+            return super().form_valid(form)
+        except ValidationError as e:
+            # Conflicts detected by the database at write time
+            form.add_error(None, e)
+            return self.form_invalid(form)
+    
     def get_form_kwargs(self):
         """Add user to form kwargs."""
         kwargs = super().get_form_kwargs()
@@ -178,7 +336,13 @@ class BookingConfirmView(LoginRequiredMixin, UserPassesTestMixin, View):
     def post(self, request, *args, **kwargs):
         """Handle POST request."""
         booking = get_object_or_404(Booking, pk=kwargs.get('pk'))
-        booking.confirm()
+        try:
+            booking.confirm()
+        except ValidationError as e:
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({'status': 'error', 'message': ' '.join(e.messages)}, status=409)
+            messages.error(request, ' '.join(e.messages))
+            return redirect('bookings:booking_detail', pk=booking.pk)
         
         # Send confirmation email as a background task
         send_booking_confirmation.delay(booking.pk)
@@ -194,6 +358,167 @@ class BookingConfirmView(LoginRequiredMixin, UserPassesTestMixin, View):
         return redirect('bookings:booking_detail', pk=booking.pk)
 
 
+class BookingBulkStatusView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """View for confirming or cancelling many bookings at once (staff only)."""
+    actions = {'confirm': bulk_confirm, 'cancel': bulk_cancel}
+    max_ids = 1000
+    
+    def test_func(self):
+        """Test if user can change booking statuses."""
+        return self.request.user.is_staff
+    
+    def post(self, request, *args, **kwargs):
+        """Apply the transition to the posted ``ids`` and return the result."""
+        action = self.actions.get(request.POST.get('action'))
+        if action is None:
+            return JsonResponse({'status': 'error', 'message': _('Unknown action.')}, status=400)
+        try:
+            ids = [int(pk) for pk in request.POST.getlist('ids')]
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': _('Invalid booking id.')}, status=400)
+        if not ids or len(ids) > self.max_ids:
+            return JsonResponse({
+                'status': 'error',
+                'message': _('Select between 1 and %(max)d bookings.') % {'max': self.max_ids},
+            }, status=400)
+        
+        result = action(ids)
+        return JsonResponse({'status': 'success', **result.as_dict()})
+
+
+class BookingExportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    View for streaming bookings as CSV or NDJSON (staff only).
+    
+    Takes the filters of the booking list, ``format`` and ``gzip=1``.
+    """
+    
+    def test_func(self):
+        """Test if user can export bookings."""
+        return self.request.user.is_staff
+    
+    def get(self, request, *args, **kwargs):
+        """Stream the filtered bookings."""
+        fmt = request.GET.get('format') or 'csv'
+        if fmt not in export.FORMATS:
+            return JsonResponse({'status': 'error', 'message': _('Unknown format.')}, status=400)
+        form = BookingFilterForm(request.GET)
+        if not form.is_valid():
+            errors = [error for messages_ in form.errors.values() for error in messages_]
+            return JsonResponse({'status': 'error', 'message': ' '.join(errors)}, status=400)
+        
+        queryset = form.filter_queryset(Booking.objects.all())
+        return streaming_response(
+            export.export_chunks(queryset, fmt),
+            export.CONTENT_TYPES[fmt],
+            f'bookings-{timezone.localdate()}.{fmt}',
+            compress=request.GET.get('gzip') == '1',
+        )
+
+
+class BookingImportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """View for bulk importing bookings from an uploaded CSV or NDJSON file (staff only)."""
+    
+    def test_func(self):
+        """Test if user can import bookings."""
+        return self.request.user.is_staff
+    
+    def post(self, request, *args, **kwargs):
+        """Stream the uploaded file through the importer and return the report."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse({'status': 'error', 'message': _('Please upload a file.')}, status=400)
+        fmt = request.POST.get('format') or guess_format(upload.name)
+        if fmt not in FORMATS:
+            return JsonResponse({'status': 'error', 'message': _('Unknown format.')}, status=400)
+        
+        try:
+            importer = import_bookings(upload, fmt)
+        except ImportFormatError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', **importer.as_dict()})
+
+
+class UtilizationAnalyticsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    View for utilization heatmaps, peak windows and cancellation ratios (staff only).
+    
+    ``?format=csv`` streams the facility by hour-of-week heatmap and
+    ``?format=json`` returns the whole report. The page also shows the
+    monthly totals of the busiest facilities from the daily rollups.
+    """
+    template_name = 'bookings/utilization_report.html'
+    default_days = 28
+    top_facilities = 20
+    csv_header = ('facility_id', 'weekday', 'hour', 'requested_hours', 'booked_hours', 'occupancy')
+    
+    def test_func(self):
+        """Test if user can see the analytics."""
+        return self.request.user.is_staff
+    
+    def get(self, request, *args, **kwargs):
+        """Build the report of the requested range in the requested format."""
+        data = request.GET.copy()
+        today = timezone.localdate()
+        data.setdefault('date_to', today.isoformat())
+        data.setdefault('date_from', (today - datetime.timedelta(days=self.default_days - 1)).isoformat())
+        form = UtilizationReportForm(data)
+        fmt = data.get('format') or 'html'
+        
+        if not form.is_valid():
+            if fmt == 'html':
+                return render(request, self.template_name, {'form': form}, status=400)
+            errors = [error for messages_ in form.errors.values() for error in messages_]
+            return JsonResponse({'status': 'error', 'message': ' '.join(errors)}, status=400)
+        
+        first_day, last_day = form.cleaned_data['date_from'], form.cleaned_data['date_to']
+        facility = form.cleaned_data['facility']
+        report = UtilizationReport(first_day, last_day, facility_ids=[facility] if facility else None)
+        
+        if fmt == 'csv':
+            return csv_response(
+                report.heatmap_rows(), f'utilization-{first_day}-{last_day}.csv', header=self.csv_header,
+            )
+        if fmt == 'json':
+            return JsonResponse(report.as_dict())
+        
+        export_query = data.copy()
+        for name in ('format', 'submit'):
+            export_query.pop(name, None)
+        ratios = report.ratios()[:self.top_facilities]
+        return render(request, self.template_name, {
+            'form': form,
+            'report': report,
+            'heatmap': self.get_heatmap(report),
+            'hours': range(24),
+            'peak_windows': report.peak_windows(),
+            'ratios': ratios,
+            'monthly': utilization.report(
+                first_day, last_day, [row['facility_id'] for row in ratios], period='month',
+            ),
+            'export_query': export_query.urlencode(),
+        })
+    
+    def get_heatmap(self, report):
+        """Return the weekday rows of the all-facility heatmap, with a 0-1 shade per hour."""
+        requested, booked = report.total_heatmap()
+        busiest = max(requested.max(), 1)
+        return [
+            {
+                'weekday': weekday,
+                'cells': [
+                    {
+                        'requested': requested[day, hour],
+                        'booked': booked[day, hour],
+                        'shade': requested[day, hour] / busiest,
+                    }
+                    for hour in range(24)
+                ],
+            }
+            for day, weekday in enumerate(WEEKDAYS)
+        ]
+
+
 class BookingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     """View for deleting a booking (staff only)."""
     model = Booking
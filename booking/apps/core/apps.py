@@ -10,3 +10,8 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking.apps.core'
     verbose_name = 'Core'
+    
+    def ready(self):
+        """Record the queries of Celery tasks."""
+        from booking.apps.core.instrumentation import connect_celery_signals
+        connect_celery_signals()
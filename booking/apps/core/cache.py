@@ -0,0 +1,73 @@
+"""
+Versioned cache keys.
+
+Cached values are stored under keys embedding a version number that is
+itself kept in the cache, per namespace and optionally per object.
+Invalidating bumps the version: entries written under an older version are
+never read again and simply expire, so nothing has to find and delete them.
+Versions are seeded with a clock value rather than zero, so a version that
+was evicted never comes back to a number older entries were written under.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{namespace}:{id}'
+
+
+def _version_key(namespace, id=None):
+    return VERSION_KEY.format(namespace=namespace, id='' if id is None else id)
+
+
+def get_version(namespace, id=None):
+    """Return the current version of a namespace, or of one object in it."""
+    return get_versions(namespace, [id])[id]
+
+
+def get_versions(namespace, ids):
+    """Return ``{id: version}`` for several objects with one cache round trip."""
+    keys = {_version_key(namespace, id): id for id in ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, id in keys.items():
+        if id not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[id] = cache.get(key)
+    return versions
+
+
+def bump_version(namespace, *ids):
+    """
+    Invalidate a namespace, or the given objects in it.
+
+    Without ids the namespace-wide version is bumped.
+    """
+    for id in set(ids) or [None]:
+        key = _version_key(namespace, id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def make_key(namespace, *parts):
+    """
+    Build a cache key from a namespace and parts such as versions and parameters.
+
+    Long keys, and keys with spaces or control characters such as query
+    parameters may hold, are hashed to stay valid for memcached.
+    """
+    key = ':'.join([namespace, *(str(part) for part in parts)])
+    if len(key) > 200 or any(ord(char) <= 32 or ord(char) == 127 for char in key):
+        key = f'{namespace}:{hashlib.sha1(key.encode()).hexdigest()}'
+    return key
+
+
+def get_or_build(key, build, timeout):
+    """Return the cached value of a key, building and storing it on a miss."""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
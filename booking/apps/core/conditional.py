@@ -0,0 +1,81 @@
+"""
+Conditional GET for class-based views.
+
+A view states what its page depends on through ``get_validators()``, which
+must be much cheaper than building the page: typically an aggregate such as
+the latest ``updated_at`` and the number of rows, or data already in the
+cache. When the client's ``If-None-Match`` or ``If-Modified-Since`` still
+matches, a 304 is returned without loading the page's rows or rendering the
+template.
+
+The ETag also covers the parts of the page that depend on the visitor, such
+as the user menu, so it is never shared between users. Last-Modified cannot
+see deleted rows; the ETag, which includes the row counts, is what decides
+when a client sends both.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Return a quoted strong ETag from the string forms of some values."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def user_parts(request):
+    """Return what the shared page layout shows of the requesting user."""
+    user = request.user
+    if not user.is_authenticated:
+        return (None,)
+    return (user.pk, user.get_username(), user.is_staff, str(getattr(user, 'profile_picture', '') or ''))
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GET requests for a view before building the page.
+
+    Views implement ``get_validators()``, returning a ``(last_modified,
+    etag_parts)`` tuple, or None to skip conditional handling for a request;
+    the ETag is computed from both. ``cache_control`` is applied to full and
+    304 responses alike; the default lets shared caches store the page but
+    makes them revalidate every time.
+    """
+    cache_control = {'no_cache': True}
+
+    def get_validators(self):
+        """Return ``(last_modified, etag_parts)`` for the request, or None."""
+        raise NotImplementedError('Views using ConditionalGetMixin must implement get_validators().')
+
+    def get(self, request, *args, **kwargs):
+        """Return a 304 when the client's copy is current, else the page."""
+        validators = None
+        # A page with pending messages displays them, so it is always built
+        if not messages.get_messages(request):
+            validators = self.get_validators()
+        if validators is None:
+            response = super().get(request, *args, **kwargs)
+            patch_cache_control(response, **self.cache_control)
+            return response
+
+        last_modified, etag_parts = validators
+        etag = make_etag(last_modified, *etag_parts, *user_parts(request))
+        timestamp = None
+        if last_modified is not None:
+            if timezone.is_naive(last_modified):
+                last_modified = timezone.make_aware(last_modified)
+            timestamp = int(last_modified.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers.setdefault('ETag', etag)
+            if timestamp is not None:
+                response.headers.setdefault('Last-Modified', http_date(timestamp))
+        patch_cache_control(response, **self.cache_control)
+        return response
@@ -0,0 +1,158 @@
+"""
+Lightweight query instrumentation for requests and Celery tasks.
+
+A QueryStats object is installed with ``connection.execute_wrapper`` on
+every database connection for the duration of a request or task. It counts
+the statements, their total time, and the statements repeated with the same
+SQL, which is how an N+1 pattern shows up. Unlike the debug toolbar nothing
+is kept beyond one counter per distinct statement, so it is cheap enough for
+production.
+
+Views may declare a query budget with ``@query_budget(n)``. Budgets live in
+a registry keyed by the view's dotted path; requests exceeding their budget
+are logged as warnings, and tests can assert against the same numbers.
+"""
+import contextlib
+import logging
+import time
+from collections import Counter
+
+from django.db import connections
+
+logger = logging.getLogger('booking.queries')
+
+# Dotted view path -> maximum number of queries
+_budgets = {}
+
+
+class QueryStats:
+    """Counters for the statements executed while recording."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @contextlib.contextmanager
+    def record(self):
+        """Record the statements run on every connection inside the block."""
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def duplicates(self):
+        """Return the number of executions repeating an earlier statement."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_repeated(self):
+        """Return ``(sql, count)`` of the most repeated statement, or None."""
+        if not self.statements:
+            return None
+        sql, count = self.statements.most_common(1)[0]
+        return (sql, count) if count > 1 else None
+
+    def as_dict(self):
+        """Return the counters as a JSON-serialisable dict."""
+        return {
+            'queries': self.count,
+            'db_ms': round(self.duration * 1000, 2),
+            'duplicates': self.duplicates,
+        }
+
+
+def view_path(view):
+    """Return the dotted path identifying a view class or function."""
+    view = getattr(view, 'view_class', view)
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of queries a view may run per request.
+
+    Usable on view classes and view functions::
+
+        @query_budget(4)
+        class BookingListView(ListView):
+            ...
+    """
+    def decorator(view):
+        _budgets[view_path(view)] = max_queries
+        return view
+    return decorator
+
+
+def get_budget(view):
+    """Return the query budget of a view, or None when it has none."""
+    return _budgets.get(view_path(view))
+
+
+def get_budgets():
+    """Return a copy of the budget registry."""
+    return dict(_budgets)
+
+
+def log_stats(kind, name, stats, budget=None, **fields):
+    """
+    Write one structured log line for a request or task.
+
+    The message is in ``key=value`` form, and the same values are attached
+    to the record as ``extra`` for JSON log formatters.
+    """
+    values = {kind: name, **fields, **stats.as_dict()}
+    level = logging.INFO
+    if budget is not None:
+        values['budget'] = budget
+        if stats.count > budget:
+            values['over_budget'] = True
+            level = logging.WARNING
+    repeated = stats.most_repeated()
+    if repeated and (level == logging.WARNING or repeated[1] > 2):
+        values['repeated'] = repeated[1]
+        values['repeated_sql'] = repeated[0][:200]
+    message = ' '.join(f'{key}={value!r}' if ' ' in str(value) else f'{key}={value}' for key, value in values.items())
+    logger.log(level, message, extra={'query_stats': values})
+
+
+# Celery task id -> (ExitStack, QueryStats, start time)
+_task_stats = {}
+
+
+def task_started(task_id=None, **kwargs):
+    """Start recording the queries of a Celery task (``task_prerun``)."""
+    stats = QueryStats()
+    stack = contextlib.ExitStack()
+    stack.enter_context(stats.record())
+    _task_stats[task_id] = (stack, stats, time.perf_counter())
+
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    """Stop recording the queries of a Celery task and log them (``task_postrun``)."""
+    entry = _task_stats.pop(task_id, None)
+    if entry is None:
+        return
+    stack, stats, start = entry
+    stack.close()
+    log_stats(
+        'task', getattr(task, 'name', task_id), stats,
+        state=state, total_ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+
+
+def connect_celery_signals():
+    """Record the queries of every Celery task run in this process."""
+    from celery.signals import task_postrun, task_prerun
+
+    task_prerun.connect(task_started, weak=False, dispatch_uid='booking.query_stats.prerun')
+    task_postrun.connect(task_finished, weak=False, dispatch_uid='booking.query_stats.postrun')
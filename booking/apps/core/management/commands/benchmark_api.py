@@ -0,0 +1,144 @@
+"""
+Django command to measure the throughput of a running server on the read API.
+
+Start the server the way it is deployed, for example
+``gunicorn booking.wsgi:application`` or, with
+``GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker``,
+``gunicorn booking.asgi:application``, and run this command from the same
+project against it. Each client keeps one connection open and requests the
+paths in turn, as fast as the server answers, until the time is up.
+"""
+import asyncio
+import datetime
+import time
+from collections import Counter
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, login
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest
+from django.utils import timezone
+
+
+def get_default_paths():
+    """Return the mixed read workload: searches and lists of facilities and bookings."""
+    day = timezone.localdate() + datetime.timedelta(days=1)
+    window = f'available_from={day}T10:00&available_to={day}T12:00'
+    return [
+        f'/api/v1/facilities/?{window}&page_size=20',
+        f'/facilities/availability/?{window}',
+        '/api/v1/bookings/?page_size=20',
+        '/api/v1/facilities/?page_size=20',
+    ]
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return its status and whether the connection stays open."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('The server closed the connection.')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif 'chunked' in headers.get('transfer-encoding', ''):
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def run_client(host, port, paths, headers, deadline, results):
+    """Request the paths in turn until the deadline, appending ``(seconds, status)`` to results."""
+    connection = None
+    i = 0
+    while time.perf_counter() < deadline:
+        if connection is None:
+            connection = await asyncio.open_connection(host, port)
+        reader, writer = connection
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n{headers}\r\n'.encode('latin-1'))
+        await writer.drain()
+        status, keep_alive = await read_response(reader)
+        results.append((time.perf_counter() - started, status))
+        if not keep_alive:
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_clients(host, port, paths, headers, concurrency, duration):
+    """Run the clients at once and return their results."""
+    results = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        run_client(host, port, paths, headers, deadline, results) for _ in range(concurrency)
+    ])
+    return results
+
+
+class Command(BaseCommand):
+    """Benchmark API command"""
+
+    help = 'Load a running server with concurrent read requests and report requests per second and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Paths to request in turn (default: a mixed read workload)')
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Address of the server')
+        parser.add_argument('--concurrency', type=int, default=64, help='Number of concurrent clients')
+        parser.add_argument('--duration', type=float, default=15, help='Seconds to run for')
+        parser.add_argument('--user', help='Sign the clients in as this user')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Give the server as http://host:port.')
+        headers = 'Accept: application/json\r\n'
+        if options['user']:
+            headers += f"Cookie: {settings.SESSION_COOKIE_NAME}={self.get_session_key(options['user'])}\r\n"
+        paths = options['paths'] or get_default_paths()
+
+        results = asyncio.run(run_clients(
+            url.hostname, url.port or 80, paths, headers, options['concurrency'], options['duration'],
+        ))
+        if not results:
+            raise CommandError('No request completed.')
+
+        latencies = sorted(seconds for seconds, _status in results)
+        statuses = Counter(status for _seconds, status in results)
+        self.stdout.write(
+            f"{options['concurrency']} clients, {len(results)} requests: "
+            f"{len(results) / options['duration']:.1f} req/s, "
+            f"p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms, "
+            f"statuses {dict(sorted(statuses.items()))}"
+        )
+
+    def get_session_key(self, username):
+        """Sign a user in and return the session key."""
+        User = get_user_model()
+        try:
+            user = User.objects.get(**{User.USERNAME_FIELD: username})
+        except User.DoesNotExist:
+            raise CommandError(f'User {username} does not exist.')
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        login(request, user)
+        request.session.save()
+        return request.session.session_key
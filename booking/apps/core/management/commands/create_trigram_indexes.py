@@ -0,0 +1,30 @@
+"""
+Django command to create the trigram indexes of the substring-searched columns.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from booking.apps.core.search import ensure_trigram_indexes
+
+
+class Command(BaseCommand):
+    """Create trigram indexes command"""
+
+    help = 'Install pg_trgm and build the trigram indexes skipped by migrate when it was unavailable'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to create the indexes in'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Trigram indexes need PostgreSQL.')
+        # The indexes are built concurrently, outside any transaction
+        with connection.schema_editor(atomic=False) as schema_editor:
+            created = ensure_trigram_indexes(schema_editor)
+        if not created:
+            raise CommandError('The pg_trgm extension is not available on this database.')
+        self.stdout.write(self.style.SUCCESS('Trigram indexes are in place.'))
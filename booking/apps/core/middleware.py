@@ -0,0 +1,76 @@
+"""
+Middleware for the booking project.
+"""
+import contextlib
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from booking.apps.core.instrumentation import QueryStats, get_budget, log_stats, view_path
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Count the queries and database time of every request.
+
+    The counters are attached to the request as ``request.query_stats``,
+    reported in a ``Server-Timing`` header when
+    ``QUERY_INSTRUMENTATION_SERVER_TIMING`` is on, and written to the
+    ``booking.queries`` logger together with the view's query budget.
+    Place it first so that session and authentication queries are counted.
+    Queries run while a streaming response is consumed are not counted.
+
+    Under ASGI the queries of a request run in the thread its thread-sensitive
+    ``sync_to_async`` calls share, async ORM calls included, so recording is
+    started and stopped in that thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = request.query_stats = QueryStats()
+        request.query_view = None
+        start = time.perf_counter()
+        with stats.record():
+            response = self.get_response(request)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = request.query_stats = QueryStats()
+        request.query_view = None
+        start = time.perf_counter()
+        recording = contextlib.ExitStack()
+        await sync_to_async(recording.enter_context)(stats.record())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        return self.finish(request, response, stats, start)
+
+    def finish(self, request, response, stats, start):
+        """Report the recorded queries of a request on its response and in the log."""
+        total = time.perf_counter() - start
+        if getattr(settings, 'QUERY_INSTRUMENTATION_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+                f'app;dur={total * 1000:.2f}'
+            )
+        view = request.query_view
+        log_stats(
+            'view', view_path(view) if view else request.path, stats,
+            budget=get_budget(view) if view else None,
+            method=request.method, status=response.status_code, total_ms=round(total * 1000, 2),
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Remember the view so its budget can be looked up."""
+        request.query_view = view_func
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:40
+
+from django.db import migrations
+
+from booking.apps.core.search import drop_trigram_indexes, ensure_trigram_indexes
+
+
+def create_indexes(apps, schema_editor):
+    ensure_trigram_indexes(schema_editor)
+
+
+def drop_indexes(apps, schema_editor):
+    drop_trigram_indexes(schema_editor)
+
+
+class Migration(migrations.Migration):
+    # Trigram indexes live outside the model state: they depend on the
+    # pg_trgm extension, which is skipped where it is not available. Once
+    # the extension can be installed, the create_trigram_indexes command
+    # adds them.
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('facilities', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
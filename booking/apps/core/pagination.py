@@ -0,0 +1,361 @@
+"""
+Keyset (cursor) pagination for large, ordered querysets.
+
+Instead of ``OFFSET n`` the next page is selected with a condition on the
+sort key of the last row shown, so a deep page costs the same index range
+scan as the first one. The sort key must be unique, which is why it always
+ends with the primary key.
+
+Counting every row is the other linear cost of classic pagination. The
+paginator can count exactly, stop counting at a cap, or read the planner's
+row estimate instead.
+"""
+import base64
+import binascii
+import json
+import operator
+from functools import reduce
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_COUNT_CAP = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded for the paginator's ordering."""
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's estimate of the number of rows of a queryset.
+
+    Returns None when the database does not expose a row estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, count_mode='auto', count_cap=DEFAULT_COUNT_CAP):
+    """
+    Count the rows of a queryset according to a count mode.
+
+    See KeysetPaginator for the modes. Returns ``(count, is_exact)``; the
+    count is None when not counted or when no estimate is available.
+    """
+    queryset = queryset.order_by()
+    count, exact = None, False
+    if count_mode == 'exact':
+        count, exact = queryset.count(), True
+    elif count_mode in ('capped', 'auto'):
+        count = queryset[:count_cap + 1].count()
+        exact = count <= count_cap
+        if not exact:
+            count = count_cap
+            if count_mode == 'auto':
+                count = max(estimate_count(queryset) or 0, count)
+    elif count_mode == 'estimate':
+        count = estimate_count(queryset)
+    return count, exact
+
+
+class CappedCountPaginator(Paginator):
+    """
+    A page-number paginator that counts up to a cap and estimates beyond it.
+
+    Suited to the admin changelist, where ``COUNT(*)`` over a large table
+    costs more than the page itself. Past the cap the page count follows the
+    planner's estimate, so the last pages may be empty or out of reach.
+    """
+    count_cap = 10000
+
+    @cached_property
+    def _counted(self):
+        return count_rows(self.object_list, 'auto', self.count_cap)
+
+    @property
+    def count(self):
+        """Return the exact count up to the cap, else the estimated count."""
+        return self._counted[0]
+
+    @property
+    def count_is_exact(self):
+        """Return whether ``count`` is exact."""
+        return self._counted[1]
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by cursor over a unique ordering.
+
+    Args:
+        queryset: The queryset to paginate.
+        per_page: Number of rows per page.
+        ordering: Field or annotation names with an optional ``-`` prefix,
+            ending with a unique field such as ``id``.
+        count_mode: ``'exact'`` runs ``COUNT(*)``; ``'capped'`` counts at
+            most ``count_cap`` rows; ``'estimate'`` reads the planner's row
+            estimate; ``'auto'`` counts up to the cap and falls back to the
+            estimate beyond it; ``None`` skips counting.
+        count_cap: Row limit for the capped and auto modes.
+    """
+    is_keyset = True
+    count_modes = ('exact', 'capped', 'estimate', 'auto', None)
+
+    def __init__(self, queryset, per_page, ordering, count_mode='auto', count_cap=DEFAULT_COUNT_CAP):
+        if count_mode not in self.count_modes:
+            raise ValueError(f'Unknown count mode {count_mode!r}.')
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.count_mode = count_mode
+        self.count_cap = count_cap
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.queryset = queryset.order_by(*self.ordering)
+        self._count = None
+
+    def set_count(self, count, is_exact):
+        """Use a count obtained earlier, such as a cached one, instead of counting."""
+        self._count = (count, is_exact)
+
+    def _get_count(self):
+        """Return ``(count, is_exact)`` according to the count mode."""
+        if self._count is None:
+            self._count = count_rows(self.queryset, self.count_mode, self.count_cap)
+        return self._count
+
+    @property
+    def count(self):
+        """Return the number of rows, exact or approximate, or None when not counted."""
+        return self._get_count()[0]
+
+    @property
+    def count_is_exact(self):
+        """Return whether ``count`` is exact."""
+        return self._get_count()[1]
+
+    def get_field(self, name):
+        """Return the model field, or the output field of the annotation, sorted on."""
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = self.queryset.query.annotations[name].output_field.clone()
+            field.set_attributes_from_name(name)
+            return field
+
+    def encode_cursor(self, obj, direction):
+        """
+        Encode the sort key of ``obj`` and a direction (``'n'`` or ``'p'``) as a cursor.
+
+        ``obj`` is a model instance, or a ``values()`` dict holding the
+        ordering fields.
+        """
+        values = []
+        for name in self.fields:
+            field = self.get_field(name)
+            source = SimpleNamespace(**{field.attname: obj[name]}) if isinstance(obj, dict) else obj
+            values.append(field.value_to_string(source))
+        payload = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Decode a cursor into ``(direction, values)``."""
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, raw_values = json.loads(payload)
+        except (binascii.Error, ValueError, TypeError):
+            raise InvalidCursor(_('Invalid cursor.'))
+        if direction not in ('n', 'p') or not isinstance(raw_values, list) or len(raw_values) != len(self.fields):
+            raise InvalidCursor(_('Invalid cursor.'))
+        values = []
+        for name, raw in zip(self.fields, raw_values):
+            field = self.get_field(name)
+            try:
+                values.append(field.to_python(raw))
+            except ValidationError:
+                raise InvalidCursor(_('Invalid cursor.'))
+        return direction, values
+
+    def _after(self, values, reverse=False):
+        """
+        Build the condition selecting rows after a sort key in the given direction.
+
+        The expanded ``(a > x) OR (a = x AND b > y)`` form is paired with a
+        plain bound on the leading field, which the planner can use as an
+        index condition.
+        """
+        clauses = []
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            equal = {field: value for field, value in zip(self.fields[:position], values[:position])}
+            clauses.append(Q(**equal, **{f'{self.fields[position]}__{lookup}': values[position]}))
+        leading_descending = self.ordering[0].startswith('-') != reverse
+        bound = Q(**{f"{self.fields[0]}__{'lte' if leading_descending else 'gte'}": values[0]})
+        return bound & reduce(operator.or_, clauses)
+
+    def window(self, cursor=None):
+        """
+        Return ``(direction, queryset)`` for the rows of the page selected by a cursor.
+
+        The queryset is not evaluated. It holds the page's rows plus one
+        more telling whether the page has a neighbour, in the order they are
+        read, which is reversed for a ``'p'`` cursor. The direction is None
+        for the first page.
+        """
+        if not cursor:
+            return None, self.queryset[:self.per_page + 1]
+        direction, values = self.decode_cursor(cursor)
+        if direction == 'n':
+            return direction, self.queryset.filter(self._after(values))[:self.per_page + 1]
+        reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        return direction, self.queryset.filter(
+            self._after(values, reverse=True)
+        ).order_by(*reversed_ordering)[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        """Return the page selected by a cursor, or the first page."""
+        direction, queryset = self.window(cursor)
+        return self.make_page(direction, list(queryset))
+
+    async def apage(self, cursor=None):
+        """Return the page selected by a cursor, read with the async ORM."""
+        direction, queryset = self.window(cursor)
+        return self.make_page(direction, [row async for row in queryset])
+
+    def make_page(self, direction, rows):
+        """Build the page from the rows of a window, in the order they were read."""
+        if direction != 'p':
+            return KeysetPage(
+                self, rows[:self.per_page], has_next=len(rows) > self.per_page, has_previous=direction == 'n',
+            )
+        page_rows = rows[:self.per_page][::-1]
+        return KeysetPage(self, page_rows, has_next=True, has_previous=len(rows) > self.per_page)
+
+
+class KeysetPage:
+    """A page of rows with the cursors leading to its neighbours."""
+
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} rows>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        """Return whether there is a next page."""
+        return self._has_next
+
+    def has_previous(self):
+        """Return whether there is a previous page."""
+        return self._has_previous
+
+    def has_other_pages(self):
+        """Return whether there is a next or a previous page."""
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        """Return the cursor of the next page, or None."""
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'n')
+
+    @property
+    def previous_cursor(self):
+        """Return the cursor of the previous page, or None."""
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'p')
+
+
+class KeysetPaginationMixin:
+    """
+    Make a ListView paginate by cursor instead of page number.
+
+    Views set ``keyset_ordering`` to a unique ordering, or override
+    ``get_keyset_ordering()``, and may change ``count_mode`` and
+    ``count_cap``. The template context gets the usual
+    ``page_obj`` and ``is_paginated`` plus ``pagination_query``, the query
+    string without the cursor, for building page links.
+    """
+    keyset_ordering = ('-id',)
+    count_mode = 'auto'
+    count_cap = DEFAULT_COUNT_CAP
+    cursor_param = CURSOR_PARAM
+
+    _keyset_paginator = None
+    _keyset_page = None
+
+    def get_keyset_ordering(self):
+        """Return the unique ordering to paginate by."""
+        return self.keyset_ordering
+
+    def get_keyset_paginator(self, queryset, page_size):
+        """
+        Return the KeysetPaginator for the queryset.
+
+        It is built once per request, so that code running before the page,
+        such as conditional GET validators, shares its count.
+        """
+        if self._keyset_paginator is None:
+            self._keyset_paginator = KeysetPaginator(
+                queryset, page_size, self.get_keyset_ordering(),
+                count_mode=self.count_mode, count_cap=self.count_cap,
+            )
+        return self._keyset_paginator
+
+    def get_keyset_page(self, paginator):
+        """
+        Return the page selected by the request's cursor, or raise Http404.
+
+        It is loaded once per request, so that conditional GET validators
+        and the response share its rows.
+        """
+        if self._keyset_page is None:
+            try:
+                self._keyset_page = paginator.page(self.request.GET.get(self.cursor_param))
+            except InvalidCursor as e:
+                raise Http404(str(e))
+        return self._keyset_page
+
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate the queryset by cursor."""
+        paginator = self.get_keyset_paginator(queryset, page_size)
+        page = self.get_keyset_page(paginator)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        """Add the query string without the cursor."""
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.copy()
+        for param in (self.cursor_param, self.page_kwarg):
+            query.pop(param, None)
+        context['pagination_query'] = query.urlencode()
+        return context
@@ -0,0 +1,73 @@
+"""
+PostgreSQL schema objects that other databases leave out.
+
+The project runs on PostgreSQL, and its test suite also runs on SQLite.
+The classes here behave like their ``django.contrib.postgres`` namesakes on
+PostgreSQL and fall back to the nearest plain equivalent elsewhere, or have
+no effect, so the same models and migrations apply to both. What they
+provide on PostgreSQL, such as overlap checks, must then be done by the
+application itself.
+"""
+from django.contrib.postgres import constraints, indexes, operations
+from django.db import migrations, models
+
+
+def is_postgresql(schema_editor):
+    """Return whether a schema editor works on PostgreSQL."""
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class ExclusionConstraint(constraints.ExclusionConstraint):
+    """An exclusion constraint that only exists on PostgreSQL."""
+
+    def constraint_sql(self, model, schema_editor):
+        if not is_postgresql(schema_editor):
+            return None
+        return super().constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        if not is_postgresql(schema_editor):
+            return None
+        return super().create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        if not is_postgresql(schema_editor):
+            return None
+        return super().remove_sql(model, schema_editor)
+
+
+class GinIndex(indexes.GinIndex):
+    """A GIN index on PostgreSQL and a plain index elsewhere."""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if not is_postgresql(schema_editor):
+            return models.Index.create_sql(self, model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    """Add an index without locking out writes on PostgreSQL, and plainly elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_postgresql(schema_editor):
+            return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_postgresql(schema_editor):
+            return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class RemoveIndexConcurrently(operations.RemoveIndexConcurrently):
+    """Remove an index without locking out writes on PostgreSQL, and plainly elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_postgresql(schema_editor):
+            return migrations.RemoveIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_postgresql(schema_editor):
+            return migrations.RemoveIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
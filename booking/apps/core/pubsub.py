@@ -0,0 +1,232 @@
+"""
+Publish/subscribe channels between the processes of the project.
+
+Writers publish small messages on named channels from sync code, usually
+once a transaction commits; the event stream (see ``sse``) subscribes to
+channels from the event loop of an ASGI worker. Each process keeps one
+registry of its local subscribers, so a subscriber costs a queue and a few
+set entries whatever the backend:
+
+- ``memory://`` delivers within the process, which is enough for tests and
+  for a single process. Gunicorn and Celery workers refuse to start with
+  it when they run several processes (see ``require_shared_broker``).
+- ``redis://`` publishes through Redis. Each process holds a single pattern
+  subscription, read by one task of its event loop, and fans the messages
+  out to its local subscribers.
+
+The backend is chosen by the ``LIVE_EVENTS_URL`` setting. Delivery is best
+effort: messages published while a subscriber's connection to Redis is
+being re-established are lost.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Messages a subscriber may fall behind before it is dropped
+QUEUE_SIZE = 100
+
+# url -> broker, local to this process
+_brokers = {}
+
+
+def get_broker():
+    """Return the broker of the ``LIVE_EVENTS_URL`` setting."""
+    url = settings.LIVE_EVENTS_URL
+    if url not in _brokers:
+        scheme = urlsplit(url).scheme
+        if scheme == 'memory':
+            _brokers[url] = MemoryBroker()
+        elif scheme in ('redis', 'rediss', 'unix'):
+            _brokers[url] = RedisBroker(url)
+        else:
+            raise ImproperlyConfigured(f'Unsupported LIVE_EVENTS_URL scheme: {scheme!r}')
+    return _brokers[url]
+
+
+def require_shared_broker(reason):
+    """
+    Refuse to go on with a broker that only delivers within this process.
+
+    Processes that publish to, or serve the event stream for, other
+    processes call this as they start, so that a missing ``LIVE_EVENTS_URL``
+    fails loudly instead of silently dropping every update.
+
+    Args:
+        reason: Why the messages must leave this process, for the error.
+    """
+    if not is_shared_broker():
+        raise ImproperlyConfigured(f'LIVE_EVENTS_URL is {settings.LIVE_EVENTS_URL}, but {reason}; point it at Redis.')
+
+
+def is_shared_broker():
+    """Return whether the broker delivers to other processes."""
+    return urlsplit(settings.LIVE_EVENTS_URL).scheme != 'memory'
+
+
+class Subscription:
+    """
+    The messages of some channels, queued for one consumer on an event loop.
+
+    A consumer that falls QUEUE_SIZE messages behind is dropped: the
+    subscription is closed and ``get()`` returns None, so that the consumer
+    can start over from a fresh state.
+    """
+
+    def __init__(self, broker, channels, loop):
+        self.broker = broker
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def put(self, message):
+        """Queue a message for the consumer; safe to call from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The event loop is closed
+            self.close()
+
+    def _put(self, message):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning('Dropping a subscriber of %s that fell behind', ', '.join(self.channels))
+            self.close()
+
+    async def get(self):
+        """Return the next message, or None once the subscription is closed."""
+        if self.closed:
+            return None
+        return await self.queue.get()
+
+    def close(self):
+        """Stop receiving messages."""
+        self.closed = True
+        self.broker.unsubscribe(self)
+
+
+class MemoryBroker:
+    """Deliver messages to the subscribers of this process only."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        """
+        Send a message to the subscribers of a channel.
+
+        Args:
+            channel: The channel name.
+            message: A dict serialisable with DjangoJSONEncoder. It is shared
+                by every subscriber, which must not change it.
+        """
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """Queue a message for the local subscribers of a channel."""
+        with self.lock:
+            subscriptions = list(self.subscribers.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribe(self, channels):
+        """
+        Subscribe a consumer running on the current event loop to some channels.
+
+        Returns:
+            A Subscription, to be closed when the consumer is done; it is a
+            context manager that does so.
+        """
+        subscription = Subscription(self, list(channels), asyncio.get_running_loop())
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Forget a subscription."""
+        with self.lock:
+            for channel in subscription.channels:
+                subscriptions = self.subscribers.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self.subscribers[channel]
+
+
+class RedisBroker(MemoryBroker):
+    """
+    Deliver messages to the subscribers of every process through Redis.
+
+    Args:
+        url: The Redis URL.
+        prefix: Prepended to the channel names in Redis.
+    """
+
+    def __init__(self, url, prefix='booking:events:'):
+        import redis
+
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        # event loop -> task reading the pattern subscription
+        self.listeners = {}
+
+    def publish(self, channel, message):
+        """Send a message to the subscribers of a channel, in any process."""
+        import redis
+
+        try:
+            self.client.publish(self.prefix + channel, json.dumps(message, cls=DjangoJSONEncoder))
+        except redis.RedisError:
+            # A live update is not worth failing the change that caused it
+            logger.warning('Could not publish on %s', channel, exc_info=True)
+
+    def subscribe(self, channels):
+        """Subscribe to some channels, listening to Redis from the current event loop."""
+        loop = asyncio.get_running_loop()
+        listener = self.listeners.get(loop)
+        if listener is None or listener.done():
+            self.listeners[loop] = loop.create_task(self.listen())
+        return super().subscribe(channels)
+
+    async def listen(self):
+        """Deliver the messages of every channel to the local subscribers, reconnecting after failures."""
+        import redis
+        from redis import asyncio as aioredis
+
+        while True:
+            client = aioredis.Redis.from_url(self.url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(self.prefix + '*')
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        channel = message['channel'].decode()[len(self.prefix):]
+                        self.deliver(channel, json.loads(message['data']))
+            except redis.RedisError:
+                logger.warning('Lost the subscription to %s, reconnecting', self.url, exc_info=True)
+            finally:
+                await pubsub.reset()
+                await client.close()
+            await asyncio.sleep(1)
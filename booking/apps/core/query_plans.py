@@ -0,0 +1,138 @@
+"""
+EXPLAIN-based checks for query plans.
+
+A PlanCheck describes a hot query path: a callable that either returns the
+QuerySet the path would run or runs the path itself, the indexes the plan is
+expected to use, and a budget for the planner's estimated cost. Checks are
+run by the test suite against a seeded database and by the
+``explain_hot_queries`` management command against a live one, so a plan
+regression after a migration shows up in both places the same way.
+"""
+import json
+
+from django.db import connections
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+
+
+class PlanCheck:
+    """
+    A hot query path and the plan properties it must keep.
+
+    Args:
+        name: Short identifier of the path.
+        build: Callable returning a QuerySet, or running the path itself so
+            that the SELECT statements it executes are captured.
+        indexes: Index names of which the plan must use at least one.
+        max_cost: Budget for the estimated total cost of the plan.
+        description: What the path serves.
+    """
+
+    def __init__(self, name, build, indexes=(), max_cost=None, description=''):
+        self.name = name
+        self.build = build
+        self.indexes = frozenset(indexes)
+        self.max_cost = max_cost
+        self.description = description
+
+    def __repr__(self):
+        return f'<PlanCheck {self.name}>'
+
+
+class PlanResult:
+    """The outcome of running a PlanCheck."""
+
+    def __init__(self, check, statements, plans):
+        self.check = check
+        self.statements = statements
+        self.plans = plans
+        self.cost = max((plan['Total Cost'] for plan in plans), default=0.0)
+        self.indexes_used = set()
+        self.node_types = set()
+        for plan in plans:
+            for node in walk(plan):
+                self.node_types.add(node['Node Type'])
+                if 'Index Name' in node:
+                    self.indexes_used.add(node['Index Name'])
+
+    @property
+    def problems(self):
+        """Return a list of readable reasons the check failed."""
+        problems = []
+        if not self.plans:
+            problems.append('no SELECT statement was captured')
+        if self.check.indexes and not self.check.indexes & self.indexes_used:
+            problems.append(
+                f"expected one of {', '.join(sorted(self.check.indexes))}, "
+                f"used {', '.join(sorted(self.indexes_used)) or 'no index'}"
+            )
+        if self.check.max_cost is not None and self.cost > self.check.max_cost:
+            problems.append(f'estimated cost {self.cost:.1f} exceeds budget {self.check.max_cost:.1f}')
+        return problems
+
+    @property
+    def ok(self):
+        """Return whether the plan meets the check."""
+        return not self.problems
+
+    def as_dict(self):
+        """Return the result as a JSON-serialisable dict."""
+        return {
+            'name': self.check.name,
+            'ok': self.ok,
+            'cost': self.cost,
+            'max_cost': self.check.max_cost,
+            'indexes_used': sorted(self.indexes_used),
+            'expected_indexes': sorted(self.check.indexes),
+            'problems': self.problems,
+            'statements': [sql for sql, params in self.statements],
+            'plans': self.plans,
+        }
+
+
+def walk(plan):
+    """Yield a plan node and all of its descendants."""
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from walk(child)
+
+
+def explain(sql, params=None, using='default'):
+    """Return the root node of the JSON plan of a statement."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        output = cursor.fetchone()[0]
+    if isinstance(output, str):
+        output = json.loads(output)
+    return output[0]['Plan']
+
+
+def capture_statements(build, using='default'):
+    """
+    Return the ``(sql, params)`` of the SELECT statements a check stands for.
+
+    A returned QuerySet is compiled without being run; otherwise the
+    statements executed by ``build`` are captured.
+    """
+    connection = connections[using]
+    with CaptureQueriesContext(connection) as captured:
+        result = build()
+    if isinstance(result, QuerySet):
+        return [result.query.sql_with_params()]
+    return [
+        (query['sql'], None)
+        for query in captured.captured_queries
+        if query['sql'].lstrip().upper().startswith('SELECT')
+    ]
+
+
+def run_check(check, using='default'):
+    """Run a check and return its PlanResult."""
+    statements = capture_statements(check.build, using)
+    plans = [explain(sql, params, using) for sql, params in statements]
+    return PlanResult(check, statements, plans)
+
+
+def run_checks(checks, using='default'):
+    """Run several checks and return their results in order."""
+    return [run_check(check, using) for check in checks]
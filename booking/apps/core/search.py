@@ -0,0 +1,236 @@
+"""
+Indexed text search for facilities and bookings.
+
+Two mechanisms back the search:
+
+* Full-text search: searchable models keep a ``search_vector`` tsvector
+  column, maintained by a database trigger on insert and update (bulk
+  writes included) and served by a GIN index. Results are ranked with
+  the weights of the fields the vector is built from.
+* Substring search: ``icontains`` lookups compile to
+  ``UPPER(column) LIKE UPPER('%term%')``, which a ``pg_trgm`` GIN index on
+  ``UPPER(column)`` serves without changing their meaning. The trigram
+  indexes are only created where the extension can be installed; without
+  them the same lookups still work, just without an index.
+
+Databases other than PostgreSQL fall back to ``icontains`` filters and to
+a rank summing the weights of the fields each word occurs in; their
+``search_vector`` column stays empty and has a plain index.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+SEARCH_CONFIG = 'english'
+
+# Substring-searched columns that get a trigram index: (table, column)
+TRIGRAM_COLUMNS = (
+    ('facilities_facility', 'name'),
+    ('facilities_facility', 'location'),
+    ('accounts_user', 'username'),
+    ('accounts_user', 'email'),
+)
+
+WEIGHT_SCORES = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+_trigram_available = {}
+
+
+class SearchSpec:
+    """
+    Describe how the search vector of a model is built.
+
+    Args:
+        weights: Mapping of text field names to their weight, ``'A'`` (most
+            important) to ``'D'``.
+    """
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+
+    @property
+    def fields(self):
+        """Return the searchable field names."""
+        return list(self.weights)
+
+    def vector_sql(self, row='NEW'):
+        """Return the SQL building the vector from a row, as used by the trigger."""
+        parts = [
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({row}.{field}, '')), '{weight}')"
+            for field, weight in self.weights.items()
+        ]
+        return ' || '.join(parts)
+
+    def trigger_sql(self, table):
+        """Return the SQL creating the trigger that keeps ``search_vector`` current."""
+        function = f'{table}_search_vector_update'
+        columns = ', '.join(self.fields)
+        return f"""
+            CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {self.vector_sql()};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS {table}_search_vector ON {table};
+            CREATE TRIGGER {table}_search_vector
+                BEFORE INSERT OR UPDATE OF {columns} ON {table}
+                FOR EACH ROW EXECUTE FUNCTION {function}();
+        """
+
+    def drop_trigger_sql(self, table):
+        """Return the SQL removing the trigger and its function."""
+        return f"""
+            DROP TRIGGER IF EXISTS {table}_search_vector ON {table};
+            DROP FUNCTION IF EXISTS {table}_search_vector_update();
+        """
+
+
+def create_search_trigger(schema_editor, table, spec):
+    """Create the trigger keeping ``search_vector`` current, on PostgreSQL only."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(spec.trigger_sql(table))
+
+
+def drop_search_trigger(schema_editor, table, spec):
+    """Drop the trigger keeping ``search_vector`` current, on PostgreSQL only."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(spec.drop_trigger_sql(table))
+
+
+def backfill_search_vectors(schema_editor, table, spec, batch_size=10000):
+    """Fill ``search_vector`` for the existing rows of a table, one primary key range at a time."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(id), max(id) FROM {table}')
+        first, last = cursor.fetchone()
+        if first is None:
+            return
+        for start in range(first, last + 1, batch_size):
+            cursor.execute(
+                f'UPDATE {table} SET search_vector = {spec.vector_sql(row=table)} '
+                f'WHERE id >= %s AND id < %s',
+                [start, start + batch_size],
+            )
+
+
+def tokenize(text):
+    """Split text into lowercase words."""
+    return re.findall(r'\w+', text.lower())
+
+
+def is_postgresql(queryset):
+    """Return whether a queryset runs on PostgreSQL."""
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def has_trigram(using='default'):
+    """Return whether the ``pg_trgm`` extension is installed, cached per database."""
+    if using not in _trigram_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                available = cursor.fetchone() is not None
+        _trigram_available[using] = available
+    return _trigram_available[using]
+
+
+def search_query(term):
+    """
+    Return the SearchQuery for a user-entered term.
+
+    Every word must match, and the last letters of a word may be missing,
+    so that partial words typed into a search box still find results.
+    """
+    words = tokenize(term)
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def full_text_q(queryset, term, spec):
+    """
+    Return the condition selecting the rows of a queryset matching a term.
+
+    On PostgreSQL this is a GIN-indexed match on ``search_vector``;
+    elsewhere every word of the term must occur in one of the fields.
+    """
+    words = tokenize(term)
+    if not words:
+        return Q(pk__in=[])
+    if is_postgresql(queryset):
+        return Q(search_vector=search_query(term))
+    condition = Q()
+    for word in words:
+        condition &= Q(*[Q(**{f'{field}__icontains': word}) for field in spec.fields], _connector=Q.OR)
+    return condition
+
+
+def full_text_filter(queryset, term, spec):
+    """Filter a queryset to the rows matching a term."""
+    return queryset.filter(full_text_q(queryset, term, spec))
+
+
+def rank_expression(queryset, term, spec):
+    """
+    Return the expression scoring the rows of a queryset against a term.
+
+    On PostgreSQL this is ``ts_rank`` over the stored vector; elsewhere each
+    word scores the weight of every field it occurs in. Rows without a
+    vector score 0.
+    """
+    if is_postgresql(queryset):
+        return Coalesce(SearchRank(F('search_vector'), search_query(term)), Value(0.0), output_field=FloatField())
+    scores = [
+        Case(When(Q(**{f'{field}__icontains': word}), then=Value(WEIGHT_SCORES[weight])), default=Value(0.0))
+        for word in tokenize(term)
+        for field, weight in spec.weights.items()
+    ]
+    return sum(scores, Value(0.0, output_field=FloatField()))
+
+
+def ranked(queryset, term, spec):
+    """Annotate the rows of a queryset with their ``rank`` for a term and put the best matches first."""
+    return queryset.annotate(rank=rank_expression(queryset, term, spec)).order_by('-rank', 'pk')
+
+
+def ensure_trigram_indexes(schema_editor):
+    """
+    Install ``pg_trgm`` if possible and index the substring-searched columns.
+
+    Returns whether the indexes exist. Indexes are built concurrently, so
+    this must run outside a transaction.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return False
+    _trigram_available.pop(connection.alias, None)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, column in TRIGRAM_COLUMNS:
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_{column}_trgm '
+                f'ON {table} USING gin (UPPER({column}) gin_trgm_ops)'
+            )
+    return True
+
+
+def drop_trigram_indexes(schema_editor):
+    """Drop the trigram indexes, keeping the extension for other users."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for table, column in TRIGRAM_COLUMNS:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {table}_{column}_trgm')
+    _trigram_available.pop(connection.alias, None)
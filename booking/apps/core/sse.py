@@ -0,0 +1,144 @@
+"""
+Server-sent events served straight from ASGI.
+
+Django's ASGI handler gives every request a thread of its own until its
+response ends (see ``middleware``), so a stream that an idle browser keeps
+open would hold a thread, and often a database connection, for hours.
+EventStream answers its path before Django sees the request. Once an async
+setup step has resolved the channels to follow, a connection is a coroutine
+waiting on its pub/sub subscription, with no thread and no database
+connection, and a comment line every ``heartbeat`` seconds keeps proxies
+from closing it.
+"""
+import asyncio
+import json
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.http.cookie import parse_cookie
+
+from booking.apps.core.pubsub import get_broker
+
+
+def format_event(message):
+    """Encode a ``{'event': name, 'data': value}`` message as an event."""
+    data = json.dumps(message['data'], cls=DjangoJSONEncoder)
+    return f"event: {message['event']}\ndata: {data}\n\n".encode()
+
+
+def get_query(scope):
+    """Return the query string of an ASGI request as a QueryDict."""
+    return QueryDict(scope.get('query_string', b'').decode('latin-1'))
+
+
+async def get_user(scope):
+    """
+    Return the user signed in with the session cookie of an ASGI request.
+
+    The lookup runs in the process's shared thread for sync code, whose
+    database connection is released again right away.
+    """
+    cookies = parse_cookie('; '.join(
+        value.decode('latin-1') for name, value in scope.get('headers', ()) if name == b'cookie'
+    ))
+    return await sync_to_async(_get_user, thread_sensitive=True)(cookies.get(settings.SESSION_COOKIE_NAME))
+
+
+def _get_user(session_key):
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    try:
+        return auth.get_user(request)
+    finally:
+        close_old_connections()
+
+
+class EventStream:
+    """
+    ASGI application serving server-sent events at one path.
+
+    Args:
+        application: The ASGI application serving every other request.
+        path: The path of the stream.
+        get_channels: ``async get_channels(scope)`` returning the channels
+            the request follows. It may raise PermissionDenied or BadRequest.
+        heartbeat: Seconds between keep-alive comments.
+        retry: Milliseconds browsers wait before reconnecting.
+    """
+
+    def __init__(self, application, path, get_channels, heartbeat=15, retry=5000):
+        self.application = application
+        self.path = path
+        self.get_channels = get_channels
+        self.heartbeat = heartbeat
+        self.retry = retry
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+        if scope['method'] != 'GET':
+            return await self.reject(send, 405, 'Method not allowed.', [(b'allow', b'GET')])
+        try:
+            channels = await self.get_channels(scope)
+        except PermissionDenied as e:
+            return await self.reject(send, 403, str(e) or 'Permission denied.')
+        except BadRequest as e:
+            return await self.reject(send, 400, str(e) or 'Bad request.')
+        with get_broker().subscribe(channels) as subscription:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    # Tell nginx not to buffer the stream
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await self.stream(subscription, receive, send)
+
+    async def stream(self, subscription, receive, send):
+        """Send the subscription's messages until the client or the subscription goes away."""
+        await send({'type': 'http.response.body', 'body': f'retry: {self.retry}\n\n'.encode(), 'more_body': True})
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        message = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    {disconnect, message}, timeout=self.heartbeat, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnect in done:
+                    return
+                if message in done:
+                    if message.result() is None:
+                        break
+                    body = format_event(message.result())
+                    message = asyncio.ensure_future(subscription.get())
+                else:
+                    body = b': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnect.cancel()
+            message.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def reject(self, send, status, message, headers=()):
+        """Answer with an error instead of a stream."""
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'), *headers],
+        })
+        await send({'type': 'http.response.body', 'body': message.encode()})
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client of an ASGI request has disconnected."""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
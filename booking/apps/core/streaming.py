@@ -0,0 +1,104 @@
+"""
+Streaming responses for large exports.
+
+Rows are encoded as they are produced, a batch at a time, so an export
+holds one batch in memory however large it is, and the first bytes reach
+the client before the last row has been read. Batching keeps the number of
+chunks the server writes, and their per-chunk overhead, small.
+
+Django serves a plain StreamingHttpResponse of a synchronous iterator to an
+ASGI server by reading the whole iterator into a list first. The responses
+here advance it one chunk at a time in a worker thread instead, so they
+stream the same under WSGI and ASGI.
+"""
+import csv
+import io
+import itertools
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+BATCH_SIZE = 2000
+# zlib window bits selecting the gzip container
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class StreamingResponse(StreamingHttpResponse):
+    """
+    A StreamingHttpResponse that streams synchronous iterators to ASGI servers.
+
+    Each chunk is produced by a thread-sensitive ``sync_to_async`` call,
+    which runs in the thread the request's synchronous code runs in, so an
+    iterator reading from a database cursor keeps using its connection.
+    """
+
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in super().__aiter__():
+                yield part
+            return
+        parts = iter(self.streaming_content)
+        end = object()
+        while True:
+            part = await sync_to_async(next, thread_sensitive=True)(parts, end)
+            if part is end:
+                return
+            yield part
+
+
+def csv_chunks(rows, header=None, batch_size=BATCH_SIZE):
+    """Yield the CSV encoding of the header, if any, and the rows, a batch of rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    rows = iter(rows)
+    while True:
+        writer.writerows(itertools.islice(rows, batch_size))
+        chunk = buffer.getvalue()
+        if not chunk:
+            return
+        yield chunk
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_chunks(objects, batch_size=BATCH_SIZE):
+    """Yield the NDJSON encoding of some JSON-serialisable objects, a batch per chunk."""
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    objects = iter(objects)
+    while batch := list(itertools.islice(objects, batch_size)):
+        yield ''.join(f'{encode(obj)}\n' for obj in batch)
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress text or byte chunks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        # The compressor buffers small inputs; skip the empty outputs
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_response(chunks, content_type, filename, compress=False):
+    """
+    Return a streaming attachment of some chunks, optionally gzipped.
+
+    The response asks reverse proxies not to buffer it, so the download
+    starts right away and the proxy's disk is not filled with it.
+    """
+    if compress:
+        chunks, content_type, filename = gzip_chunks(chunks), 'application/gzip', f'{filename}.gz'
+    response = StreamingResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def csv_response(rows, filename, header=None, compress=False):
+    """Return a streaming CSV attachment of some rows."""
+    return streaming_response(csv_chunks(rows, header), 'text/csv; charset=utf-8', filename, compress)
@@ -0,0 +1,232 @@
+"""
+Tests for the core app.
+"""
+import asyncio
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.testing import ApplicationCommunicator
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from booking.apps.core import instrumentation, pubsub
+from booking.apps.core.instrumentation import QueryStats, get_budget, query_budget
+from booking.apps.core.sse import EventStream
+from booking.apps.core.streaming import StreamingResponse
+from booking.apps.facilities.models import Facility
+from booking.apps.facilities.views import FacilityAvailabilityView, FacilityDetailView
+from booking.celery import SharedLiveEvents
+
+User = get_user_model()
+
+
+class QueryInstrumentationTest(TestCase):
+    """Test the query counters, the middleware and the budget registry."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.facility = Facility.objects.create(name="Test Facility", location="Here", capacity=10)
+        self.url = reverse('facilities:facility_detail', args=[self.facility.pk])
+
+    def test_stats_count_statements_and_duplicates(self):
+        """Test that repeated statements are counted as duplicates."""
+        stats = QueryStats()
+        with stats.record():
+            for pk in range(3):
+                list(Facility.objects.filter(pk=pk))
+            Facility.objects.count()
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.duplicates, 2)
+        self.assertEqual(stats.most_repeated()[1], 3)
+        self.assertGreater(stats.duration, 0)
+        # The wrapper is removed afterwards
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_middleware_reports_server_timing_and_logs(self):
+        """Test that a request gets a Server-Timing header and a log line."""
+        with self.assertLogs('booking.queries', 'INFO') as logs:
+            response = self.client.get(self.url)
+        stats = response.wsgi_request.query_stats
+        self.assertEqual(response['Server-Timing'].split(';')[0], 'db')
+        self.assertIn(f'desc="{stats.count} queries"', response['Server-Timing'])
+        self.assertIn('view=booking.apps.facilities.views.FacilityDetailView', logs.output[0])
+        self.assertIn(f'queries={stats.count} ', logs.output[0])
+        self.assertEqual(logs.records[0].query_stats['budget'], get_budget(FacilityDetailView))
+
+    async def test_async_requests_are_recorded(self):
+        """Test that the queries of an async view served over ASGI are counted."""
+        with self.assertLogs('booking.queries', 'INFO') as logs:
+            response = await self.async_client.get(reverse('facilities:facility_availability'), {
+                'available_from': '2030-01-01T10:00', 'available_to': '2030-01-01T12:00',
+            })
+        self.assertEqual(response.json()['results'][0]['id'], self.facility.pk)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('view=booking.apps.facilities.views.FacilityAvailabilityView', logs.output[0])
+        self.assertEqual(logs.records[0].query_stats['budget'], get_budget(FacilityAvailabilityView))
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @override_settings(QUERY_INSTRUMENTATION_SERVER_TIMING=False)
+    def test_server_timing_can_be_switched_off(self):
+        """Test that the header is optional."""
+        self.assertNotIn('Server-Timing', self.client.get(self.url))
+
+    def test_over_budget_is_a_warning(self):
+        """Test that exceeding a view's budget is logged as a warning."""
+        with mock.patch.dict(instrumentation._budgets):
+            query_budget(0)(FacilityDetailView)
+            with self.assertLogs('booking.queries', 'WARNING') as logs:
+                self.client.get(self.url)
+        self.assertIn('over_budget=True', logs.output[0])
+        self.assertEqual(get_budget(FacilityDetailView), 5)
+
+    def test_celery_task_is_recorded(self):
+        """Test that the task signal handlers record and log a task's queries."""
+        task = mock.Mock()
+        task.name = 'bookings.test_task'
+        with self.assertLogs('booking.queries', 'INFO') as logs:
+            instrumentation.task_started(task_id='abc', task=task)
+            Facility.objects.count()
+            instrumentation.task_finished(task_id='abc', task=task, state='SUCCESS')
+        self.assertIn('task=bookings.test_task', logs.output[0])
+        self.assertIn('queries=1 ', logs.output[0])
+        self.assertEqual(connection.execute_wrappers, [])
+
+
+class StreamingResponseTest(TestCase):
+    """Test the streaming response served to ASGI servers."""
+
+    async def test_sync_chunks_are_streamed_one_at_a_time(self):
+        """Test that a synchronous iterator is advanced as the chunks are sent, not read up front."""
+        produced = []
+
+        def chunks():
+            for number in range(3):
+                produced.append(number)
+                yield f'chunk {number}\n'
+
+        response = StreamingResponse(chunks(), content_type='text/plain')
+        parts = response.__aiter__()
+        self.assertEqual(await parts.__anext__(), b'chunk 0\n')
+        self.assertEqual(produced, [0])
+        self.assertEqual([part async for part in parts], [b'chunk 1\n', b'chunk 2\n'])
+
+
+class PubSubTest(TestCase):
+    """Test the pub/sub brokers."""
+
+    async def test_subscribers_falling_behind_are_dropped(self):
+        """Test that a subscriber whose queue is full is closed rather than blocking publishers."""
+        broker = pubsub.MemoryBroker()
+        with broker.subscribe(['slow']) as slow, broker.subscribe(['other']) as other:
+            for number in range(pubsub.QUEUE_SIZE + 1):
+                broker.publish('slow', {'number': number})
+            broker.publish('other', {'number': 0})
+            await asyncio.sleep(0)
+            self.assertIsNone(await slow.get())
+            self.assertEqual(await other.get(), {'number': 0})
+            self.assertEqual(set(broker.subscribers), {'other'})
+        self.assertEqual(broker.subscribers, {})
+
+    def test_workers_refuse_the_memory_broker(self):
+        """Test that Celery workers only start with the memory broker when they run one process."""
+        with override_settings(LIVE_EVENTS_URL='memory://'):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'point it at Redis'):
+                SharedLiveEvents(mock.Mock(concurrency=4))
+            with self.assertLogs('booking.celery', 'WARNING'):
+                SharedLiveEvents(mock.Mock(concurrency=1))
+        with override_settings(LIVE_EVENTS_URL='redis://redis:6379/2'):
+            SharedLiveEvents(mock.Mock(concurrency=4))
+
+
+async def no_application(scope, receive, send):
+    raise AssertionError('The stream should have answered')
+
+
+class EventStreamTest(TestCase):
+    """Test the server-sent events served from ASGI."""
+
+    def communicator(self, path='/events/', method='GET', application=no_application):
+        """Return a communicator for a request to a stream following the ``test`` channel."""
+        async def get_channels(scope):
+            return ['test']
+
+        stream = EventStream(application, '/events/', get_channels, heartbeat=0.05, retry=1000)
+        return ApplicationCommunicator(stream, {
+            'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': [],
+        })
+
+    async def test_messages_and_heartbeats_are_streamed(self):
+        """Test that published messages and keep-alive comments are sent until the client leaves."""
+        communicator = self.communicator()
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual((await communicator.receive_output(1))['body'], b'retry: 1000\n\n')
+
+        pubsub.get_broker().publish('test', {'event': 'greeting', 'data': {'text': 'hello'}})
+        self.assertEqual(
+            (await communicator.receive_output(1))['body'], b'event: greeting\ndata: {"text": "hello"}\n\n',
+        )
+        self.assertEqual((await communicator.receive_output(1))['body'], b': keep-alive\n\n')
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+        self.assertNotIn('test', pubsub.get_broker().subscribers)
+
+    async def test_other_requests_are_passed_on(self):
+        """Test that other paths reach the wrapped application and other methods are refused."""
+        async def application(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        communicator = self.communicator(path='/facilities/', application=application)
+        await communicator.send_input({'type': 'http.request'})
+        self.assertEqual((await communicator.receive_output(1))['status'], 204)
+
+        communicator = self.communicator(method='POST')
+        await communicator.send_input({'type': 'http.request'})
+        self.assertEqual((await communicator.receive_output(1))['status'], 405)
+
+
+class CreateTrigramIndexesTest(TestCase):
+    """Test the command building the trigram indexes skipped by migrate."""
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram indexes need PostgreSQL')
+    @mock.patch('booking.apps.core.management.commands.create_trigram_indexes.ensure_trigram_indexes')
+    def test_command(self, ensure_trigram_indexes):
+        """Test that the command reports whether the indexes could be built."""
+        ensure_trigram_indexes.return_value = True
+        stdout = StringIO()
+        call_command('create_trigram_indexes', stdout=stdout)
+        self.assertIn('in place', stdout.getvalue())
+        ensure_trigram_indexes.return_value = False
+        with self.assertRaises(CommandError):
+            call_command('create_trigram_indexes', stdout=StringIO())
+
+
+class BenchmarkAPITest(LiveServerTestCase):
+    """Test the command loading a running server with read requests."""
+
+    def test_command(self):
+        """Test that the command signs in, requests the paths and reports the statuses."""
+        User.objects.create_user(username='bench', password='password123')
+        Facility.objects.create(name="Test Facility", location="Here", capacity=10)
+        stdout = StringIO()
+        call_command(
+            'benchmark_api', '/api/v1/facilities/', '/api/v1/bookings/',
+            url=self.live_server_url, concurrency=2, duration=0.5, user='bench', stdout=stdout,
+        )
+        self.assertIn('req/s', stdout.getvalue())
+        self.assertIn('statuses {200:', stdout.getvalue())
+
+    def test_unknown_user(self):
+        """Test that an unknown user is refused before any request."""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', url=self.live_server_url, user='nobody', stdout=StringIO())
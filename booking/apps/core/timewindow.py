@@ -0,0 +1,48 @@
+"""
+Half-open time windows for date filters.
+
+Filtering with ``start_time__date`` casts the column to a date in SQL, which
+hides it from its indexes and turns the filter into a sequential scan. The
+helpers here convert local dates into ``[start, end)`` instants instead, so
+date filters become plain range conditions on the indexed column.
+"""
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def local_midnight(day, tz=None):
+    """Return the aware instant a local day starts at."""
+    tz = tz or timezone.get_current_timezone()
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz)
+
+
+def day_window(first_day, last_day=None, tz=None):
+    """
+    Return the half-open ``(start, end)`` instants covering whole local days.
+
+    Args:
+        first_day: First day of the window.
+        last_day: Last day of the window (inclusive), defaults to ``first_day``.
+        tz: Timezone the days are expressed in, such as the user's or the
+            facility's; defaults to the current timezone.
+    """
+    last_day = last_day or first_day
+    return local_midnight(first_day, tz), local_midnight(last_day + datetime.timedelta(days=1), tz)
+
+
+def date_range_filter(field, date_from=None, date_to=None, tz=None):
+    """
+    Build a sargable filter for a datetime field falling on a range of local days.
+
+    Either end may be omitted to leave the range open on that side.
+
+    Returns a Q object such as ``field >= start AND field < end``.
+    """
+    conditions = {}
+    if date_from:
+        conditions[f'{field}__gte'] = local_midnight(date_from, tz)
+    if date_to:
+        conditions[f'{field}__lt'] = local_midnight(date_to + datetime.timedelta(days=1), tz)
+    return Q(**conditions)
@@ -10,3 +10,7 @@ class FacilitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking.apps.facilities'
     verbose_name = _('Facilities')
+    
+    def ready(self):
+        """Connect signal handlers."""
+        from booking.apps.facilities import signals  # noqa: F401
@@ -0,0 +1,213 @@
+"""
+Slot engine for facility availability.
+
+Free time is computed with array-based interval arithmetic: the confirmed
+bookings of a facility are loaded with a single range query, merged into
+disjoint busy blocks and subtracted from the daily opening windows without
+a Python loop per booking or per slot.
+"""
+import datetime
+
+import numpy as np
+from django.utils import timezone
+
+DEFAULT_SLOT_DURATION = datetime.timedelta(hours=1)
+
+# Timestamps are handled as integer microseconds since the epoch so that
+# the arithmetic is exact and the arrays stay in a single int64 dtype.
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_micros(values):
+    """Convert an iterable of aware datetimes to an int64 array of epoch microseconds."""
+    return np.fromiter(((value - EPOCH) // MICROSECOND for value in values), dtype=np.int64)
+
+
+def from_micros(values, tz=None):
+    """Convert an array of epoch microseconds back to aware datetimes."""
+    tz = tz or timezone.get_current_timezone()
+    return [
+        timezone.localtime(EPOCH + datetime.timedelta(microseconds=int(value)), tz)
+        for value in values
+    ]
+
+
+def opening_windows(facility, start_date, end_date, tz=None):
+    """
+    Return the opening windows of a facility between two dates (inclusive).
+
+    A facility without opening hours is open all day. A closing time at or
+    before the opening time means the facility closes on the following day.
+    Returns two int64 arrays of window starts and ends.
+    """
+    tz = tz or timezone.get_current_timezone()
+    opening = facility.opening_time or datetime.time.min
+    closing = facility.closing_time
+    overnight = closing is None or closing <= opening
+
+    starts, ends = [], []
+    day = start_date
+    while day <= end_date:
+        close_day = day + datetime.timedelta(days=1) if overnight else day
+        starts.append(timezone.make_aware(datetime.datetime.combine(day, opening), tz))
+        ends.append(timezone.make_aware(
+            datetime.datetime.combine(close_day, closing or datetime.time.min), tz
+        ))
+        day += datetime.timedelta(days=1)
+    return to_micros(starts), to_micros(ends)
+
+
+def merge_intervals(starts, ends):
+    """
+    Merge possibly overlapping intervals into sorted, disjoint blocks.
+
+    Touching intervals are merged as well, so the gaps between the returned
+    blocks always have a positive length.
+    """
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    # A new block begins wherever a start lies beyond every end seen so far
+    block_start = np.empty(len(starts), dtype=bool)
+    block_start[0] = True
+    block_start[1:] = starts[1:] > running_end[:-1]
+    first = np.flatnonzero(block_start)
+    last = np.append(first[1:] - 1, len(starts) - 1)
+    return starts[first], running_end[last]
+
+
+def expand_ranges(lo, hi):
+    """Return (owner, index) arrays enumerating every index in each [lo, hi) range."""
+    counts = np.maximum(hi - lo, 0)
+    owner = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, lo[owner] + offsets
+
+
+def subtract_intervals(window_starts, window_ends, busy_starts, busy_ends):
+    """
+    Subtract disjoint sorted busy blocks from disjoint sorted windows.
+
+    Returns the remaining free intervals as two int64 arrays.
+    """
+    # The gaps between busy blocks, open-ended on both sides
+    lowest, highest = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+    gap_starts = np.concatenate(([lowest], busy_ends))
+    gap_ends = np.concatenate((busy_starts, [highest]))
+
+    # Each window intersects a contiguous run of gaps
+    lo = np.searchsorted(gap_ends, window_starts, side='right')
+    hi = np.searchsorted(gap_starts, window_ends, side='left')
+    window, gap = expand_ranges(lo, hi)
+
+    free_starts = np.maximum(window_starts[window], gap_starts[gap])
+    free_ends = np.minimum(window_ends[window], gap_ends[gap])
+    keep = free_ends > free_starts
+    return free_starts[keep], free_ends[keep]
+
+
+def slot_grid(window_starts, window_ends, step):
+    """Return the start of every whole slot of length ``step`` inside the windows."""
+    counts = (window_ends - window_starts) // step
+    window, index = expand_ranges(np.zeros_like(counts), counts)
+    return window_starts[window] + index * step
+
+
+def free_slots(slot_starts, step, busy_starts, busy_ends):
+    """Return the slot starts that do not overlap any busy block."""
+    slot_ends = slot_starts + step
+    # First busy block ending after each slot starts; it overlaps the slot
+    # exactly when it also starts before the slot ends.
+    index = np.searchsorted(busy_ends, slot_starts, side='right')
+    candidate = np.minimum(index, max(len(busy_starts) - 1, 0))
+    if len(busy_starts):
+        overlaps = (index < len(busy_starts)) & (busy_starts[candidate] < slot_ends)
+    else:
+        overlaps = np.zeros(len(slot_starts), dtype=bool)
+    return slot_starts[~overlaps]
+
+
+def load_busy_blocks(facility, range_start, range_end):
+    """Load confirmed bookings overlapping a time range as merged busy blocks."""
+    from booking.apps.bookings.models import Booking
+
+    rows = list(
+        Booking.objects.filter(
+            facility=facility,
+            status='confirmed',
+            start_time__lt=range_end,
+            end_time__gt=range_start,
+        ).values_list('start_time', 'end_time')
+    )
+    starts = to_micros(row[0] for row in rows)
+    ends = to_micros(row[1] for row in rows)
+    return merge_intervals(starts, ends)
+
+
+def _windows_and_busy(facility, start_date, end_date, tz):
+    """Compute the opening windows for a date range and the busy blocks inside them."""
+    window_starts, window_ends = opening_windows(facility, start_date, end_date, tz)
+    range_start = EPOCH + datetime.timedelta(microseconds=int(window_starts.min()))
+    range_end = EPOCH + datetime.timedelta(microseconds=int(window_ends.max()))
+    busy_starts, busy_ends = load_busy_blocks(facility, range_start, range_end)
+    return window_starts, window_ends, busy_starts, busy_ends
+
+
+def get_free_intervals(facility, start_date, end_date=None, tz=None):
+    """
+    Return the free intervals of a facility between two dates (inclusive).
+
+    Args:
+        facility: The facility to inspect.
+        start_date: First day of the range.
+        end_date: Last day of the range, defaults to ``start_date``.
+        tz: Timezone the opening hours are expressed in, defaults to the
+            current timezone.
+
+    Returns:
+        A list of ``(start, end)`` tuples of aware datetimes.
+    """
+    end_date = end_date or start_date
+    if end_date < start_date:
+        return []
+    window_starts, window_ends, busy_starts, busy_ends = _windows_and_busy(
+        facility, start_date, end_date, tz
+    )
+    free_starts, free_ends = subtract_intervals(window_starts, window_ends, busy_starts, busy_ends)
+    return list(zip(from_micros(free_starts, tz), from_micros(free_ends, tz)))
+
+
+def get_available_slots(facility, start_date, end_date=None, slot_duration=None, tz=None):
+    """
+    Return the bookable slots of a facility between two dates (inclusive).
+
+    Slots are laid out back to back from the opening time of each day and a
+    slot is available when it does not overlap any confirmed booking.
+
+    Args:
+        facility: The facility to inspect.
+        start_date: First day of the range.
+        end_date: Last day of the range, defaults to ``start_date``.
+        slot_duration: Length of a slot as a timedelta, defaults to one hour.
+        tz: Timezone the opening hours are expressed in, defaults to the
+            current timezone.
+
+    Returns:
+        A list of ``(start, end)`` tuples of aware datetimes.
+    """
+    end_date = end_date or start_date
+    slot_duration = slot_duration or DEFAULT_SLOT_DURATION
+    if end_date < start_date:
+        return []
+    if slot_duration <= datetime.timedelta(0):
+        raise ValueError('slot_duration must be positive.')
+    step = slot_duration // MICROSECOND
+
+    window_starts, window_ends, busy_starts, busy_ends = _windows_and_busy(
+        facility, start_date, end_date, tz
+    )
+    slot_starts = free_slots(slot_grid(window_starts, window_ends, step), step, busy_starts, busy_ends)
+    return list(zip(from_micros(slot_starts, tz), from_micros(slot_starts + step, tz)))
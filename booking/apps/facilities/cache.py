@@ -0,0 +1,111 @@
+"""
+Cached data for the public facility pages.
+
+Only data that is the same for every visitor is cached: facility rows, list
+pages, occupancy heatmaps and badges. Templates still render the per-user
+parts of the page around them, and staff-only data is never cached.
+
+Every facility has a version, bumped when the facility or the confirmed
+time of one of its bookings changes, and the list has its own version,
+bumped when any facility changes. Pages filtered by availability depend on
+every booking and are not cached.
+"""
+from django.conf import settings
+
+from booking.apps.core.cache import bump_version, get_or_build, get_version, get_versions, make_key
+
+FACILITY = 'facility'
+FACILITY_LIST = 'facility-list'
+
+
+def get_timeout():
+    """Return how long cached facility data lives at most, in seconds."""
+    return getattr(settings, 'FACILITY_CACHE_TIMEOUT', 300)
+
+
+def invalidate_facilities(*facility_ids, list_changed=False):
+    """Invalidate the cached data of some facilities and, optionally, of the list."""
+    if facility_ids:
+        bump_version(FACILITY, *facility_ids)
+    if list_changed:
+        bump_version(FACILITY_LIST)
+
+
+def get_facility(pk):
+    """
+    Return a facility by primary key.
+
+    Raises Facility.DoesNotExist like ``Facility.objects.get``.
+    """
+    from booking.apps.facilities.models import Facility
+
+    key = make_key(FACILITY, pk, get_version(FACILITY, pk))
+    return get_or_build(key, lambda: Facility.objects.get(pk=pk), get_timeout())
+
+
+def get_month_heatmap(facility_id, year, month):
+    """Return ``occupancy.month_heatmap`` for a facility."""
+    from booking.apps.bookings import occupancy
+
+    key = make_key('facility-heatmap', facility_id, get_version(FACILITY, facility_id), year, month)
+    return get_or_build(key, lambda: occupancy.month_heatmap(facility_id, year, month), get_timeout())
+
+
+def get_booking_state(facility_id):
+    """
+    Return ``(last_modified, count)`` of a facility's bookings.
+
+    Used to validate cached copies of the facility page: any change to a
+    confirmed booking bumps the facility version and recomputes it.
+    """
+    from django.db.models import Count, Max
+
+    from booking.apps.bookings.models import Booking
+
+    def build():
+        state = Booking.objects.filter(facility_id=facility_id).aggregate(
+            last_modified=Max('updated_at'), count=Count('pk'),
+        )
+        return state['last_modified'], state['count']
+
+    key = make_key('facility-booking-state', facility_id, get_version(FACILITY, facility_id))
+    return get_or_build(key, build, get_timeout())
+
+
+def get_busy_now(facility_ids):
+    """Return ``occupancy.busy_at`` for some facilities at the current slot."""
+    from django.utils import timezone
+
+    from booking.apps.bookings import occupancy
+
+    day, slot = occupancy.slot_of(timezone.now())
+    versions = get_versions(FACILITY, facility_ids)
+    key = make_key('facility-busy', day, slot, *(f'{pk}.{version}' for pk, version in sorted(versions.items())))
+    # A slot lasts a few minutes, so a short timeout is enough
+    return get_or_build(key, lambda: occupancy.busy_at(facility_ids), occupancy.SLOT_MINUTES * 60)
+
+
+def get_list_page(params, build):
+    """
+    Return a cached page of the facility list.
+
+    Args:
+        params: The query parameters selecting the page, such as the
+            request's GET.
+        build: Callable computing the page on a miss.
+    """
+    items = sorted((name, value) for name in params for value in params.getlist(name))
+    key = make_key('facility-list-page', get_version(FACILITY_LIST), *(f'{name}={value}' for name, value in items))
+    return get_or_build(key, build, get_timeout())
+
+
+def get_active_facility_choices():
+    """Return ``(pk, name)`` of the active facilities, by name, for select fields."""
+    from booking.apps.facilities.models import Facility
+
+    key = make_key('facility-choices', get_version(FACILITY_LIST))
+    return get_or_build(
+        key,
+        lambda: list(Facility.objects.filter(is_active=True).order_by('name', 'pk').values_list('pk', 'name')),
+        get_timeout(),
+    )
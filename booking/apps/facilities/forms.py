@@ -9,6 +9,11 @@ from booking.apps.facilities.models import Facility
 
 class FacilityFilterForm(forms.Form):
     """Form for filtering facilities."""
+    q = forms.CharField(
+        label=_('Search'),
+        required=False,
+        widget=forms.TextInput(attrs={'placeholder': _('Search facilities')})
+    )
     name = forms.CharField(
         label=_('Name'), 
         required=False,
@@ -25,19 +30,60 @@ class FacilityFilterForm(forms.Form):
         min_value=1,
         widget=forms.NumberInput(attrs={'placeholder': _('Min capacity')})
     )
+    available_from = forms.DateTimeField(
+        label=_('Available From'),
+        required=False,
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M')
+    )
+    available_to = forms.DateTimeField(
+        label=_('Available To'),
+        required=False,
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M')
+    )
+    
+    def clean(self):
+        """Validate the availability time range."""
+        cleaned_data = super().clean()
+        available_from = cleaned_data.get('available_from')
+        available_to = cleaned_data.get('available_to')
+        
+        if bool(available_from) != bool(available_to):
+            raise forms.ValidationError(_('Please provide both ends of the availability period.'))
+        if available_from and available_to <= available_from:
+            raise forms.ValidationError(_('End time must be after start time.'))
+        
+        return cleaned_data
+    
+    def has_time_range(self):
+        """Return whether an availability period was requested."""
+        return bool(self.cleaned_data.get('available_from'))
+    
+    def get_ordering(self):
+        """Return the unique ordering of the results; a search puts the best matches first."""
+        if self.cleaned_data.get('q'):
+            return ('-rank', 'name', 'id')
+        return ('name', 'id')
     
     def filter_queryset(self, queryset):
         """Filter the queryset based on form data."""
+        q = self.cleaned_data.get('q')
         name = self.cleaned_data.get('name')
         location = self.cleaned_data.get('location')
         min_capacity = self.cleaned_data.get('min_capacity')
+        available_from = self.cleaned_data.get('available_from')
+        available_to = self.cleaned_data.get('available_to')
         
+        if q:
+            queryset = queryset.search(q)
+        # Substring filters are served by the trigram indexes where available
         if name:
             queryset = queryset.filter(name__icontains=name)
         if location:
             queryset = queryset.filter(location__icontains=location)
         if min_capacity:
             queryset = queryset.filter(capacity__gte=min_capacity)
+        if available_from and available_to:
+            queryset = queryset.available_between(available_from, available_to)
             
         return queryset
 
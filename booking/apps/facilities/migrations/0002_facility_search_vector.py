@@ -0,0 +1,47 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:40
+
+import booking.apps.core.postgres
+import django.contrib.postgres.search
+from django.db import migrations
+
+from booking.apps.core.postgres import AddIndexConcurrently
+from booking.apps.core.search import SearchSpec, backfill_search_vectors, create_search_trigger, drop_search_trigger
+
+TABLE = 'facilities_facility'
+SPEC = SearchSpec({'name': 'A', 'location': 'B', 'description': 'C'})
+
+
+def create_trigger(apps, schema_editor):
+    create_search_trigger(schema_editor, TABLE, SPEC)
+
+
+def drop_trigger(apps, schema_editor):
+    drop_search_trigger(schema_editor, TABLE, SPEC)
+
+
+def backfill(apps, schema_editor):
+    backfill_search_vectors(schema_editor, TABLE, SPEC)
+
+
+class Migration(migrations.Migration):
+    # Existing rows are backfilled in batches and the GIN index is built
+    # concurrently, neither of which may run inside one transaction.
+    atomic = False
+
+    dependencies = [
+        ('facilities', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facility',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='facility',
+            index=booking.apps.core.postgres.GinIndex(fields=['search_vector'], name='facilities_search_idx'),
+        ),
+    ]
@@ -1,9 +1,32 @@
 """
 Facility models for the booking project.
 """
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from booking.apps.core.postgres import GinIndex
+from booking.apps.core.search import SearchSpec, full_text_filter, ranked
+
+
+class FacilityQuerySet(models.QuerySet):
+    """QuerySet for the Facility model."""
+    
+    def available_between(self, start_time, end_time):
+        """
+        Filter facilities without confirmed bookings overlapping a time range.
+        
+        A single anti-join whose range expressions match the bookings overlap
+        exclusion constraint, so the lookup is served by its GiST index.
+        """
+        from booking.apps.bookings.models import confirmed_overlaps
+        conflicts = confirmed_overlaps(models.OuterRef('pk'), start_time, end_time)
+        return self.filter(~models.Exists(conflicts))
+    
+    def search(self, term):
+        """Filter facilities matching a full-text search term, best matches first."""
+        return ranked(full_text_filter(self, term, Facility.search_spec), term, Facility.search_spec)
+
 
 class Facility(models.Model):
     """
@@ -24,6 +47,12 @@ class Facility(models.Model):
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
     
+    # Full-text search, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+    search_spec = SearchSpec({'name': 'A', 'location': 'B', 'description': 'C'})
+    
+    objects = FacilityQuerySet.as_manager()
+    
     class Meta:
         """Meta options for the Facility model."""
         verbose_name = _('facility')
@@ -31,34 +60,50 @@ class Facility(models.Model):
         ordering = ['name']
         # Database optimization - add indexes
         indexes = [
-            models.Index(fields=['name']),
-            models.Index(fields=['is_active']),
-            models.Index(fields=['location']),
+            models.Index(fields=['name'], name='facilities__name_07d060_idx'),
+            models.Index(fields=['is_active'], name='facilities__is_acti_edaa96_idx'),
+            models.Index(fields=['location'], name='facilities__locatio_b27b9d_idx'),
+            GinIndex(fields=['search_vector'], name='facilities_search_idx'),
         ]
     
     def __str__(self):
         """Return string representation."""
         return self.name
     
-    def get_available_slots(self, date):
+    def get_available_slots(self, date, end_date=None, slot_duration=None):
+        """
+        Get available time slots between ``date`` and ``end_date`` (inclusive).
+        Returns a list of ``(start, end)`` tuples of ``slot_duration`` length
+        (one hour by default) within the opening hours.
+        """
+        from booking.apps.facilities.availability import get_available_slots
+        return get_available_slots(self, date, end_date, slot_duration)
+    
+    def get_free_intervals(self, date, end_date=None):
         """
-        Get available time slots for a specific date.
-        This is a placeholder method that will be implemented with actual business logic.
+        Get the free intervals between ``date`` and ``end_date`` (inclusive)
+        as a list of ``(start, end)`` tuples within the opening hours.
         """
-        # This would be implemented to check bookings and return available slots
-        return []
+        from booking.apps.facilities.availability import get_free_intervals
+        return get_free_intervals(self, date, end_date)
     
     def is_available(self, start_time, end_time):
         """
         Check if facility is available for a given time range.
         """
-        from booking.apps.bookings.models import Booking
+        from booking.apps.bookings import interval_index, occupancy
+        from booking.apps.bookings.models import confirmed_overlaps
+        # Answer from the in-process interval index when it is enabled
+        overlap = interval_index.has_overlap(self.pk, start_time, end_time)
+        if overlap is not None:
+            return not overlap
+        # Then from the occupancy bitmaps, unless the range only shares a
+        # partially covered slot with a booking
+        if occupancy.is_enabled():
+            free = occupancy.is_free(self.pk, start_time, end_time)
+            if free is not None:
+                return free
         # Check if there are any overlapping bookings
-        overlapping_bookings = Booking.objects.filter(
-            facility=self,
-            status='confirmed',
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        ).exists()
+        overlapping_bookings = confirmed_overlaps(self.pk, start_time, end_time).exists()
         
         return not overlapping_bookings
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Signal handlers for the facilities app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from booking.apps.facilities import cache as facility_cache
+from booking.apps.facilities.models import Facility
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+def invalidate_facility_cache(sender, instance, using, **kwargs):
+    """
+    Invalidate the cached data of a facility and of the list.
+
+    The versions are bumped right away and again once the change is
+    committed, so that a page cached from the old rows in between does not
+    survive the commit.
+    """
+    facility_id = instance.pk
+    facility_cache.invalidate_facilities(facility_id, list_changed=True)
+    transaction.on_commit(
+        lambda: facility_cache.invalidate_facilities(facility_id, list_changed=True), using=using
+    )
@@ -1,13 +1,24 @@
 """
 Tests for the facilities app.
 """
+import datetime
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from booking.apps.bookings.models import Booking
+from booking.apps.bookings.tests import create_booking
+from booking.apps.core.instrumentation import get_budget
+from booking.apps.facilities.availability import merge_intervals
 from booking.apps.facilities.models import Facility
 from booking.apps.facilities.forms import FacilityFilterForm, FacilityForm
+from booking.apps.facilities.views import FacilityDetailView, FacilityListView
 
 User = get_user_model()
 
@@ -39,6 +50,90 @@ class FacilityModelTest(TestCase):
         self.assertEqual(str(self.facility), "Test Facility")
 
 
+class FacilityAvailableSlotsTest(TestCase):
+    """Test the facility slot engine."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.facility = Facility.objects.create(
+            name="Test Facility",
+            location="Test Location",
+            capacity=10,
+            opening_time=datetime.time(9, 0),
+            closing_time=datetime.time(17, 0),
+        )
+        self.day = timezone.localdate() + datetime.timedelta(days=7)
+
+    def at(self, hour, minute=0, day=None):
+        """Return an aware datetime on the test day."""
+        return timezone.make_aware(
+            datetime.datetime.combine(day or self.day, datetime.time(hour, minute))
+        )
+
+    def book(self, start, end, status='confirmed'):
+        """Create a booking for the test facility."""
+        return create_booking(self.user, self.facility, start, end, status)
+
+    def test_empty_day_is_fully_available(self):
+        """Test that a day without bookings yields every slot."""
+        slots = self.facility.get_available_slots(self.day)
+        self.assertEqual(len(slots), 8)
+        self.assertEqual(slots[0], (self.at(9), self.at(10)))
+        self.assertEqual(slots[-1], (self.at(16), self.at(17)))
+
+    def test_confirmed_bookings_block_overlapping_slots(self):
+        """Test that confirmed bookings remove every slot they overlap."""
+        self.book(self.at(10), self.at(11, 30))
+        self.book(self.at(14), self.at(15), status='pending')
+        slots = self.facility.get_available_slots(self.day)
+        self.assertEqual(
+            [start.hour for start, end in slots],
+            [9, 12, 13, 14, 15, 16]
+        )
+
+    def test_free_intervals(self):
+        """Test that free intervals are the opening hours minus busy blocks."""
+        self.book(self.at(10), self.at(11))
+        self.book(self.at(11), self.at(12))
+        self.book(self.at(16), self.at(18))
+        self.assertEqual(
+            self.facility.get_free_intervals(self.day),
+            [(self.at(9), self.at(10)), (self.at(12), self.at(16))]
+        )
+
+    def test_merge_intervals(self):
+        """Test that overlapping, nested and touching intervals merge into disjoint blocks."""
+        # Confirmed bookings cannot overlap in the database, so the merge is checked directly
+        starts, ends = merge_intervals(np.array([16, 10, 11, 10, 30]), np.array([18, 11, 12, 12, 31]))
+        self.assertEqual((starts.tolist(), ends.tolist()), ([10, 16, 30], [12, 18, 31]))
+        starts, ends = merge_intervals(np.array([10, 10]), np.array([15, 12]))
+        self.assertEqual((starts.tolist(), ends.tolist()), ([10], [15]))
+
+    def test_date_range_and_slot_duration(self):
+        """Test that slots span several days with a custom duration."""
+        next_day = self.day + datetime.timedelta(days=1)
+        self.book(self.at(9, day=next_day), self.at(13, day=next_day))
+        slots = self.facility.get_available_slots(
+            self.day, next_day, slot_duration=datetime.timedelta(minutes=30)
+        )
+        self.assertEqual(len(slots), 16 + 8)
+        self.assertEqual(slots[16], (self.at(13, day=next_day), self.at(13, 30, day=next_day)))
+
+    def test_facility_without_opening_hours(self):
+        """Test that a facility without opening hours is open all day."""
+        self.facility.opening_time = None
+        self.facility.closing_time = None
+        self.book(self.at(0), self.at(12))
+        slots = self.facility.get_available_slots(self.day)
+        self.assertEqual(len(slots), 12)
+        self.assertEqual(slots[0][0], self.at(12))
+
+
 class FacilityFormTest(TestCase):
     """Test the Facility form."""
 
@@ -112,6 +207,172 @@ class FacilityListViewTest(TestCase):
         self.assertContains(response, "Facility One")
         self.assertContains(response, "Facility Two")
 
+    def test_paginates_by_name_cursor(self):
+        """Test that facilities with equal names are paged by id without gaps."""
+        for number in range(12):
+            Facility.objects.create(name="Facility Same", location=f"Location {number}", capacity=5)
+        response = self.client.get(self.url)
+        first = response.context['page_obj']
+        self.assertTrue(first.has_next())
+        response = self.client.get(self.url, {'cursor': first.next_cursor})
+        second = response.context['page_obj']
+        self.assertFalse(second.has_next())
+        pks = [facility.pk for facility in list(first) + list(second)]
+        self.assertEqual(pks, list(Facility.objects.order_by('name', 'id').values_list('pk', flat=True)))
+
+
+class FacilityTextSearchTest(TestCase):
+    """Test the indexed text search of facilities."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.hall = Facility.objects.create(
+            name="Conference Hall",
+            location="North Wing",
+            capacity=100,
+            description="Projector and stage",
+        )
+        self.room = Facility.objects.create(
+            name="Meeting Room",
+            location="Hall Building",
+            capacity=8,
+            description="Whiteboard",
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'The search vector is only maintained on PostgreSQL')
+    def test_search_vector_maintained_by_trigger(self):
+        """Test that the search vector is filled on create, bulk create and update."""
+        self.hall.refresh_from_db()
+        self.assertIsNotNone(self.hall.search_vector)
+        Facility.objects.bulk_create([Facility(name="Studio Bulk", location="West", capacity=4)])
+        self.assertEqual(list(Facility.objects.search('studio').values_list('name', flat=True)), ["Studio Bulk"])
+        Facility.objects.filter(pk=self.room.pk).update(description="Piano")
+        self.assertEqual(list(Facility.objects.search('piano')), [self.room])
+
+    def test_search_matches_prefixes_and_all_words(self):
+        """Test that partial words match and every word is required."""
+        self.assertEqual(list(Facility.objects.search('confer')), [self.hall])
+        self.assertEqual(list(Facility.objects.search('meet whiteboard')), [self.room])
+        self.assertFalse(Facility.objects.search('meet projector').exists())
+
+    def test_search_off_postgresql(self):
+        """Test that other databases fall back to substring filters."""
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            self.assertEqual(list(Facility.objects.search('confer')), [self.hall])
+            self.assertFalse(Facility.objects.search('meet projector').exists())
+        self.assertFalse(Facility.objects.search('  ').exists())
+
+    def test_search_ranks_by_field_weight(self):
+        """Test that a name match ranks above a location match."""
+        results = list(Facility.objects.search('hall'))
+        self.assertEqual(results, [self.hall, self.room])
+        self.assertGreater(results[0].rank, results[1].rank)
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            self.assertEqual([(facility, facility.rank) for facility in Facility.objects.search('hall')],
+                             [(self.hall, 1.0), (self.room, 0.4)])
+
+    def test_list_view_filters_by_search(self):
+        """Test that the list view applies the search field."""
+        response = self.client.get(reverse('facilities:facility_list'), {'q': 'stage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['facilities']), [self.hall])
+
+    def test_list_view_pages_by_rank(self):
+        """Test that search results are listed best match first, across pages."""
+        annex = Facility.objects.create(name="Annex", location="Town Hall", capacity=20)
+        url = reverse('facilities:facility_list')
+        results, params = [], {'q': 'hall'}
+        with mock.patch.object(FacilityListView, 'paginate_by', 1):
+            while True:
+                page = self.client.get(url, params).context['page_obj']
+                results.extend(page)
+                if not page.has_next():
+                    break
+                params['cursor'] = page.next_cursor
+        self.assertEqual(results, [self.hall, annex, self.room])
+
+
+class FacilityAvailabilitySearchTest(TestCase):
+    """Test searching for facilities free during a time range."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='password'
+        )
+        self.busy = Facility.objects.create(name="Busy Hall", location="North", capacity=50)
+        self.free = Facility.objects.create(name="Free Hall", location="North", capacity=50)
+        self.small = Facility.objects.create(name="Small Room", location="South", capacity=2)
+        self.start = (timezone.now() + timezone.timedelta(days=2)).replace(second=0, microsecond=0)
+        self.end = self.start + timezone.timedelta(hours=2)
+        for facility, status in ((self.busy, 'confirmed'), (self.free, 'pending')):
+            Booking.objects.create(
+                user=self.user,
+                facility=facility,
+                title="Booking",
+                start_time=self.start,
+                end_time=self.end,
+                status=status,
+            )
+        self.params = {
+            'available_from': self.start.strftime('%Y-%m-%dT%H:%M'),
+            'available_to': self.end.strftime('%Y-%m-%dT%H:%M'),
+            'min_capacity': 10,
+        }
+
+    def test_queryset_excludes_booked_facilities(self):
+        """Test that facilities with overlapping confirmed bookings are excluded."""
+        available = Facility.objects.available_between(self.start, self.end)
+        self.assertEqual(set(available), {self.free, self.small})
+        later = Facility.objects.available_between(self.end, self.end + timezone.timedelta(hours=1))
+        self.assertEqual(later.count(), 3)
+
+    def test_list_view_filters_by_availability(self):
+        """Test that the list view applies the availability filter."""
+        response = self.client.get(reverse('facilities:facility_list'), self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['facilities']), [self.free])
+
+    def test_form_requires_both_ends(self):
+        """Test that a half-open availability period is rejected."""
+        form = FacilityFilterForm({'available_from': self.params['available_from']})
+        self.assertFalse(form.is_valid())
+
+    def test_json_endpoint(self):
+        """Test the JSON availability endpoint."""
+        url = reverse('facilities:facility_availability')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, self.params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['results']], [self.free.pk])
+        self.assertFalse(data['has_next'])
+
+    def test_json_endpoint_paginates(self):
+        """Test that the JSON endpoint paginates results."""
+        url = reverse('facilities:facility_availability')
+        params = dict(self.params, min_capacity=1, page_size=1)
+        data = self.client.get(url, params).json()
+        self.assertEqual(data['results'][0]['name'], "Free Hall")
+        self.assertTrue(data['has_next'])
+        self.assertIsNone(data['previous_cursor'])
+        with self.assertNumQueries(1):
+            data = self.client.get(url, dict(params, cursor=data['next_cursor'])).json()
+        self.assertEqual(data['results'][0]['name'], "Small Room")
+        self.assertFalse(data['has_next'])
+        data = self.client.get(url, dict(params, cursor=data['previous_cursor'])).json()
+        self.assertEqual(data['results'][0]['name'], "Free Hall")
+        response = self.client.get(url, dict(params, cursor='garbage'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json()['errors'])
+
+    def test_json_endpoint_requires_time_range(self):
+        """Test that the JSON endpoint rejects requests without a time range."""
+        response = self.client.get(reverse('facilities:facility_availability'))
+        self.assertEqual(response.status_code, 400)
+
 
 class FacilityDetailViewTest(TestCase):
     """Test the facility detail view."""
@@ -146,6 +407,186 @@ class FacilityDetailViewTest(TestCase):
         self.assertContains(response, "10")
         self.assertContains(response, "Test Description")
 
+    def test_staff_sees_upcoming_bookings_within_budget(self):
+        """Test that staff see upcoming bookings without a query per booking."""
+        User.objects.create_user(username='staffuser', password='password', is_staff=True)
+        now = timezone.now()
+        for hours in (-5, 2, 4, 6):
+            Booking.objects.create(
+                user=User.objects.create_user(username=f'user{hours}', password='password'),
+                facility=self.facility,
+                title=f"Booking {hours}",
+                start_time=now + timezone.timedelta(hours=hours),
+                end_time=now + timezone.timedelta(hours=hours + 1),
+            )
+        self.client.login(username='staffuser', password='password')
+        response = self.client.get(self.url)
+        self.assertEqual([booking.title for booking in response.context['upcoming_bookings']],
+                         ["Booking 2", "Booking 4", "Booking 6"])
+        stats = response.wsgi_request.query_stats
+        self.assertLessEqual(stats.count, get_budget(FacilityDetailView))
+        self.assertEqual(stats.duplicates, 0)
+
+
+class FacilityCacheTest(TestCase):
+    """Test the cached facility pages."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.facility = Facility.objects.create(name="Cached Hall", location="North Wing", capacity=10)
+        self.list_url = reverse('facilities:facility_list')
+        self.detail_url = reverse('facilities:facility_detail', args=[self.facility.pk])
+
+    def test_warm_pages_skip_the_database(self):
+        """Test that anonymous list and detail pages are served from the cache."""
+        for url in (self.list_url, self.detail_url):
+            self.client.get(url)
+            response = self.client.get(url)
+            self.assertContains(response, "Cached Hall")
+            self.assertEqual(response.wsgi_request.query_stats.count, 0)
+
+    def test_facility_change_invalidates_pages(self):
+        """Test that saving a facility shows the change on both pages."""
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.facility.name = "Renamed Hall"
+            self.facility.save()
+        self.assertContains(self.client.get(self.list_url), "Renamed Hall")
+        self.assertContains(self.client.get(self.detail_url), "Renamed Hall")
+
+    def test_new_facility_invalidates_list(self):
+        """Test that a new facility appears on the cached list."""
+        self.client.get(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Facility.objects.create(name="Fresh Court", location="South Wing", capacity=4)
+        self.assertContains(self.client.get(self.list_url), "Fresh Court")
+
+    def test_confirmed_booking_invalidates_heatmap(self):
+        """Test that confirming a booking refreshes the cached heatmap."""
+        user = User.objects.create_user(username='booker', password='password')
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        before = self.client.get(self.detail_url).context['occupancy_heatmap']
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                user=user, facility=self.facility, title="Meeting",
+                start_time=start, end_time=start + timezone.timedelta(hours=1), status='confirmed',
+            )
+        after = self.client.get(self.detail_url).context['occupancy_heatmap']
+        self.assertNotEqual(after, before)
+
+    def test_user_specific_parts_are_not_cached(self):
+        """Test that a page cached for one visitor does not leak into another's."""
+        User.objects.create_user(username='firstvisitor', password='password')
+        self.client.login(username='firstvisitor', password='password')
+        self.assertContains(self.client.get(self.detail_url), "firstvisitor")
+        self.client.logout()
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, "Cached Hall")
+        self.assertNotContains(response, "firstvisitor")
+
+
+class FacilityConditionalGetTest(TestCase):
+    """Test ETag and Last-Modified on the facility pages."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.facility = Facility.objects.create(name="Polled Hall", location="East Wing", capacity=10)
+        self.list_url = reverse('facilities:facility_list')
+        self.detail_url = reverse('facilities:facility_detail', args=[self.facility.pk])
+
+    def test_not_modified_without_queries(self):
+        """Test that a current copy gets a 304 straight from the cache."""
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url)
+            self.assertIn('ETag', response)
+            self.assertIn('Last-Modified', response)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.wsgi_request.query_stats.count, 0)
+
+    def test_facility_change_modifies_pages(self):
+        """Test that saving a facility changes the ETag of both pages."""
+        etags = {url: self.client.get(url)['ETag'] for url in (self.list_url, self.detail_url)}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.facility.capacity = 12
+            self.facility.save()
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_confirmed_booking_modifies_detail(self):
+        """Test that confirming a booking changes the detail page's validators."""
+        response = self.client.get(self.detail_url)
+        user = User.objects.create_user(username='booker', password='password')
+        start = timezone.now() + timezone.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                user=user, facility=self.facility, title="Meeting",
+                start_time=start, end_time=start + timezone.timedelta(hours=1), status='confirmed',
+            )
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_availability_search_is_always_built(self):
+        """Test that pages filtered by availability carry no validators."""
+        start = timezone.now() + timezone.timedelta(days=1)
+        response = self.client.get(self.list_url, {
+            'available_from': start.strftime('%Y-%m-%dT%H:%M'),
+            'available_to': (start + timezone.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class FacilityFeedTest(TestCase):
+    """Test the iCalendar feed of a facility."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.facility = Facility.objects.create(name="Polled Hall", location="East Wing", capacity=10)
+        self.user = User.objects.create_user(username='booker', password='password')
+        self.start = (timezone.now() + timezone.timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        self.url = reverse('facilities:facility_feed', args=[self.facility.pk])
+
+    def create_booking(self, hour, status='confirmed'):
+        """Create a one hour booking some hours after the test start."""
+        start = self.start + timezone.timedelta(hours=hour)
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_booking(
+                self.user, self.facility, start, start + timezone.timedelta(hours=1), status, title="Private title",
+            )
+
+    def test_feed_shows_confirmed_bookings_anonymously(self):
+        """Test that the feed lists confirmed bookings without who booked them."""
+        confirmed = self.create_booking(0)
+        self.create_booking(2, status='pending')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:booking-{confirmed.pk}@testserver', content)
+        self.assertIn('SUMMARY:Booked', content)
+        self.assertNotIn('Private title', content)
+
+    def test_repeated_polls_cost_no_queries(self):
+        """Test that a current copy gets a 304 from the cache, until a booking changes."""
+        booking = self.create_booking(0)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.wsgi_request.query_stats.count, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.cancel()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', b''.join(response.streaming_content).decode())
+
+    def test_unknown_facility(self):
+        """Test that the feed of a missing facility is a 404."""
+        self.assertEqual(self.client.get(reverse('facilities:facility_feed', args=[0])).status_code, 404)
+
 
 class FacilityCreateViewTest(TestCase):
     """Test the facility create view."""
@@ -9,7 +9,9 @@ app_name = 'facilities'
 
 urlpatterns = [
     path('', views.FacilityListView.as_view(), name='facility_list'),
+    path('availability/', views.FacilityAvailabilityView.as_view(), name='facility_availability'),
     path('<int:pk>/', views.FacilityDetailView.as_view(), name='facility_detail'),
+    path('<int:pk>/calendar.ics', views.FacilityFeedView.as_view(), name='facility_feed'),
     path('create/', views.FacilityCreateView.as_view(), name='facility_create'),
     path('<int:pk>/update/', views.FacilityUpdateView.as_view(), name='facility_update'),
     path('<int:pk>/delete/', views.FacilityDeleteView.as_view(), name='facility_delete'),
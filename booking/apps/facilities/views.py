@@ -3,22 +3,35 @@ Views for the facilities app.
 """
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import Http404, JsonResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django.views import View
 from django.views.generic import (
     ListView, DetailView, CreateView, UpdateView, DeleteView
 )
 
+from booking.apps.bookings import occupancy
+from booking.apps.bookings.ical import CalendarFeedMixin, facility_feed_events
+from booking.apps.core.conditional import ConditionalGetMixin
+from booking.apps.core.instrumentation import query_budget
+from booking.apps.core.pagination import (
+    CURSOR_PARAM, InvalidCursor, KeysetPage, KeysetPaginationMixin, KeysetPaginator,
+)
+from booking.apps.facilities import cache as facility_cache
 from booking.apps.facilities.forms import FacilityFilterForm, FacilityForm
 from booking.apps.facilities.models import Facility
 
 
-class FacilityListView(ListView):
+@query_budget(5)
+class FacilityListView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
     """View for listing facilities."""
     model = Facility
     context_object_name = 'facilities'
     template_name = 'facilities/facility_list.html'
     paginate_by = 10
+    keyset_ordering = ('name', 'id')
     
     def get_queryset(self):
         """Get filtered queryset."""
@@ -30,18 +43,184 @@ class FacilityListView(ListView):
             
         return queryset
     
+    def get_keyset_ordering(self):
+        """Order searches by rank, and everything else by name."""
+        if self.form.is_valid():
+            return self.form.get_ordering()
+        return self.keyset_ordering
+    
+    def is_cacheable(self):
+        """Return whether the page may come from the cache; availability depends on every booking."""
+        return not (self.form.is_valid() and self.form.has_time_range())
+    
+    def get_cached_page(self, queryset, page_size):
+        """
+        Return the page from the cache, building it on a miss.
+        
+        The page rows, the neighbour flags and the count are cached together
+        under the list version and the query parameters.
+        """
+        paginator = self.get_keyset_paginator(queryset, page_size)
+        
+        def build():
+            page = self.get_keyset_page(paginator)
+            return page.object_list, page.has_next(), page.has_previous(), (paginator.count, paginator.count_is_exact)
+        
+        rows, has_next, has_previous, (count, is_exact) = facility_cache.get_list_page(self.request.GET, build)
+        paginator.set_count(count, is_exact)
+        return paginator, KeysetPage(paginator, rows, has_next=has_next, has_previous=has_previous)
+    
+    def get_validators(self):
+        """Validate with the cached page rows and badges; availability searches are always built."""
+        queryset = self.get_queryset()
+        if not self.is_cacheable():
+            return None
+        paginator, page = self.get_cached_page(queryset, self.get_paginate_by(queryset))
+        busy_now = facility_cache.get_busy_now([facility.pk for facility in page])
+        last_modified = max((facility.updated_at for facility in page), default=None)
+        rows = [(facility.pk, facility.updated_at) for facility in page]
+        return last_modified, (rows, paginator.count, sorted(busy_now), occupancy.slot_of(timezone.now()))
+    
+    def paginate_queryset(self, queryset, page_size):
+        """Serve the page from the cache unless it is filtered by availability."""
+        if not self.is_cacheable():
+            return super().paginate_queryset(queryset, page_size)
+        paginator, page = self.get_cached_page(queryset, page_size)
+        return paginator, page, page.object_list, page.has_other_pages()
+    
     def get_context_data(self, **kwargs):
         """Add extra context data."""
         context = super().get_context_data(**kwargs)
         context['form'] = self.form
+        # "Free now" badges from today's occupancy bitmaps, cached per slot
+        context['busy_now'] = facility_cache.get_busy_now([facility.pk for facility in context['facilities']])
         return context
 
 
-class FacilityDetailView(DetailView):
+@query_budget(1)
+class FacilityAvailabilityView(View):
+    """
+    JSON endpoint listing the active facilities free for a time range.
+    
+    Pages are selected by cursor over ``(name, id)``, so a deep page costs
+    the same as the first instead of producing and discarding every free
+    facility before it. The view is async: the form builds its query
+    without running one, and the page is read with the async ORM.
+    """
+    page_size = 20
+    max_page_size = 100
+    fields = ('id', 'name', 'location', 'capacity', 'opening_time', 'closing_time')
+    ordering = ('name', 'id')
+    
+    async def get(self, request, *args, **kwargs):
+        """Handle GET request."""
+        form = FacilityFilterForm(request.GET)
+        if not form.is_valid() or not form.has_time_range():
+            errors = form.errors.get_json_data() if form.errors else {
+                'available_from': [{'message': _('This field is required.'), 'code': 'required'}],
+            }
+            return JsonResponse({'status': 'error', 'errors': errors}, status=400)
+        
+        page_size = min(self._positive_int(request.GET.get('page_size'), self.page_size), self.max_page_size)
+        queryset = form.filter_queryset(Facility.objects.filter(is_active=True))
+        # The page holds one extra row telling whether there is a next page,
+        # so free facilities are never counted.
+        paginator = KeysetPaginator(queryset.values(*self.fields), page_size, self.ordering, count_mode=None)
+        try:
+            page = await paginator.apage(request.GET.get(CURSOR_PARAM))
+        except InvalidCursor as e:
+            return JsonResponse(
+                {'status': 'error', 'errors': {CURSOR_PARAM: [{'message': str(e), 'code': 'invalid'}]}}, status=400,
+            )
+        return JsonResponse({
+            'results': page.object_list,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+    
+    @staticmethod
+    def _positive_int(value, default):
+        """Parse a positive integer query parameter."""
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return default
+        return value if value > 0 else default
+
+
+@query_budget(5)
+class FacilityDetailView(ConditionalGetMixin, DetailView):
     """View for showing facility details."""
     model = Facility
     context_object_name = 'facility'
     template_name = 'facilities/facility_detail.html'
+    upcoming_limit = 20
+    
+    def get_object(self, queryset=None):
+        """Return the facility from the cache."""
+        try:
+            return facility_cache.get_facility(self.kwargs['pk'])
+        except Facility.DoesNotExist:
+            raise Http404(_('No facility found matching the query'))
+    
+    def get_validators(self):
+        """
+        Validate with the facility row and the state of its bookings.
+        
+        Staff pages list live upcoming bookings and are always built.
+        """
+        if self.request.user.is_staff:
+            return None
+        facility = self.get_object()
+        bookings_modified, bookings_count = facility_cache.get_booking_state(facility.pk)
+        today = timezone.localdate()
+        last_modified = max(filter(None, (facility.updated_at, bookings_modified)))
+        return last_modified, (facility.pk, facility.updated_at, bookings_modified, bookings_count, today.year, today.month)
+    
+    def get_context_data(self, **kwargs):
+        """Add extra context data."""
+        context = super().get_context_data(**kwargs)
+        today = timezone.localdate()
+        context['occupancy_heatmap'] = facility_cache.get_month_heatmap(self.object.pk, today.year, today.month)
+        if self.request.user.is_staff:
+            context['upcoming_bookings'] = self.object.bookings.filter(
+                end_time__gte=timezone.now()
+            ).select_related('user').order_by('start_time')[:self.upcoming_limit]
+        return context
+
+
+class FacilityFeedView(ConditionalGetMixin, CalendarFeedMixin, View):
+    """iCalendar feed of when a facility is booked."""
+    filename = 'facility.ics'
+    
+    def get_facility(self):
+        """Return the facility from the cache."""
+        try:
+            return facility_cache.get_facility(self.kwargs['pk'])
+        except Facility.DoesNotExist:
+            raise Http404(_('No facility found matching the query'))
+    
+    def get_validators(self):
+        """
+        Validate with the cached state of the facility's bookings.
+        
+        A repeated poll costs no query until a booking changes; the day
+        covers bookings leaving the start of the feed. There is no
+        Last-Modified, as neither of those would advance it.
+        """
+        facility = self.get_facility()
+        bookings_modified, bookings_count = facility_cache.get_booking_state(facility.pk)
+        return None, (facility.pk, facility.updated_at, bookings_modified, bookings_count, timezone.localdate())
+    
+    def get_calendar_name(self):
+        """Name the calendar after the facility."""
+        return self.get_facility().name
+    
+    def get_events(self):
+        """Return the facility's confirmed bookings as events."""
+        return facility_feed_events(self.get_facility(), self.request.get_host())
 
 
 class StaffRequiredMixin(UserPassesTestMixin):
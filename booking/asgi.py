@@ -1,5 +1,8 @@
 """
 ASGI config for booking project.
+
+The live event stream is served ahead of Django; see
+``booking.apps.bookings.live``.
 """
 import os
 from django.core.asgi import get_asgi_application
@@ -7,3 +10,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'booking.settings.dev')
 
 application = get_asgi_application()
+
+# Imported once Django is set up
+from booking.apps.bookings import live  # noqa: E402
+from booking.apps.core.sse import EventStream  # noqa: E402
+
+application = EventStream(application, live.EVENTS_PATH, live.get_channels)
@@ -1,9 +1,13 @@
+import logging
 import os
-from celery import Celery
+from celery import Celery, bootsteps
+from django.conf import settings
 
 # Set the default Django settings module for the celery program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'booking.settings.dev')
 
+logger = logging.getLogger(__name__)
+
 app = Celery('booking')
 
 # Using a string here means the worker doesn't have to serialize
@@ -14,6 +18,32 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+class SharedLiveEvents(bootsteps.Step):
+    """
+    Check that the live updates of a worker's tasks can reach the web processes.
+
+    With ``LIVE_EVENTS_URL=memory://`` a worker running tasks in several
+    processes refuses to start. A single-process worker, as in local
+    development, starts with a warning: the updates of its tasks reach no
+    event stream.
+    """
+
+    def __init__(self, worker, **kwargs):
+        from booking.apps.core.pubsub import is_shared_broker, require_shared_broker
+
+        if worker.concurrency > 1:
+            require_shared_broker(f'{worker.concurrency} worker processes run tasks')
+        elif not is_shared_broker():
+            logger.warning(
+                'LIVE_EVENTS_URL is %s: the live updates of this worker reach no event stream',
+                settings.LIVE_EVENTS_URL,
+            )
+        super().__init__(worker, **kwargs)
+
+
+app.steps['worker'].add(SharedLiveEvents)
+
+
 @app.task(bind=True)
 def debug_task(self):
     """Debug task to verify Celery is working."""
@@ -31,6 +31,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -50,11 +51,13 @@ LOCAL_APPS = [
     'booking.apps.accounts',
     'booking.apps.facilities',
     'booking.apps.bookings',
+    'booking.apps.api',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'booking.apps.core.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -99,6 +102,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Defaults to a per-process memory cache; point CACHE_URL at Redis wherever
+# more than one process serves requests.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -168,6 +182,33 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Bookings
+# Answer availability checks from an in-process index of confirmed bookings.
+# Invalidation goes through the default cache, so only enable this when the
+# cache is shared between all processes.
+BOOKING_INTERVAL_INDEX = env.bool('BOOKING_INTERVAL_INDEX', default=False)
+# Answer availability checks from the occupancy bitmaps. Run
+# rebuild_occupancy before enabling this on a database with bookings.
+BOOKING_OCCUPANCY_CHECKS = env.bool('BOOKING_OCCUPANCY_CHECKS', default=False)
+
+# Facilities
+# Upper bound, in seconds, on how long cached facility pages and data live.
+# Changes invalidate them right away; this only bounds stale entries.
+FACILITY_CACHE_TIMEOUT = env.int('FACILITY_CACHE_TIMEOUT', default=300)
+
+# Query instrumentation
+# Report the query count and database time of each request in a Server-Timing
+# header; they are logged to 'booking.queries' either way.
+QUERY_INSTRUMENTATION_SERVER_TIMING = env.bool('QUERY_INSTRUMENTATION_SERVER_TIMING', default=True)
+
+# Live updates
+# Pub/sub carrying booking changes to the event stream. Defaults to delivery
+# within the process; point it at Redis wherever more than one process
+# serves requests or changes bookings. Gunicorn refuses to start without it
+# unless a single uvicorn worker serves everything, and Celery unless its
+# worker runs a single process.
+LIVE_EVENTS_URL = env('LIVE_EVENTS_URL', default='memory://')
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
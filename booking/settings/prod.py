@@ -6,6 +6,14 @@ from .base import *  # noqa
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
+# Cache shared by every web and worker process
+CACHES = {
+    'default': env.cache('CACHE_URL', default='redis://redis:6379/1'),  # noqa
+}
+
+# Live updates published by every web and worker process
+LIVE_EVENTS_URL = env('LIVE_EVENTS_URL', default='redis://redis:6379/2')  # noqa
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -0,0 +1,29 @@
+"""
+Test settings for the booking project.
+"""
+from .base import *  # noqa
+
+DEBUG = False
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'booking-tests',
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Run Celery tasks in the test process when they are queued
+CELERY_TASK_ALWAYS_EAGER = True
+
+# Tests publish and subscribe in the same process
+LIVE_EVENTS_URL = 'memory://'
+
+# Hashing passwords properly is the slowest part of creating test users
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Run the suite on another database, such as sqlite:///test.sqlite3, by
+# setting DATABASE_URL; tests of PostgreSQL-only features are then skipped.
+if env('DATABASE_URL', default=''):  # noqa
+    DATABASES = {'default': env.db('DATABASE_URL')}  # noqa
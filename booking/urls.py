@@ -14,6 +14,8 @@ urlpatterns = [
     path('accounts/', include('booking.apps.accounts.urls')),
     path('facilities/', include('booking.apps.facilities.urls')),
     path('bookings/', include('booking.apps.bookings.urls')),
+    # Versioned REST API
+    path('api/v1/', include('booking.apps.api.urls')),
     # Health check endpoint
     path('health/', include('health_check.urls')),
     # Home page
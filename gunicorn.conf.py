@@ -0,0 +1,37 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts from this directory.
+
+The site is served over WSGI by threaded workers, as
+``gunicorn booking.wsgi:application``; ``GUNICORN_THREADS`` sets their
+threads. Threaded workers report to the arbiter from their main loop while
+responses stream, so streaming responses may run for as long as the client
+keeps reading.
+
+The read API under ``/api/`` and the event stream are served over ASGI by a
+second docker-compose service, ``gunicorn booking.asgi:application`` with
+``GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker``. Its async views
+keep many requests waiting on the database at once, where a threaded worker
+holds at most ``GUNICORN_THREADS``. With the database next to the
+application the work is CPU-bound and threaded workers answer more requests
+per second; the uvicorn workers come out ahead once database round trips
+take several milliseconds. Measure both with
+``python manage.py benchmark_api``.
+
+Either way, workers refuse to start when live updates would stay inside
+one of them: unless a single uvicorn worker serves everything,
+``LIVE_EVENTS_URL`` must point at Redis.
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def post_worker_init(worker):
+    """Refuse to serve with live updates that would stay inside one worker."""
+    from booking.apps.core.pubsub import require_shared_broker
+
+    if worker.cfg.workers > 1:
+        require_shared_broker(f'{worker.cfg.workers} workers serve requests')
+    elif 'uvicorn' not in worker.cfg.worker_class_str:
+        require_shared_broker('WSGI workers leave the event stream to another server')